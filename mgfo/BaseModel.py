@@ -24,6 +24,16 @@ class BaseModelWriter:
         self.tables = []
         self.max_investement = None
         self.load_tables = ['load']
+        #if True, all resources are built with mutable data, see update_data
+        self.mutable_data = False
+        #if True, vars and constraints of scenes where a resource is not available are removed, see presolve
+        self.presolve_unavailable = False
+        self.presolved_scenes = {}
+        #if given, big M of resources are also bounded by oversize_factor times the size needed to supply the peak load,
+        #see set_big_m. It is a heuristic, not implied by the data: big_m_report warns if a solved size is on such a bound
+        self.oversize_factor = None
+        self.big_m_values = {}
+        self.peak_load_mw = None
         
         if net:
             #self._add_extra_columns(self.net)
@@ -38,6 +48,10 @@ class BaseModelWriter:
             net[t]['model'] = None
     """ 
     
+    def scene_column(self, name):
+        """A scene column as a float numpy vector"""
+        return np.asarray(self.scenes[name], dtype = float)
+    
     def create_model(self):
         self.model = pe.ConcreteModel()
         self.model.scenes = pe.Set(initialize = range(len(self.scenes)), doc = 'Scene Set')
@@ -66,6 +80,32 @@ class BaseModelWriter:
         else:
             raise Exception("Constraint not found")
             
+    def get_resource(self, name):
+        """Returns the resource model with the given name"""
+        for table in self.tables:
+            for element in range(len(table)):
+                m = table['model'][element]
+                if m and m.name == name:
+                    return m
+        raise Exception("Resource {0} not found".format(name))
+    
+    def update_data(self, resource, attr, values):
+        """
+        Changes data of a resource in the model already built, i.e. a tariff or a load rating, so
+        the model can be solved again without rebuilding it. 
+        Arguments:
+            resource: the resource model or its name
+            attr: attribute name, i.e. 'oc_1_mu', 'pa_pu' or 'pr_mw'
+            values: new value of the attribute (a simulator, a function, a value by scene or a single value)
+        The resource must be built with mutable data (see mutable_data and BaseResource.mutable).
+        Big M of the resource are recomputed from the new data.
+        """
+        if isinstance(resource, str):
+            resource = self.get_resource(resource)
+        bounds = resource.update_data(attr, values)
+        if bounds:
+            self.record_big_m(resource, bounds)
+    
     def backconfigure_network(self):
         """
         Modifies network tables based on results of the optimization.
@@ -79,13 +119,12 @@ class BaseModelWriter:
                 m = table['model'][element] 
                 if m:
                     if m.decide_construction:
-                        vn = m.name + '_create'
-                        var = getattr(self.model, vn).value
+                        var = m.create.value
                         if var:
                             table['in_service'][element] = True
-                            if hasattr(table, 'max_p_mw'): table['max_p_mw'][element] = getattr(self.model, m.name + '_pr_mw').value 
-                            if hasattr(table, 'max_q_mvar'): table['max_q_mvar'][element] = 0.5*getattr(self.model, m.name + '_pr_mw').value 
-                            if hasattr(table, 'max_e_mwh'): table['max_e_mwh'][element] = getattr(self.model, m.name + '_er_mwh').value
+                            if hasattr(table, 'max_p_mw'): table['max_p_mw'][element] = m.pr_mw.value 
+                            if hasattr(table, 'max_q_mvar'): table['max_q_mvar'][element] = 0.5*m.pr_mw.value 
+                            if hasattr(table, 'max_e_mwh'): table['max_e_mwh'][element] = m.er_mwh.value
                         else:
                             table['in_service'][element] = False
                             if hasattr(table, 'max_p_mw'): table['max_p_mw'][element] = 0.0 
@@ -113,14 +152,16 @@ class BaseModelWriter:
         load_tables = [self.net.load]
         energy = 0.0
         
+        hours = self.scene_column('dt')*self.scene_column('dd')
         for t in self.load_tables:
             table = self.net[t]
             for element in range(len(table)):
                 m = table['model'][element] 
-                if m and hasattr(m, 'p_mw'):
+                if m and hasattr(m, 'power_values'):
+                    energy += float(np.dot(m.power_values(), hours))
+                elif m and hasattr(m, 'p_mw'):
                     for s in self.model.scene_set:
-                        scene = self.scenes.iloc[s]
-                        energy += m.p_mw[s].value*scene['dt']*scene['dd']
+                        energy += m.p_mw[s].value*hours[s]
                     
         return -energy
         
@@ -130,14 +171,16 @@ class BaseModelWriter:
         load_tables = [self.net.load]
         energy = 0.0
         
+        weights = self.scene_column('dt')*self.scene_column('dd')*self.scene_column('discount')
         for t in self.load_tables:
             table = self.net[t]
             for element in range(len(table)):
                 m = table['model'][element] 
-                if m and hasattr(m, 'p_mw'):
+                if m and hasattr(m, 'power_values'):
+                    energy += float(np.dot(m.power_values(), weights))
+                elif m and hasattr(m, 'p_mw'):
                     for s in self.model.scene_set:
-                        scene = self.scenes.iloc[s]
-                        energy += m.p_mw[s].value*scene['dt']*scene['dd']*scene['discount']
+                        energy += m.p_mw[s].value*weights[s]
                     
         return -energy
 
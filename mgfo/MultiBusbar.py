@@ -16,6 +16,8 @@ class MultiBusbarModelWriter(SimpleModelWriter):
         self.overload_cost = overload_cost
         self.overload_hours = overload_hours
         self.max_i_pu = max_i_pu
+        #bus incidence index, see build_incidence
+        self.incidence = None
     
     
     def add_power_lines(self):
@@ -47,22 +49,70 @@ class MultiBusbarModelWriter(SimpleModelWriter):
                                 
                 self.net.line.model[e] = m
     
-    def bus_power_balance_expression(self, b_index: int, scene: int):
-        power = 0.0
+    def build_incidence(self):
+        """
+        Builds the bus incidence index, once by model: for each bus, the elements injecting power and the 
+        lines departing from and arriving to it. Each kind is stored in CSR form as (pointer, elements), the
+        elements of bus b being elements[pointer[b]:pointer[b+1]], in table order.
+        """
+        n = len(self.net.bus)
+        pairs = {'injecting': [], 'departing': [], 'arriving': []}
         for table in self.tables:
-            if hasattr(table, 'bus') and hasattr(table, 'model'):
-                for element in range(len(table)):
-                    if table.bus[element] == b_index and table.model[element]:
-                        power += table.model[element].active_power(scene)
-            if hasattr(table, 'from_bus') and hasattr(table, 'to_bus') and hasattr(table, 'model'):
+            if not hasattr(table, 'model'):
+                continue
+            models = table.model.tolist()
+            if hasattr(table, 'bus'):
+                pairs['injecting'] += [(b, m) for b, m in zip(table.bus.tolist(), models) if m]
+            if hasattr(table, 'from_bus') and hasattr(table, 'to_bus'):
                 #power lines
-                for element in range(len(table)):
-                    #departing line rest power
-                    if table.from_bus[element] == b_index and table.model[element]:
-                        power += table.model[element].transmited_power(scene)
-                    #arriving line discounts power
-                    if table.to_bus[element] == b_index and table.model[element]:
-                        power -= table.model[element].transmited_power(scene)
+                pairs['departing'] += [(b, m) for b, m in zip(table.from_bus.tolist(), models) if m]
+                pairs['arriving'] += [(b, m) for b, m in zip(table.to_bus.tolist(), models) if m]
+        
+        self.incidence = {}
+        for kind in pairs:
+            buses = np.array([b for b, m in pairs[kind]], dtype = np.int64)
+            order = np.argsort(buses, kind = 'stable')
+            pointer = np.searchsorted(buses[order], np.arange(n + 1))
+            self.incidence[kind] = (pointer, [pairs[kind][i][1] for i in order])
+        return self.incidence
+    
+    def bus_elements(self, kind, b_index):
+        """Elements of a kind ('injecting', 'departing' or 'arriving') connected to the bus, see build_incidence"""
+        pointer, elements = self.incidence[kind]
+        if not 0 <= b_index < len(pointer) - 1:
+            return []
+        return elements[pointer[b_index]:pointer[b_index + 1]]
+    
+    def sparse_balance_constraints(self):
+        """Power balance of each busbar and scene in a SparseModel, see build_incidence"""
+        self.build_incidence()
+        for b in range(len(self.net.bus)):
+            terms = []
+            constant = np.zeros(len(self.scenes))
+            for m in self.bus_elements('injecting', b):
+                t, c = m.sparse_active_power()
+                terms += t
+                constant = constant + c
+            #departing line rest power
+            for m in self.bus_elements('departing', b):
+                terms += m.sparse_transmited_power()
+            #arriving line discounts power
+            for m in self.bus_elements('arriving', b):
+                terms += [(columns, -np.asarray(coefficients)) for columns, coefficients in m.sparse_transmited_power()]
+            self.model.add_constraints('busbar_power_balance_constraint_' + str(b), terms, lb = -constant, ub = -constant)
+    
+    def bus_power_balance_expression(self, b_index: int, scene: int):
+        if self.incidence is None:
+            self.build_incidence()
+        power = 0.0
+        for m in self.bus_elements('injecting', b_index):
+            power += m.active_power(scene)
+        #departing line rest power
+        for m in self.bus_elements('departing', b_index):
+            power += m.transmited_power(scene)
+        #arriving line discounts power
+        for m in self.bus_elements('arriving', b_index):
+            power -= m.transmited_power(scene)
         return power
     
     def busbars_balance_constraints(self):
@@ -70,10 +120,49 @@ class MultiBusbarModelWriter(SimpleModelWriter):
         #scene_iterator = range(len(self.scenes))        
         #bus_iterator = range(len(self.net.bus))
         self.model.bus_set = pe.Set(initialize = range(len(self.net.bus)))
-   
+        
+        #the injection of each busbar and scene is a named expression so it can be patched, see add_resource
+        self.model.bus_injection = pe.Expression(self.model.bus_set, self.model.scene_set, 
+                                    rule = (lambda m, bus, scene:  self.bus_power_balance_expression(bus, scene)))
         self.model.busbar_power_balance_constraint = pe.Constraint(self.model.bus_set, self.model.scene_set, 
-                                    rule = (lambda m, bus, scene:  self.bus_power_balance_expression(bus, scene) == 0))    
+                                    rule = (lambda m, bus, scene:  self.model.bus_injection[bus, scene] == 0))    
+    
+    def bus_power(self, resource, buses, b_index, scene):
+        """Power of a resource into a bus: its active power, or the transmited power for a line 
+        (buses are from and to), that departs from the first bus and arrives to the second"""
+        if len(buses) == 2:
+            power = resource.transmited_power(scene)
+            return power if b_index == buses[0] else -power
+        return resource.active_power(scene)
+    
+    def patch_power_balance(self, resource, buses, added):
+        """Rebuilds the incidence index and updates the injection of the busbars of an added or removed 
+        resource, other busbars are not touched. See SimpleModelWriter.remove_terms"""
+        self.build_incidence()
+        components = None if added else self.block_components(resource)
+        injection = self.model.bus_injection
+        for b in set(buses):
+            if b not in self.model.bus_set or (added and buses.count(b) > 1):
+                #a line from a bus to itself does not change its balance, but its terms are removed
+                continue
+            for s in self.model.scene_set:
+                power = self.bus_power(resource, buses, b, s)
+                if added:
+                    injection[b, s].set_value(injection[b, s].expr + power)
+                else:
+                    injection[b, s].set_value(self.remove_terms(injection[b, s].expr, power, components))
         
+    def model_tables(self):
+        """Network tables with resource models, including lines"""
+        return [self.net.ext_grid, self.net.load, self.net.sgen, self.net.storage, self.net.line]
+    
+    def create_sparse_model(self):
+        """Builds the model with the sparse backend, see SimpleModelWriter.create_sparse_model"""
+        if self.net:
+            #add models for unmodeled lines
+            self.add_power_lines()
+        return super().create_sparse_model()
+    
     def create_model(self):
         if not self.net:
             raise Exception("Network not provided")
@@ -82,10 +171,7 @@ class MultiBusbarModelWriter(SimpleModelWriter):
             raise Exception("Scenes not provided")
         
         #involved tables are append. All code uses the tables array as reference
-        model_tables = [self.net.ext_grid, self.net.load, self.net.sgen, self.net.storage, self.net.line]
-
-        for t in model_tables:
-            self.tables.append(t)
+        self.tables = self.model_tables()
 
         if not self.model:
             self.model = pe.ConcreteModel()
@@ -96,8 +182,15 @@ class MultiBusbarModelWriter(SimpleModelWriter):
         #add models for unmodeled lines
         self.add_power_lines()
         
+        self.set_big_m()
+        
         self.initialize_submodels()
         
+        if self.presolve_unavailable:
+            self.presolve()
+        
+        self.build_incidence()
+        
         #self.power_balance_constraint()
         
         self.busbars_balance_constraints()
@@ -1,7 +1,16 @@
 from .BaseModel import BaseModelWriter
+from .SparseModel import SparseModel
 import pyomo.environ as pe
+from pyomo.common.collections import ComponentSet
+from pyomo.core.expr.numeric_expr import SumExpression
+from pyomo.core.expr.numvalue import is_constant
+from pyomo.core.expr.visitor import identify_variables, identify_mutable_parameters
 import itertools
 import numpy as np
+import pandas as pd
+import time
+
+from warnings import warn
 
 class SimpleModelWriter(BaseModelWriter):
     
@@ -18,9 +27,47 @@ class SimpleModelWriter(BaseModelWriter):
         return pb
 
     def power_balance_constraint(self):
-        #power balance constraint
+        #power balance constraint, the injection of each scene is a named expression so it can be patched, see add_resource
+        self.model.power_injection = pe.Expression(self.model.scene_set, 
+                                    rule = (lambda m, s:  self.power_balance_expression(s)))
         self.model.power_balance_constraint = pe.Constraint(self.model.scene_set, 
-                                    rule = (lambda m, s:  self.power_balance_expression(s) == 0))        
+                                    rule = (lambda m, s:  self.model.power_injection[s] == 0))        
+    
+    def patch_power_balance(self, resource, buses, added):
+        """
+        Updates the power injection of the scenes after a resource is added or removed, see add_resource
+        and remove_terms. Only the terms of the resource are evaluated.
+        """
+        injection = self.model.power_injection
+        components = None if added else self.block_components(resource)
+        for s in self.model.scene_set:
+            if added:
+                injection[s].set_value(injection[s].expr + resource.active_power(s))
+            else:
+                injection[s].set_value(self.remove_terms(injection[s].expr, resource.active_power(s), components))
+    
+    def block_components(self, resource):
+        """Set of the vars and params of the block of a resource, see remove_terms"""
+        return ComponentSet(resource.block.component_data_objects((pe.Var, pe.Param), descend_into = True))
+    
+    def remove_terms(self, expression, power, components):
+        """
+        Removes the power of a resource from an injection sum. The terms with vars or params of its block 
+        (components) are dropped, since subtracting them would leave the vars of the deleted block in 
+        the model, and constant power (i.e. loads) is subtracted. Other terms are not evaluated again.
+        """
+        if is_constant(power):
+            return expression - pe.value(power)
+        return self.drop_terms(expression, components)
+    
+    def drop_terms(self, expression, components):
+        """Drops the terms of a sum with any of the components, nested sums (i.e. the power of a table) are
+        filtered term by term"""
+        if not isinstance(expression, SumExpression):
+            if any(v in components for v in identify_variables(expression)) or any(p in components for p in identify_mutable_parameters(expression)):
+                return 0.0
+            return expression
+        return pe.quicksum([self.drop_terms(a, components) for a in expression.args])
 
     def investement_constraint(self):
         if not self.max_investement is None:
@@ -54,28 +101,156 @@ class SimpleModelWriter(BaseModelWriter):
             c += ct
         return c
     
+    def scene_weights(self):
+        """Weight of each scene in costs and KPIs: hours (dt*dd) discounted"""
+        return self.scene_column('dt')*self.scene_column('dd')*self.scene_column('discount')
+    
     def operational_cost_expression(self):
-        scene_iterator = range(len(self.scenes))
-        op_cost = 0.0
-        #op_cost = sum(self.hourly_operational_cost_expression(e)*self.scenes['dt'][e]*self.scenes['dd'][e]*self.scenes['discount'][e] for e in scene_iterator)
-        for e in scene_iterator:
-            sref = self.scenes.iloc[e]
-            op_cost += self.hourly_operational_cost_expression(e)*sref['dt']*sref['dd']*sref['discount']
-        return op_cost
+        """Weighted operating cost of all the resources, built as a single linear expression, 
+        see BaseResource.operating_cost_expression"""
+        weights = self.scene_weights()
+        costs = []
+        for table in self.tables:
+            for element in range(len(table)):
+                if table['model'][element]:
+                    costs.append(table['model'][element].operating_cost_expression(weights))
+        return pe.quicksum(costs)
+    
+    def resource_cost_expressions(self, resource, weights):
+        """Adds the initial and weighted operating cost of the resource to its block, as named expressions"""
+        resource.block.add_component(resource.block.local_name + '_initial_cost', pe.Expression(expr = resource.initial_cost()))
+        resource.block.add_component(resource.block.local_name + '_operating_cost', pe.Expression(expr = resource.operating_cost_expression(weights)))
+    
+    def total_cost_expression(self):
+        """Sum of the cost expressions of the resource blocks, see resource_cost_expressions"""
+        costs = []
+        for m in self.resource_models():
+            name = m.block.local_name
+            costs += [m.block.component(name + '_initial_cost'), m.block.component(name + '_operating_cost')]
+        return pe.quicksum(costs)
     
     def objective_function(self):        
-        self.model.value = pe.Objective( expr = self.initial_cost_expression() + self.operational_cost_expression(), sense = pe.minimize )
+        weights = self.scene_weights()
+        for m in self.resource_models():
+            self.resource_cost_expressions(m, weights)
+        self.model.value = pe.Objective( expr = self.total_cost_expression(), sense = pe.minimize )
         return self.model.value
+    
+    def update_objective(self):
+        """Rebuilds the objective and the max investement constraint from the resources in the tables"""
+        self.model.value.set_value(self.total_cost_expression())
+        if self.model.component('max_investement_constraint') is not None:
+            self.model.max_investement_constraint.set_value(self.initial_cost_expression() <= self.max_investement)
 
     def initialize_submodels(self):
 
         for table in self.tables:
             for element in range(len(table)):
                 if table['model'][element]:
+                    if self.mutable_data:
+                        table['model'][element].mutable = True
+                    start = time.perf_counter()
                     table['model'][element].initialize_model(self.model, self.model.scenes)
+                    table['model'][element].build_time = time.perf_counter() - start
     
         return self.model
     
+    def block_statistics(self):
+        """Returns a DataFrame with the block of each resource, its number of vars and active constraints,
+        and the seconds taken by initialize_model"""
+        rows = []
+        for m in self.resource_models():
+            if m.block is not None:
+                stats = m.block_statistics()
+                rows.append((m.name, stats['block'], stats['vars'], stats['constraints'], getattr(m, 'build_time', None)))
+        return pd.DataFrame(rows, columns = ['resource', 'block', 'vars', 'constraints', 'build_time'])
+    
+    def peak_load(self):
+        """Peak of the total demand of the loads, in mw"""
+        demand = np.zeros(len(self.scenes))
+        for t in self.load_tables:
+            table = self.net[t]
+            for element in range(len(table)):
+                m = table['model'][element]
+                if m and hasattr(m, 'power_values'):
+                    m.set_scenes(self.scenes)
+                    demand -= m.power_values()
+        return float(np.max(demand, initial = 0.0))
+    
+    def set_big_m(self):
+        """
+        Computes the big M of the construction and overload constraints of each resource from the data
+        (line ratings, max_investement and capacity costs), before the constraints are built. Sizes without
+        such a bound keep the default big M of the resource (1e3). Peak load bounds are only used if 
+        oversize_factor is given. Values given by the user in the resource (i.e. M, M_er) are kept.
+        Returns a dict (resource name, big M name): (value, source), see big_m_report.
+        """
+        #profiles are evaluated once per model, from here on big M, constraints and results share them
+        for m in self.resource_models():
+            m.new_model()
+        self.peak_load_mw = self.peak_load()
+        self.big_m_values = {}
+        for table in self.tables:
+            for element in range(len(table)):
+                m = table['model'][element]
+                if m:
+                    self.set_resource_big_m(m)
+        return self.big_m_values
+    
+    def set_resource_big_m(self, m):
+        """Computes the big M of a single resource, see set_big_m"""
+        m.set_scenes(self.scenes)
+        self.record_big_m(m, m.set_big_m(self.peak_load_mw, self.max_investement, self.oversize_factor))
+    
+    def record_big_m(self, m, bounds):
+        """Records the big M of a resource and their source for big_m_report"""
+        for k in bounds:
+            source = bounds[k][1] if getattr(m, k, None) is None else 'user'
+            self.big_m_values[(m.name, k)] = (m.get_big_m(k), source)
+    
+    def big_m_report(self, tolerance = 1e-6):
+        """
+        Returns a DataFrame with the big M used by each resource and its source. Once the model is solved, 
+        the size bounded by each big M is added and binding is True if the size is on its bound.
+        Bounds from the peak load (see oversize_factor) are a heuristic, not implied by the data: if one of 
+        them is binding the optimum may be cut off and a warning is issued. Raise or unset oversize_factor, or 
+        set M in the resource.
+        """
+        models = {m.name: m for m in self.resource_models()}
+        rows = []
+        for (name, k), (M, source) in self.big_m_values.items():
+            bounded = models[name].big_m_bounded(k) if name in models else None
+            size = None if bounded is None else bounded[0]
+            binding = bounded is not None and size >= bounded[1]*(1.0 - tolerance) - tolerance
+            if binding and source == 'peak load':
+                warn("{0} of {1} is on its big M ({2} = {3}), estimated from the peak load. The optimum may be cut off, "
+                     "raise or unset oversize_factor or set {2} in the resource".format('Rated power' if k == 'M' else 'Capacity', name, k, M))
+            rows.append((name, k, M, source, size, binding))
+        return pd.DataFrame(rows, columns = ['resource', 'name', 'M', 'source', 'size', 'binding'])
+    
+    def presolve(self):
+        """
+        Fixes the vars and deactivates the constraints of the scenes where each resource is not available
+        (pa_pu is 0, i.e. PV at night, WT below cut-in, faulted lines). 
+        Returns a dict resource name: number of scenes presolved.
+        """
+        self.presolved_scenes = {}
+        for table in self.tables:
+            for element in range(len(table)):
+                m = table['model'][element]
+                if m:
+                    self.presolved_scenes[m.name] = m.presolve()
+        return self.presolved_scenes
+    
+    def undo_presolve(self):
+        """Restores the vars and constraints removed by presolve"""
+        for table in self.tables:
+            for element in range(len(table)):
+                m = table['model'][element]
+                if m:
+                    m.undo_presolve()
+        self.presolved_scenes = {}
+    
     def create_model(self):
         if not self.net:
             raise Exception("Network not provided")
@@ -84,10 +259,7 @@ class SimpleModelWriter(BaseModelWriter):
             raise Exception("Scenes not provided")
         
         #involved tables are append. All code uses the tables array as reference
-        model_tables = [self.net.ext_grid, self.net.load, self.net.sgen, self.net.storage]
-
-        for t in model_tables:
-            self.tables.append(t)
+        self.tables = self.model_tables()
 
         if not self.model:
             self.model = pe.ConcreteModel()
@@ -95,8 +267,13 @@ class SimpleModelWriter(BaseModelWriter):
         self.model.scenes = self.scenes
         self.model.scene_set = pe.Set(initialize = range(len(self.scenes)), doc = 'Scenes')
         
+        self.set_big_m()
+        
         self.initialize_submodels()
         
+        if self.presolve_unavailable:
+            self.presolve()
+        
         #power balance constraint
         self.power_balance_constraint()
         
@@ -107,6 +284,157 @@ class SimpleModelWriter(BaseModelWriter):
         
         return self.model
         
+    def element_buses(self, table, index):
+        """Buses connected to an element of a network table"""
+        return [int(table[c][index]) for c in ('bus', 'from_bus', 'to_bus') if c in table.columns]
+    
+    def modeled_table(self, table):
+        """Network table by name (i.e. 'storage'), it must be one of the tables of the model.
+        Tables are refreshed, since creating elements may replace them in the network"""
+        self.tables = self.model_tables()
+        t = self.net[table]
+        if not any(t is m for m in self.tables):
+            raise Exception("Table {0} is not part of the model".format(table))
+        return t
+    
+    def add_resource(self, table, index, resource = None):
+        """
+        Adds a resource to a built model, i.e. a candidate: table is the network table name (i.e. 'storage'), 
+        index the element and resource its model, if it is not already set in the table.
+        Only the block of the resource and its cost expressions are built, then the power balance of its 
+        busbar and the objective are patched. Big M of the other resources are not recomputed.
+        Returns the resource.
+        """
+        if not self.model or isinstance(self.model, SparseModel):
+            raise Exception("A Pyomo model must be created before adding resources")
+        t = self.modeled_table(table)
+        if resource is not None:
+            t.at[index, 'model'] = resource
+        m = t['model'][index]
+        if not m:
+            raise Exception("Element {0} of {1} has no model".format(index, table))
+        if m.block is not None and m.block.model() is self.model:
+            raise Exception("Resource {0} is already in the model".format(m.name))
+        
+        m.new_model()
+        self.set_resource_big_m(m)
+        
+        if self.mutable_data:
+            m.mutable = True
+        start = time.perf_counter()
+        m.initialize_model(self.model, self.model.scenes)
+        m.build_time = time.perf_counter() - start
+        if self.presolve_unavailable:
+            self.presolved_scenes[m.name] = m.presolve()
+        
+        self.resource_cost_expressions(m, self.scene_weights())
+        self.patch_power_balance(m, self.element_buses(t, index), True)
+        self.update_objective()
+        return m
+    
+    def remove_resource(self, table, index):
+        """
+        Removes a resource from a built model: its block is deleted and the element is left unmodeled 
+        (model is None) in the network table, then the power balance of its busbar and the objective 
+        are patched. Returns the resource, that can be added again with add_resource.
+        """
+        t = self.modeled_table(table)
+        m = t['model'][index]
+        if not m or m.block is None or m.block.model() is not self.model:
+            raise Exception("Element {0} of {1} is not in the model".format(index, table))
+        
+        #the balance is patched while the block exists, its components identify the terms to remove
+        t.at[index, 'model'] = None
+        self.patch_power_balance(m, self.element_buses(t, index), False)
+        self.model.del_component(m.block)
+        m.block = None
+        m.params = {}
+        m.presolved = []
+        m.presolve_active = False
+        for key in [k for k in self.big_m_values if k[0] == m.name]:
+            del self.big_m_values[key]
+        self.presolved_scenes.pop(m.name, None)
+        
+        self.update_objective()
+        return m
+    
+    def model_tables(self):
+        """Network tables with resource models"""
+        return [self.net.ext_grid, self.net.load, self.net.sgen, self.net.storage]
+    
+    def resource_models(self):
+        """List of the resource models of all the tables"""
+        models = []
+        for table in self.tables:
+            for element in range(len(table)):
+                if table['model'][element]:
+                    models.append(table['model'][element])
+        return models
+    
+    def create_sparse_model(self):
+        """
+        Builds the same model as create_model with the sparse backend: resources add their vars and 
+        constraints to a SparseModel as numpy blocks and no Pyomo component is created.
+        Solve it with model.solve() (HiGHS through scipy) or write it with model.write_mps(path), then
+        results are read with get_scenes_results, backconfigure_network and the KPI functions, as for Pyomo models.
+        Mutable data (see update_data) is not supported by this backend.
+        """
+        if not self.net:
+            raise Exception("Network not provided")
+        
+        if self.scenes is None:
+            raise Exception("Scenes not provided")
+        
+        self.tables = self.model_tables()
+        
+        self.model = SparseModel()
+        self.model.scenes = self.scenes
+        self.model.scene_set = range(len(self.scenes))
+        
+        self.set_big_m()
+        
+        for m in self.resource_models():
+            m.initialize_sparse(self.model, self.scenes)
+        
+        self.sparse_balance_constraints()
+        
+        self.sparse_investement_constraint()
+        
+        self.sparse_objective()
+        
+        return self.model
+    
+    def sparse_balance_constraints(self):
+        """Power balance of each scene in a SparseModel"""
+        terms = []
+        constant = np.zeros(len(self.scenes))
+        for m in self.resource_models():
+            t, c = m.sparse_active_power()
+            terms += t
+            constant = constant + c
+        self.model.add_constraints('power_balance_constraint', terms, lb = -constant, ub = -constant)
+    
+    def sparse_investement_constraint(self):
+        """Max investement constraint in a SparseModel"""
+        if self.max_investement is None:
+            return
+        terms = []
+        constant = 0.0
+        for m in self.resource_models():
+            t, c = m.sparse_initial_cost()
+            terms += t
+            constant += c
+        self.model.add_row('max_investement_constraint', terms, ub = self.max_investement - constant)
+    
+    def sparse_objective(self):
+        """Initial and operating costs in a SparseModel"""
+        weights = self.scene_weights()
+        for m in self.resource_models():
+            for terms, constant in (m.sparse_initial_cost(), m.sparse_operating_cost(weights)):
+                for columns, coefficients in terms:
+                    self.model.add_cost(columns, coefficients)
+                self.model.add_constant(constant)
+    
     def opetaring_costs_value(self, elements = [], scenes = None):
         """
         Scenes is a list of scenes. If none, defaults all.
@@ -114,13 +442,16 @@ class SimpleModelWriter(BaseModelWriter):
         elements is a list of selected elements. If None, all tables.
         """
         
-        if not scenes:
-            scene_iterator = range(len(self.scenes))
+        weights = self.scene_weights()
+        if scenes:
+            #only the selected scenes are accounted
+            selected = np.zeros(len(weights))
+            selected[list(scenes)] = 1.0
+            weights = weights*selected
 
         op_cost = 0.0
-        for e in scene_iterator:
-            sref = self.scenes.iloc[e]
-            op_cost += self.hourly_operational_cost_value(e, elements)*sref['dt']*sref['dd']*sref['discount']
+        for element in elements:
+            op_cost += pe.value(element.operating_cost_expression(weights))
         
         return op_cost
         
@@ -0,0 +1,327 @@
+"""
+Sparse backend of the model writers, see SimpleModelWriter.create_sparse_model.
+
+Resources add their variables as blocks of columns and their constraints as blocks of rows
+given by numpy coefficient vectors, so no Pyomo expression is built. The problem is assembled as
+a single sparse matrix (scipy.sparse) and solved with HiGHS through scipy.optimize.milp, or
+written as a MPS file for any other solver.
+Solution values are stored in SparseVar objects, that replace Pyomo vars in the resources, so
+results are read as in the Pyomo models (var[s].value).
+"""
+import numpy as np
+
+
+class SparseVarData:
+    """A single column of a SparseVar, with the interface of a Pyomo var (value)"""
+
+    def __init__(self, var, index):
+        self.var = var
+        self.index = index
+
+    @property
+    def value(self):
+        v = self.var.values[self.index]
+        return None if np.isnan(v) else float(v)
+
+
+class SparseVar:
+    """
+    A block of consecutive columns of a SparseModel: a single var, or a var indexed by scene
+    if it is created with a size. Values are available after the model is solved.
+    """
+
+    def __init__(self, name, start, size, indexed):
+        self.name = name
+        self.start = start
+        self.size = size
+        self.indexed = indexed
+        self.values = np.full(size, np.nan)
+
+    @property
+    def columns(self):
+        """Column of each element of the var"""
+        return np.arange(self.start, self.start + self.size)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        return SparseVarData(self, index)
+
+    @property
+    def value(self):
+        if self.indexed:
+            raise Exception("{0} is indexed".format(self.name))
+        return self[0].value
+
+
+class SparseModel:
+    """
+    A LP/MILP problem, minimize c·x + constant subject to row_lb <= A·x <= row_ub and lb <= x <= ub,
+    some x integer. Vars are accessible as attributes by name, as in a Pyomo model.
+    """
+
+    def __init__(self):
+        self.n_columns = 0
+        self.n_rows = 0
+        """Dictionary of pairs, var name: SparseVar"""
+        self.vars = {}
+        #column data, by var
+        self.lb = []
+        self.ub = []
+        self.integrality = []
+        #constraint blocks: (name, first row, number of rows)
+        self.constraints = []
+        #coo entries and row bounds, by block
+        self.entries = []
+        self.row_lb = []
+        self.row_ub = []
+        #objective
+        self.costs = []
+        self.constant = 0.0
+        #objective value, after solve
+        self.value = None
+        self.status = None
+
+    def add_var(self, name, size = None, lb = 0.0, ub = np.inf, integer = False):
+        """
+        Adds a var, a single column or one by scene if size is given. lb and ub can be vectors.
+        Returns the SparseVar, also set as an attribute of the model.
+        """
+        if name in self.vars:
+            raise Exception("Var {0} already defined".format(name))
+        n = 1 if size is None else size
+        var = SparseVar(name, self.n_columns, n, size is not None)
+        self.lb.append(np.broadcast_to(np.asarray(lb, dtype = float), (n,)))
+        self.ub.append(np.broadcast_to(np.asarray(ub, dtype = float), (n,)))
+        self.integrality.append(np.full(n, 1 if integer else 0))
+        self.n_columns += n
+        self.vars[name] = var
+        setattr(self, name, var)
+        return var
+
+    def add_constraints(self, name, terms, lb = -np.inf, ub = np.inf):
+        """
+        Adds a block of rows lb <= sum of terms <= ub. Each term is a pair (columns, coefficients),
+        columns being a SparseVar or a vector with a column by row. Single vars, coefficients and
+        bounds are broadcasted to all the rows. Zero coefficients are ignored.
+        Returns the index of the first row.
+        """
+        terms = [(t[0].columns if isinstance(t[0], SparseVar) else np.asarray(t[0]), np.asarray(t[1], dtype = float)) for t in terms]
+        n = max([np.size(lb), np.size(ub)] + [max(np.size(c), np.size(v)) for c, v in terms])
+        start = self.n_rows
+
+        rows = []
+        columns = []
+        values = []
+        for c, v in terms:
+            c = np.broadcast_to(c, (n,))
+            v = np.broadcast_to(v, (n,))
+            nonzero = np.flatnonzero(v)
+            rows.append(start + nonzero)
+            columns.append(c[nonzero])
+            values.append(v[nonzero])
+        if terms:
+            self.entries.append((np.concatenate(rows), np.concatenate(columns), np.concatenate(values)))
+
+        self.row_lb.append(np.broadcast_to(np.asarray(lb, dtype = float), (n,)))
+        self.row_ub.append(np.broadcast_to(np.asarray(ub, dtype = float), (n,)))
+        self.constraints.append((name, start, n))
+        self.n_rows += n
+        return start
+
+    def add_row(self, name, terms, lb = -np.inf, ub = np.inf):
+        """
+        Adds a single row lb <= sum of terms <= ub, where each term (columns, coefficients) spans
+        several columns, i.e. a sum over the scenes. Returns the index of the row.
+        """
+        start = self.n_rows
+        columns = []
+        values = []
+        for c, v in terms:
+            c = np.atleast_1d(c.columns if isinstance(c, SparseVar) else np.asarray(c))
+            v = np.broadcast_to(np.asarray(v, dtype = float), c.shape)
+            nonzero = np.flatnonzero(v)
+            columns.append(c[nonzero])
+            values.append(v[nonzero])
+        if terms:
+            columns = np.concatenate(columns)
+            self.entries.append((np.full(len(columns), start), columns, np.concatenate(values)))
+
+        self.row_lb.append(np.array([lb], dtype = float))
+        self.row_ub.append(np.array([ub], dtype = float))
+        self.constraints.append((name, start, 1))
+        self.n_rows += 1
+        return start
+
+    def add_cost(self, columns, coefficients):
+        """Adds coefficients to the objective. columns is a SparseVar or a vector of columns"""
+        if isinstance(columns, SparseVar):
+            columns = columns.columns
+        columns = np.atleast_1d(columns)
+        self.costs.append((columns, np.broadcast_to(np.asarray(coefficients, dtype = float), columns.shape)))
+
+    def add_constant(self, value):
+        """Adds a constant to the objective"""
+        self.constant += float(value)
+
+    def objective(self):
+        """Objective coefficients, a dense vector by column"""
+        if not self.costs:
+            return np.zeros(self.n_columns)
+        columns = np.concatenate([c for c, v in self.costs])
+        values = np.concatenate([v for c, v in self.costs])
+        return np.bincount(columns, weights = values, minlength = self.n_columns)
+
+    def bounds(self):
+        """Column bounds (lb, ub) and integrality, as vectors"""
+        if self.n_columns == 0:
+            return np.zeros(0), np.zeros(0), np.zeros(0, dtype = int)
+        return np.concatenate(self.lb), np.concatenate(self.ub), np.concatenate(self.integrality)
+
+    def row_bounds(self):
+        """Row bounds (row_lb, row_ub), as vectors"""
+        if self.n_rows == 0:
+            return np.zeros(0), np.zeros(0)
+        return np.concatenate(self.row_lb), np.concatenate(self.row_ub)
+
+    def matrix(self):
+        """Constraint matrix, as a scipy.sparse csr array. Duplicated entries are summed."""
+        import scipy.sparse as sp
+
+        if self.entries:
+            rows = np.concatenate([e[0] for e in self.entries])
+            columns = np.concatenate([e[1] for e in self.entries])
+            values = np.concatenate([e[2] for e in self.entries])
+        else:
+            rows = columns = np.zeros(0, dtype = int)
+            values = np.zeros(0)
+        return sp.coo_array((values, (rows, columns)), shape = (self.n_rows, self.n_columns)).tocsr()
+
+    def set_values(self, x):
+        """Stores a solution in the vars"""
+        for var in self.vars.values():
+            var.values = np.asarray(x[var.start:var.start + var.size], dtype = float)
+
+    def solve(self, time_limit = None, mip_rel_gap = None, disp = False):
+        """
+        Solves the problem with HiGHS (scipy.optimize.milp). Solution values are stored in the vars
+        and the objective value in *value*. Returns the scipy OptimizeResult.
+        """
+        from scipy.optimize import milp, Bounds, LinearConstraint
+
+        lb, ub, integrality = self.bounds()
+        row_lb, row_ub = self.row_bounds()
+        options = {'disp': disp}
+        if time_limit is not None:
+            options['time_limit'] = time_limit
+        if mip_rel_gap is not None:
+            options['mip_rel_gap'] = mip_rel_gap
+
+        constraints = LinearConstraint(self.matrix(), row_lb, row_ub) if self.n_rows else None
+        res = milp(self.objective(), integrality = integrality, bounds = Bounds(lb, ub), constraints = constraints, options = options)
+        self.status = res.message
+        if res.x is None:
+            raise Exception("Solver failed: {0}".format(res.message))
+        #integer columns are rounded, within the solver tolerance
+        self.set_values(np.where(integrality == 1, np.round(res.x), res.x))
+        self.value = float(res.fun) + self.constant
+        return res
+
+    def column_names(self):
+        """MPS-safe name of each column: var[index]"""
+        names = []
+        for var in self.vars.values():
+            base = var.name.replace(' ', '_')
+            names += ["{0}[{1}]".format(base, i) for i in range(var.size)] if var.indexed else [base]
+        return names
+
+    def row_names(self):
+        """MPS-safe name of each row: constraint[index]"""
+        names = []
+        for name, start, n in self.constraints:
+            base = name.replace(' ', '_')
+            names += ["{0}[{1}]".format(base, i) for i in range(n)] if n > 1 else [base]
+        return names
+
+    def write_mps(self, path):
+        """Writes the problem as a free MPS file. The objective constant is written as the rhs of the
+        objective row, with the sign used by HiGHS and CPLEX (-constant)."""
+        a = self.matrix().tocsc()
+        c = self.objective()
+        lb, ub, integrality = self.bounds()
+        row_lb, row_ub = self.row_bounds()
+        columns = self.column_names()
+        rows = self.row_names()
+
+        lines = ['NAME MGFO', 'ROWS', ' N obj']
+        rhs = []
+        ranges = []
+        for i, name in enumerate(rows):
+            low, up = row_lb[i], row_ub[i]
+            if low == up:
+                lines.append(' E ' + name)
+                rhs.append((name, low))
+            elif np.isinf(low) and np.isinf(up):
+                lines.append(' N ' + name)
+            elif np.isinf(low):
+                lines.append(' L ' + name)
+                rhs.append((name, up))
+            elif np.isinf(up):
+                lines.append(' G ' + name)
+                rhs.append((name, low))
+            else:
+                lines.append(' L ' + name)
+                rhs.append((name, up))
+                ranges.append((name, up - low))
+
+        lines.append('COLUMNS')
+        integer_block = False
+        for j, name in enumerate(columns):
+            if integrality[j] and not integer_block:
+                lines.append(" MARKER 'MARKER' 'INTORG'")
+                integer_block = True
+            elif not integrality[j] and integer_block:
+                lines.append(" MARKER 'MARKER' 'INTEND'")
+                integer_block = False
+            if c[j] != 0:
+                lines.append(' {0} obj {1!r}'.format(name, float(c[j])))
+            for k in range(a.indptr[j], a.indptr[j + 1]):
+                lines.append(' {0} {1} {2!r}'.format(name, rows[a.indices[k]], float(a.data[k])))
+        if integer_block:
+            lines.append(" MARKER 'MARKER' 'INTEND'")
+
+        lines.append('RHS')
+        if self.constant != 0:
+            lines.append(' RHS obj {0!r}'.format(-self.constant))
+        for name, value in rhs:
+            if value != 0:
+                lines.append(' RHS {0} {1!r}'.format(name, float(value)))
+
+        if ranges:
+            lines.append('RANGES')
+            for name, value in ranges:
+                lines.append(' RNG {0} {1!r}'.format(name, float(value)))
+
+        lines.append('BOUNDS')
+        for j, name in enumerate(columns):
+            low, up = lb[j], ub[j]
+            if low == up:
+                lines.append(' FX BND {0} {1!r}'.format(name, float(low)))
+                continue
+            if np.isinf(low) and np.isinf(up):
+                lines.append(' FR BND {0}'.format(name))
+                continue
+            if np.isinf(low):
+                lines.append(' MI BND {0}'.format(name))
+            elif low != 0:
+                lines.append(' LO BND {0} {1!r}'.format(name, float(low)))
+            if not np.isinf(up):
+                lines.append(' UP BND {0} {1!r}'.format(name, float(up)))
+            elif integrality[j]:
+                #some readers bound integer columns to 1 by default
+                lines.append(' PL BND {0}'.format(name))
+        lines.append('ENDATA')
+
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
@@ -2,6 +2,7 @@
 from .BaseModel import network_precondition
 from .SimpleBusbar import SimpleModelWriter
 from .MultiBusbar import MultiBusbarModelWriter
+from .SparseModel import SparseModel
 
 from .scenes.SceneBuilder import SceneBuilder as SceneBuilder
 
@@ -1,40 +1,42 @@
 import pyomo.environ as pe
 from .BaseResource import BaseResource
 import numpy as np
+import math
 
 class Generator(BaseResource):
 
     def initialize_model(self, model, scenes):
         self.model = model
-        self.scenes = scenes
+        self.set_scenes(scenes)
+        self.create_block(model)
         self.scene_iterator = self.model.scene_set
-        self.M = 1e3
         
         #to create generator
         vn = self.name + '_create'
         self.create = pe.Var(within = pe.Binary)
-        setattr(self.model, vn, self.create)
+        setattr(self.block, vn, self.create)
         
         #sizing d.v.        
         vn = self.name + '_pr_mw'
         self.pr_mw = pe.Var(within = pe.NonNegativeReals)
-        setattr(self.model, vn, self.pr_mw)        
+        setattr(self.block, vn, self.pr_mw)        
         
         #generated energy
         vn = self.name + '_p_mw'
         self.p_mw = pe.Var(self.scene_iterator, within = pe.NonNegativeReals)
-        setattr(self.model, vn, self.p_mw)
+        setattr(self.block, vn, self.p_mw)
         #this var will be reported
         self.report_attrs[vn] = self.p_mw
 
         #no optimo porque crea todas las v.d. por más que algunas no sean necesarias.
+        pa_pu = self.scene_data('pa_pu')
         cn = self.name + '_p_constraint'
-        self.p_mw_constraint = pe.Constraint(self.scene_iterator, rule = (lambda m, s: self.p_mw[s] <= self.pr_mw * self['pa_pu', self.scenes.iloc[s]] ))
-        setattr(self.model, cn, self.p_mw_constraint)
+        self.p_mw_constraint = pe.Constraint(self.scene_iterator, rule = (lambda m, s: self.p_mw[s] <= self.pr_mw * pa_pu[s] ))
+        setattr(self.block, cn, self.p_mw_constraint)
         
         cn = self.name + '_p_M_constraint'        
-        self.create_constraint = pe.Constraint(expr = self.pr_mw <= self.create*self.M)
-        setattr(self.model, cn, self.create_constraint)
+        self.create_constraint = pe.Constraint(expr = self.pr_mw <= self.create*self.big_m_coefficient('M'))
+        setattr(self.block, cn, self.create_constraint)
         return
         
     def get_scenes_results(self, data_frame, include_inactive = False):
@@ -60,16 +62,76 @@ class Generator(BaseResource):
     def available_power(self, scene):
         """Returns available active power in mw, in numeric form.
         scene is the scene index"""
-        return self['pa_pu', self.scenes.iloc[scene]]*self['pr_mw']
+        return self.profile('pa_pu')[scene]*self['pr_mw']
+
+    def presolve_components(self, scene):
+        """Generation and its availability constraint are not needed in unavailable scenes"""
+        return [self.p_mw[scene], self.p_mw_constraint[scene]]
+
+    def capacity_cost(self):
+        """Initial cost by mw of rated power"""
+        return self['ic_1_mu']
+
+    def big_m_bounds(self, peak_load, max_investement = None, oversize = None):
+        """Rated power is bounded by the rated power affordable with max_investement and, if oversize 
+        is given, by oversize times the power that supplies the peak load at the maximum availability"""
+        bounds = []
+        pa_max = float(np.max(self.profile('pa_pu', 1.0), initial = 0.0))
+        if oversize and peak_load > 0 and pa_max > 0:
+            bounds.append((oversize*peak_load/pa_max, 'peak load'))
+        affordable = self.investement_bound(max_investement, self.capacity_cost())
+        if affordable is not None:
+            bounds.append((affordable, 'investement'))
+        return {'M': min(bounds)} if bounds else {}
+
+    def big_m_bounded(self, name = 'M'):
+        """Rated power and its big M, see BaseResource.big_m_bounded"""
+        size = self.solved_value(self.pr_mw)
+        if name != 'M' or size is None:
+            return None
+        return size, self.get_big_m('M')
 
     def initial_cost(self):
         """Returns initial cost in monetary units, in numeric form or as an expression of the decision variables."""
-        return self['ic_0_mu']*self['create'] + self['ic_1_mu']*self['pr_mw']
+        return self.coefficient('ic_0_mu')*self['create'] + self.coefficient('ic_1_mu')*self['pr_mw']
 
     def operating_cost(self, scene):
         """Returns initial cost in monetary units, in numeric form or as an expression of the decision variables
         scene is the scene index"""
-        return self['oc_0_mu']*self['pr_mw'] + self['oc_1_mu', self.scenes.iloc[scene]]*self.p_mw[scene]
+        return self.coefficient('oc_0_mu')*self['pr_mw'] + self.scene_data('oc_1_mu')[scene]*self.p_mw[scene]
+
+    def operating_cost_expression(self, weights):
+        """Returns the operating cost weighted by scene as a single linear expression"""
+        return (self.coefficient('oc_0_mu')*self['pr_mw']*float(weights.sum()) 
+                + self.weighted_sum(weights, self.scene_data('oc_1_mu'), self.p_mw))
+
+    def initialize_sparse(self, model, scenes):
+        """Same vars and constraints as initialize_model, in a SparseModel"""
+        self.model = model
+        self.set_scenes(scenes)
+        pa_pu = self.profile('pa_pu')
+
+        self.create = model.add_var(self.name + '_create', ub = 1.0, integer = True)
+        self.pr_mw = model.add_var(self.name + '_pr_mw')
+        #generation is bounded to 0 where the generator is not available
+        self.p_mw = model.add_var(self.name + '_p_mw', len(scenes), ub = np.where(pa_pu == 0, 0.0, np.inf))
+        self.report_attrs[self.name + '_p_mw'] = self.p_mw
+
+        model.add_constraints(self.name + '_p_constraint', [(self.p_mw, 1.0), (self.pr_mw, -pa_pu)], ub = 0.0)
+        self.initialize_sparse_sizing(model)
+
+    def initialize_sparse_sizing(self, model):
+        """Construction constraints in a SparseModel"""
+        model.add_constraints(self.name + '_p_M_constraint', [(self.pr_mw, 1.0), (self.create, -self.get_big_m('M'))], ub = 0.0)
+
+    def sparse_active_power(self):
+        return [(self.p_mw, 1.0)], 0.0
+
+    def sparse_initial_cost(self):
+        return [(self.create, self['ic_0_mu']), (self.pr_mw, self['ic_1_mu'])], 0.0
+
+    def sparse_operating_cost(self, weights):
+        return [(self.pr_mw, self['oc_0_mu']*float(weights.sum())), (self.p_mw, weights*self.profile('oc_1_mu'))], 0.0
     
 
 class DiscreteGenerator(Generator):
@@ -86,49 +148,82 @@ class DiscreteGenerator(Generator):
     
     def initialize_model(self, model, scenes):
         self.model = model
-        self.scenes = scenes
+        self.set_scenes(scenes)
+        self.create_block(model)
         #self.scene_iterator = range(len(scenes))
         self.scene_iterator = self.model.scene_set
-        self.M = 1e3
         
         #to create generator
         vn = self.name + '_create'
         self.create = pe.Var(within = pe.Binary)
-        setattr(self.model, vn, self.create)
+        setattr(self.block, vn, self.create)
 
         #units to create        
         vn = self.name + '_units'
         self.units = pe.Var(within = pe.NonNegativeIntegers)
-        setattr(self.model, vn, self.units)        
+        setattr(self.block, vn, self.units)        
 
         #sizing d.v.        
         vn = self.name + '_pr_mw'
         self.pr_mw = pe.Var(within = pe.NonNegativeReals)
-        setattr(self.model, vn, self.pr_mw)        
+        setattr(self.block, vn, self.pr_mw)        
         
         #generated energy
         vn = self.name + '_p_mw'
         self.p_mw = pe.Var(self.scene_iterator, within = pe.NonNegativeReals)
-        setattr(self.model, vn, self.p_mw)
+        setattr(self.block, vn, self.p_mw)
         #this var will be reported
         self.report_attrs[vn] = self.p_mw
         
         #no optimo porque crea todas las v.d. por más que algunas no sean necesarias.
+        pa_pu = self.scene_data('pa_pu')
         cn = self.name + '_p_constraint'
-        self.p_mw_constraint = pe.Constraint(self.scene_iterator, rule = (lambda m, s: self.p_mw[s] <= self.pr_mw * self['pa_pu', self.scenes.iloc[s]] ))
-        setattr(self.model, cn, self.p_mw_constraint)
+        self.p_mw_constraint = pe.Constraint(self.scene_iterator, rule = (lambda m, s: self.p_mw[s] <= self.pr_mw * pa_pu[s] ))
+        setattr(self.block, cn, self.p_mw_constraint)
         
         
         cn = self.name + '_units_constraint'        
-        self.create_units_constraint = pe.Constraint(expr = self.units <= self.create*self.M)
-        setattr(self.model, cn, self.create_units_constraint)
+        self.create_units_constraint = pe.Constraint(expr = self.units <= self.create*self.big_m_coefficient('units'))
+        setattr(self.block, cn, self.create_units_constraint)
 
         cn = self.name + 'pr_units_constraint'        
         self.pr_units_constraint = pe.Constraint(expr = self.pr_mw == self.units*self.unit_size_mw)
-        setattr(self.model, cn, self.pr_units_constraint)
+        setattr(self.block, cn, self.pr_units_constraint)
         
         return
     
+    def initialize_sparse_sizing(self, model):
+        """Construction and units constraints in a SparseModel"""
+        self.units = model.add_var(self.name + '_units', integer = True)
+        model.add_constraints(self.name + '_units_constraint', 
+                              [(self.units, 1.0), (self.create, -self.get_big_m('units'))], ub = 0.0)
+        model.add_constraints(self.name + 'pr_units_constraint', [(self.pr_mw, 1.0), (self.units, -self.unit_size_mw)], lb = 0.0, ub = 0.0)
+
+    def sparse_initial_cost(self):
+        terms, constant = super().sparse_initial_cost()
+        return terms + [(self.units, self['unit_cost_mu'])], constant
+
+    def big_m_bounded(self, name = 'M'):
+        """Rated power and the power of the units allowed by the big M"""
+        bounded = super().big_m_bounded(name)
+        if bounded is None:
+            return None
+        return bounded[0], self.get_big_m('units')*self.unit_size_mw
+
+    def get_big_m(self, name = 'M'):
+        """The big M of the units is the number of units of the big M of the rated power, or 1e3 units if
+        the rated power is not bounded"""
+        if name == 'units':
+            if getattr(self, 'M', None) is None and 'M' not in self.big_m:
+                return 1e3
+            return math.ceil(super().get_big_m('M')/self.unit_size_mw)
+        return super().get_big_m(name)
+
+    def capacity_cost(self):
+        """Initial cost by mw of rated power, including the cost of the units"""
+        return self['ic_1_mu'] + self['unit_cost_mu']/self['unit_size_mw']
+
     def initial_cost(self):
             """Returns initial cost in monetary units, in numeric form or as an expression of the decision variables."""
-            return self['ic_0_mu']*self['create'] + self['ic_1_mu']*self['pr_mw'] + self['unit_cost_mu']*self['units']
\ No newline at end of file
+            return (self.coefficient('ic_0_mu')*self['create'] + self.coefficient('ic_1_mu')*self['pr_mw'] 
+                    + self.coefficient('unit_cost_mu')*self['units'])
\ No newline at end of file
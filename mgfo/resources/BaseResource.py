@@ -1,5 +1,6 @@
 import pyomo.environ as pe
 import itertools
+import inspect
 import pandas as pd
 import numpy as np
 
@@ -25,6 +26,332 @@ class BaseResource:
         
         self.decide_construction = True   #model must decide if construct or not 
         self.size = True   #model must decide optimal sizing  of the element
+        
+        """Dictionary of pairs, attribute name: (attribute value, numpy vector of values by scene). See profile"""
+        self.profiles = {}
+        #scene columns as numpy vectors
+        self.scene_arrays = {}
+        
+        #if True, profiles are kept across models built on the same scenes object, so random attributes are
+        #sampled once. Changes to the parameters of a simulator or to the scenes in place are not detected,
+        #call clear_profiles after them. Within a model, profiles are always evaluated once, see profile
+        self.memoize = False
+        #if True, profiles are added to the scenes as <name>_<attribute> columns
+        self.store_profiles = False
+        
+        """Dictionary of pairs, attribute name: mutable pyomo Param. See scene_data and coefficient"""
+        self.params = {}
+        #if True, time-varying data and cost coefficients enter the model as mutable Params, see update_data
+        self.mutable = False
+        
+        #vars fixed and constraints deactivated by presolve
+        self.presolved = []
+        self.presolve_active = False
+        
+        #Pyomo block with the vars and constraints of the resource, see create_block
+        self.block = None
+        self.deactivated_vars = []
+        
+        #big M of the construction and overload constraints, None to use the value computed by the model writer
+        self.M = None
+        """Dictionary of pairs, big M name: value computed by the model writer. See big_m_bounds"""
+        self.big_m = {}
+        #arguments of big_m_bounds given by the model writer, to recompute big M when data changes. See set_big_m
+        self.big_m_args = None
+        """Dictionary of pairs, big M name: mutable pyomo Param. See big_m_coefficient"""
+        self.big_m_params = {}
+    
+    def set_scenes(self, scenes):
+        """Sets the scenes of the model under construction. Cached profiles are discarded if the 
+        scenes changed"""
+        if scenes is not self.scenes:
+            self.clear_profiles()
+        self.scenes = scenes
+        #params and presolved components belong to the previous model
+        self.params = {}
+        self.big_m_params = {}
+        self.presolved = []
+        self.presolve_active = False
+    
+    def create_block(self, model):
+        """
+        Creates the block of the resource in the model, where its vars, constraints and params are 
+        added. The block is named as the resource, with a suffix if the name is already used 
+        (i.e. two parallel lines). The model must have a scene_set.
+        """
+        self.model = model
+        name = self.name
+        suffix = 1
+        while model.component(name) is not None or hasattr(model, name):
+            suffix += 1
+            name = "{0}_{1}".format(self.name, suffix)
+        self.block = pe.Block()
+        model.add_component(name, self.block)
+        self.deactivated_vars = []
+        return self.block
+    
+    def deactivate(self):
+        """
+        Removes the resource from the solution without rebuilding the model: the constraints of its block 
+        are deactivated and its vars are fixed to 0, so a candidate is not built. Demand of loads is data
+        and it is not affected. See activate.
+        """
+        for var in self.block.component_data_objects(pe.Var, descend_into = True):
+            if not var.fixed:
+                var.fix(0.0)
+                self.deactivated_vars.append(var)
+        self.block.deactivate()
+    
+    def activate(self):
+        """Restores a resource removed with deactivate"""
+        for var in self.deactivated_vars:
+            var.unfix()
+        self.deactivated_vars = []
+        self.block.activate()
+    
+    def block_statistics(self):
+        """Returns a dict with the number of vars and active constraints of the block"""
+        return {'block': self.block.local_name,
+                'vars': sum(1 for v in self.block.component_data_objects(pe.Var, descend_into = True)),
+                'constraints': sum(1 for c in self.block.component_data_objects(pe.Constraint, active = True, descend_into = True))}
+    
+    def clear_profiles(self):
+        """Discards cached profiles, i.e. after changing the parameters of a simulator"""
+        self.profiles = {}
+        self.scene_arrays = {}
+    
+    def new_model(self):
+        """Called by the model writer before building a model with the resource: profiles of the 
+        previous model are discarded unless memoize is enabled"""
+        if not self.memoize:
+            self.clear_profiles()
+    
+    def scene_column(self, name):
+        """A scene column as a float numpy vector"""
+        if name not in self.scene_arrays:
+            self.scene_arrays[name] = np.asarray(self.scenes[name], dtype = float)
+        return self.scene_arrays[name]
+    
+    def scene_columns(self):
+        """Dict with all the scene columns, the format used by simulate_batch"""
+        return {c: self.scene_column(c) for c in self.scenes.columns}
+    
+    def profile(self, attr, default = None):
+        """
+        Values of a time-varying attribute (i.e. pa_pu, oc_1_mu) for all the scenes, as a numpy vector
+        aligned with the scene index. The attribute is evaluated once per model (see new_model and memoize), 
+        so random attributes take the same value in big M, constraints, costs and results. Assigning a new value to
+        the attribute discards its profile.
+        """
+        value = getattr(self, attr)
+        memo = self.profiles.get(attr)
+        if memo is None or memo[0] is not value:
+            memo = (value, self.evaluate_profile(value, default))
+            self.profiles[attr] = memo
+            if self.store_profiles:
+                self.scenes[self.name + '_' + attr] = memo[1]
+        return memo[1]
+    
+    def scene_data(self, attr, default = None):
+        """
+        Values of a time-varying attribute to be used in constraints and costs, indexed by scene.
+        If the resource is mutable, a mutable Param of the resource block named <name>_<attr>_param, initialized
+        with the profile, else the profile itself.
+        """
+        if not self.mutable:
+            return self.profile(attr, default)
+        if attr not in self.params:
+            values = self.profile(attr, default)
+            param = pe.Param(self.model.scene_set, mutable = True, initialize = dict(enumerate(values.tolist())))
+            setattr(self.block, self.name + '_' + attr + '_param', param)
+            self.params[attr] = param
+        return self.params[attr]
+    
+    def coefficient(self, attr):
+        """
+        A scalar attribute (i.e. oc_0_mu, ic_1_mu) to be used in constraints and costs. If the resource
+        is mutable, a mutable Param of the resource block named <name>_<attr>_param, else the value itself.
+        """
+        if not self.mutable:
+            return self[attr]
+        if attr not in self.params:
+            param = pe.Param(mutable = True, initialize = float(self[attr]))
+            setattr(self.block, self.name + '_' + attr + '_param', param)
+            self.params[attr] = param
+        return self.params[attr]
+    
+    def update_data(self, attr, values):
+        """
+        Changes an attribute in the model already built, so it can be solved again without rebuilding it.
+        values can be anything accepted by the attribute: a simulator, a function, a value by scene or a 
+        single value. The attribute must be a Param of the model, see scene_data and coefficient.
+        Big M are recomputed from the new data, returns their bounds (see update_big_m).
+        """
+        if attr not in self.params:
+            raise Exception("{0} is not a parameter of {1}, the model must be rebuilt".format(attr, self.name))
+        setattr(self, attr, values)
+        param = self.params[attr]
+        if param.is_indexed():
+            param.store_values(dict(enumerate(self.profile(attr).tolist())))
+        else:
+            param.set_value(float(self[attr]))
+        if attr == 'pa_pu' and self.presolve_active:
+            self.presolve()
+        return self.update_big_m()
+    
+    def unavailable_scenes(self):
+        """Scenes where the resource is not available, that is, pa_pu is exactly 0"""
+        return np.flatnonzero(self.profile('pa_pu', 1.0) == 0)
+    
+    def presolve_components(self, scene):
+        """Returns the vars to fix to 0 and the constraints to deactivate when the resource is not 
+        available in the scene. Resources without scene vars return an empty list."""
+        return []
+    
+    def presolve(self):
+        """
+        Removes from the model the vars and constraints of the scenes where the resource is not
+        available (i.e. PV generators at night): vars are fixed to 0 and constraints deactivated, so
+        solver interfaces do not write them. It can be undone with undo_presolve.
+        Returns the number of scenes presolved.
+        """
+        self.undo_presolve()
+        self.presolve_active = True
+        scenes = self.unavailable_scenes()
+        for s in scenes:
+            for component in self.presolve_components(int(s)):
+                if component.is_variable_type():
+                    component.fix(0.0)
+                else:
+                    component.deactivate()
+                self.presolved.append(component)
+        return len(scenes)
+    
+    def undo_presolve(self):
+        """Frees the vars and activates the constraints removed by presolve"""
+        for component in self.presolved:
+            if component.is_variable_type():
+                component.unfix()
+            else:
+                component.activate()
+        self.presolved = []
+        self.presolve_active = False
+    
+    def get_big_m(self, name = 'M'):
+        """Value of a big M: the attribute if it is given, else the value computed by the model writer, else 1e3"""
+        value = getattr(self, name, None)
+        if value is not None:
+            return value
+        return self.big_m.get(name, 1e3)
+    
+    def big_m_coefficient(self, name = 'M'):
+        """
+        A big M to be used in constraints. If the resource is mutable, a mutable Param of the resource block 
+        named <name>_<big M name>_param, so it can follow the data in update_data, else get_big_m(name).
+        """
+        if not self.mutable:
+            return self.get_big_m(name)
+        if name not in self.big_m_params:
+            param = pe.Param(mutable = True, initialize = float(self.get_big_m(name)))
+            setattr(self.block, self.name + '_' + name + '_param', param)
+            self.big_m_params[name] = param
+        return self.big_m_params[name]
+    
+    def set_big_m(self, peak_load, max_investement = None, oversize = None):
+        """Computes the big M of the resource with big_m_bounds, the arguments are kept for update_big_m.
+        Returns the bounds"""
+        self.big_m_args = (peak_load, max_investement, oversize)
+        bounds = self.big_m_bounds(peak_load, max_investement, oversize)
+        self.big_m = {k: bounds[k][0] for k in bounds}
+        return bounds
+    
+    def update_big_m(self):
+        """
+        Recomputes the big M after a change of data (i.e. the rating of a line), so they remain valid
+        bounds. Big M Params of the model are updated. Returns the bounds, None if big M were not computed
+        by a model writer. See update_data.
+        """
+        if self.big_m_args is None:
+            return None
+        bounds = self.set_big_m(*self.big_m_args)
+        for k in self.big_m_params:
+            self.big_m_params[k].set_value(float(self.get_big_m(k)))
+        return bounds
+    
+    def investement_bound(self, max_investement, unit_cost):
+        """Largest size affordable with max_investement at unit_cost by size unit, None if not bounded"""
+        if max_investement is None or not unit_cost or unit_cost <= 0:
+            return None
+        return max(max_investement - self['ic_0_mu'], 0.0)/unit_cost
+    
+    def big_m_bounds(self, peak_load, max_investement = None, oversize = None):
+        """
+        Returns a dict big M name: (value, source) with bounds of the sized quantities, computed from the 
+        scene data before the model is built. See BaseModelWriter.set_big_m.
+        Resources without construction or overload constraints return an empty dict.
+        """
+        return {}
+    
+    def big_m_bounded(self, name = 'M'):
+        """
+        Returns a pair (solved size, bound) for the size bounded by a big M, the bound being the largest 
+        size it allows. None if the big M bounds no size or the model is not solved. See big_m_report.
+        """
+        return None
+    
+    def solved_value(self, var):
+        """Value of a solved var (pyomo or sparse), None if the var is not part of a solved model"""
+        value = getattr(var, 'value', None)
+        return None if value is None else float(value)
+    
+    def scene_position(self, scene):
+        """Position of a scene given by its index or as a row of the scenes (i.e. scenes.iloc[s]).
+        None if it is not a scene of the current set."""
+        if self.scenes is None:
+            return None
+        if isinstance(scene, (int, np.integer)):
+            return int(scene)
+        if isinstance(scene, pd.Series) and scene.name is not None:
+            try:
+                return self.scenes.index.get_loc(scene.name)
+            except KeyError:
+                return None
+        return None
+    
+    def evaluate_profile(self, value, default = None):
+        """
+        Evaluates value for all the scenes, with the same rules as _element_get_value. 
+        Simulators implementing simulate_batch and methods with a *_batch* counterpart (i.e. solar_output
+        and solar_output_batch) are evaluated at once, other simulators and callables scene by scene.
+        Sequences must have a value for each scene.
+        """
+        n = len(self.scenes)
+        v = value
+        if v is None:
+            if default is not None:
+                return np.full(n, float(default))
+            else:
+                raise Exception("Not default value for {0}".format(value))
+        elif hasattr(v, "simulate_batch") and callable(v.simulate_batch):
+            return np.asarray(v.simulate_batch(self.scene_columns()), dtype = float)
+        elif (hasattr(v, "simulate") and callable(v.simulate)) or callable(v):
+            batch = getattr(getattr(v, '__self__', None), getattr(v, '__name__', '') + '_batch', None)
+            if callable(batch):
+                return np.broadcast_to(np.asarray(batch(self.scene_columns()), dtype = float), (n,))
+            
+            simulate = v.simulate if hasattr(v, "simulate") else v
+            columns = self.scene_columns()
+            values = np.zeros(n)
+            for i in range(n):
+                values[i] = simulate({k: columns[k][i] for k in columns})
+            return values
+        elif hasattr(v, "__getitem__") and hasattr(v, "__len__"):
+            values = np.asarray(v, dtype = float)
+            if len(values) != n:
+                raise Exception("{0} values given for {1} scenes".format(len(values), n))
+            return values
+        else:
+            return np.full(n, float(v))
 
     def _element_get_value(self, value, scene, default = None):
         v = value
@@ -65,6 +392,11 @@ class BaseResource:
             default = None
             if len(key) > 2:
                 default = key[2]    
+            #simulated attributes of a scene of the model are read from its profile, so they match the constraints
+            if hasattr(attr, "simulate") or inspect.isroutine(attr):
+                position = self.scene_position(scene)
+                if position is not None:
+                    return self.profile(key[0], default)[position]
             return self._element_get_value(attr, scene, default)
         else:
             raise AttributeError
@@ -77,7 +409,7 @@ class BaseResource:
     
     def initialize_model(self, model, scenes):
         self.model = model
-        self.scenes = scenes
+        self.set_scenes(scenes)
         
         raise Exception("Must implement")
     
@@ -109,3 +441,37 @@ class BaseResource:
         scene is the scene index"""
         raise Exception("Must implement")
 
+    def operating_cost_expression(self, weights):
+        """Returns the operating cost of all the scenes, weighted by scene (i.e. dt*dd*discount), as a single
+        expression. Resources override it to build a linear expression in one pass."""
+        return pe.quicksum(float(weights[s])*self.operating_cost(s) for s in range(len(weights)))
+    
+    def initialize_sparse(self, model, scenes):
+        """Adds the vars and constraints of the resource to a SparseModel, see SparseModel.add_var and add_constraints"""
+        raise Exception("Must implement - {0}".format(self))
+
+    def sparse_active_power(self):
+        """Must return the active power by scene in a SparseModel, as (terms, constant): terms is a list of
+        pairs (columns, coefficients) and constant a value or a vector by scene"""
+        raise Exception("Must implement - {0}".format(self))
+
+    def sparse_initial_cost(self):
+        """Must return the initial cost in a SparseModel, as (terms, constant)"""
+        raise Exception("Must implement - {0}".format(self))
+
+    def sparse_operating_cost(self, weights):
+        """Must return the operating cost weighted by scene in a SparseModel, as (terms, constant)"""
+        raise Exception("Must implement - {0}".format(self))
+
+    def weighted_sum(self, weights, values, var):
+        """
+        Linear expression sum of weights[s]*values[s]*var[s] over the scenes. values can be a profile, a 
+        Param (see scene_data) or a single value. If values are numeric, terms with zero coefficient are skipped.
+        """
+        if isinstance(values, (np.ndarray, int, float)):
+            c = weights*values
+            return pe.quicksum(float(c[s])*var[s] for s in np.flatnonzero(c).tolist())
+        if not values.is_indexed():
+            return values*pe.quicksum(float(weights[s])*var[s] for s in range(len(weights)))
+        return pe.quicksum(float(weights[s])*values[s]*var[s] for s in range(len(weights)))
+
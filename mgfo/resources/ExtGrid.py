@@ -18,15 +18,18 @@ class ExtGrid(BaseResource):
     
     def initialize_model(self, model, scenes):
         self.model = model
-        self.scenes = scenes
+        self.set_scenes(scenes)
+        self.create_block(model)
 
         #energia comprada a la red
         vn = self.name + '_p_mw'
         self.p_mw = pe.Var(model.scene_set, within = pe.NonNegativeReals)
-        setattr(self.model, vn, self.p_mw)
+        setattr(self.block, vn, self.p_mw)
+        pa_pu = self.scene_data('pa_pu')
+        pr_mw = self.coefficient('pr_mw')
         for e in self.model.scene_set:
             self.p_mw[e].setlb(0)
-            self.p_mw[e].setub(self['pa_pu', self.scenes.iloc[e]]*self['pr_mw'])
+            self.p_mw[e].setub(pa_pu[e]*pr_mw)
         #this var will be reported
         self.report_attrs[vn] = self.p_mw
 
@@ -53,14 +56,38 @@ class ExtGrid(BaseResource):
     def available_power(self, scene):
         """Returns available active power in mw, in numeric form.
         scene is the scene index"""
-        return self['pa_pu', self.scenes.iloc[scene]]*self['pr_mw']
+        return self.profile('pa_pu')[scene]*self['pr_mw']
+
+    def initialize_sparse(self, model, scenes):
+        """Same vars as initialize_model, in a SparseModel"""
+        self.model = model
+        self.set_scenes(scenes)
+        self.p_mw = model.add_var(self.name + '_p_mw', len(scenes), ub = self.profile('pa_pu')*self['pr_mw'])
+        self.report_attrs[self.name + '_p_mw'] = self.p_mw
+
+    def sparse_active_power(self):
+        return [(self.p_mw, 1.0)], 0.0
+
+    def sparse_initial_cost(self):
+        return [], self['ic_0_mu'] + self['ic_1_mu']*self['pr_mw']
+
+    def sparse_operating_cost(self, weights):
+        return [(self.p_mw, weights*self.profile('oc_1_mu'))], self['oc_0_mu']*float(weights.sum())
+
+    def presolve_components(self, scene):
+        """Purchased power is bounded to 0 in unavailable scenes"""
+        return [self.p_mw[scene]]
 
     def initial_cost(self):
         """Must return initial cost in monetary units, in numeric form or as an expression of the decision variables."""
-        return self['ic_0_mu'] + self['ic_1_mu']*self['pr_mw']
+        return self.coefficient('ic_0_mu') + self.coefficient('ic_1_mu')*self.coefficient('pr_mw')
 
     def operating_cost(self, scene):
         """Must return initial cost in monetary units, in numeric form or as an expression of the decision variables
         scene is the scene index"""
-        return self['oc_0_mu'] + self['oc_1_mu', self.scenes.iloc[scene]]*self.p_mw[scene]
+        return self.coefficient('oc_0_mu') + self.scene_data('oc_1_mu')[scene]*self.p_mw[scene]
+
+    def operating_cost_expression(self, weights):
+        """Returns the operating cost weighted by scene as a single linear expression"""
+        return self.coefficient('oc_0_mu')*float(weights.sum()) + self.weighted_sum(weights, self.scene_data('oc_1_mu'), self.p_mw)
     
\ No newline at end of file
@@ -19,16 +19,35 @@ class Load(BaseResource):
     
     def initialize_model(self, model, scenes):
         self.model = model
-        self.scenes = scenes
+        self.set_scenes(scenes)
+        self.create_block(model)
         
         ##self.scene_iterator = range(len(self.scenes))
         self.scene_iterator = self.model.scene_set
-        #energia demandada a la red
-        vn = self.name + '_p_mw'
-        self.p_mw = pe.Var(self.scene_iterator, within = pe.Reals)
-        setattr(self.model, vn, self.p_mw)
-        #this var will be reported
-        self.report_attrs[vn] = self.p_mw
+        #demanded power is data, not a decision: it enters the power balance as a constant and no vars are created.
+        #p_mw keeps the consumed power by scene, to be reported
+        self.p_mw = self.power_values()
+        self.report_attrs[self.name + '_p_mw'] = self.power_values
+
+    def initialize_sparse(self, model, scenes):
+        """Loads add no vars to a SparseModel, demand is a constant of the power balance"""
+        self.model = model
+        self.set_scenes(scenes)
+        self.p_mw = self.power_values()
+        self.report_attrs[self.name + '_p_mw'] = self.power_values
+
+    def sparse_active_power(self):
+        return [], self.p_mw
+
+    def sparse_initial_cost(self):
+        return [], self['ic_0_mu'] + self['ic_1_mu']*self['pr_mw']
+
+    def sparse_operating_cost(self, weights):
+        return [], self['oc_0_mu']*float(weights.sum()) + float(np.dot(weights*self.profile('oc_1_mu'), self.p_mw))
+
+    def power_values(self):
+        """Returns the consumed power by scene in mw as a numpy vector, negative by convention"""
+        return -self.profile('pa_pu')*self['pr_mw']
 
     def get_scenes_results(self, data_frame, include_inactive = False):
         """Add simulation results to the data frame, assumed same lenght as the scene collection.
@@ -37,34 +56,40 @@ class Load(BaseResource):
         Returns:
             data_frame"""
         for attr in self.report_attrs:
-            res = np.zeros(len(self.scenes))
-            for i in range(len(self.scenes)):
-                res[i] = self.report_attrs[attr][i].value
-            data_frame[attr] = res            
+            data_frame[attr] = self.report_attrs[attr]()
         return data_frame
     
     def active_power(self, scene):
-        """Returns active power in mw, in numeric form or as an expression of the decision variables.
+        """Returns active power in mw, in numeric form, or as an expression of the params if the load is mutable.
         scene is the scene index. For loads, all available power is consumed. By convention, consumed power is negative."""
-        #results are stored in a fixed var in order to preserve data, pyomo var is used for consistency
-        if not self.p_mw[scene].fixed:
-            p = -self.available_power(scene)
-            self.p_mw[scene].value = p
-            self.p_mw[scene].fixed = True
-                
-        return self.p_mw[scene].value
+        if self.mutable:
+            #demand is given by the params, so update_data changes the power balance
+            return -self.scene_data('pa_pu')[scene]*self.coefficient('pr_mw')
+        return float(self.p_mw[scene])
+
+    def update_data(self, attr, values):
+        """Changes an attribute in the model already built, see BaseResource.update_data.
+        The reported consumed power is updated too."""
+        super().update_data(attr, values)
+        self.p_mw = self.power_values()
 
     def available_power(self, scene):
         """Returns available active power in mw, in numeric form.
         scene is the scene index"""
-        return self['pa_pu', self.scenes.iloc[scene]]*self['pr_mw']
+        return self.profile('pa_pu')[scene]*self['pr_mw']
 
     def initial_cost(self):
         """Must return initial cost in monetary units, in numeric form or as an expression of the decision variables."""
-        return self['ic_0_mu'] + self['ic_1_mu']*self['pr_mw']
+        return self.coefficient('ic_0_mu') + self.coefficient('ic_1_mu')*self.coefficient('pr_mw')
 
     def operating_cost(self, scene):
         """Must return initial cost in monetary units, in numeric form or as an expression of the decision variables
         scene is the scene index"""
-        return self['oc_0_mu'] + self['oc_1_mu', self.scenes.iloc[scene]]*self['p_mw', scene]
+        return self.coefficient('oc_0_mu') + self.scene_data('oc_1_mu')[scene]*self.active_power(scene)
+
+    def operating_cost_expression(self, weights):
+        """Returns the operating cost weighted by scene. Demand is data, so it is a constant unless the load is mutable."""
+        if self.mutable:
+            return super().operating_cost_expression(weights)
+        return self.coefficient('oc_0_mu')*float(weights.sum()) + float(np.dot(weights*self.profile('oc_1_mu'), self.p_mw))
     
\ No newline at end of file
@@ -1,65 +1,52 @@
 from .BaseGen import Generator, DiscreteGenerator
 
+import numpy as np
 
-class PVGenerator(Generator):
-    
-    def __init__(self, name, ic_0_mu = 0.0, ic_1_mu = 0.0, oc_0_mu = 0.0, oc_1_mu = 0.0, degradation = 5e-3):
-        super().__init__(name, ic_0_mu = ic_0_mu, ic_1_mu = ic_1_mu, oc_0_mu = oc_0_mu, oc_1_mu = oc_1_mu)
-        
+
+class SolarPanelModel:
+    """
+    Output of PV panels, shared by PVGenerator and PVGeneratorDiscrete.
+
+    Simple model using the solar irradiance of the scenes, normalized to 1000 W/m2 and derated by
+    degradation per year. Irradiances outside [0, max_irradiance) (or not a number) raise a ValueError.
+    """
+
+    def init_solar_model(self, degradation = 5e-3, max_irradiance = 1300):
         self.degradation = degradation
+        self.max_irradiance = max_irradiance
         self['pa_pu'] = self.solar_output
-        
-    def solar_output(self, model_status):
-        #modelo sencillo
-        #usando los datos de radiacion solar entregada por el modelo
-        #considero el valor normal 1000 W/m2
-        res = 0.0
-        degradation = 1 - self.degradation*model_status['year']
-        if 'solar_irradiance' in model_status:
-            I = model_status['solar_irradiance']
-            if 0.0 <= I and I < 1300:
-                res = I / 1000.0 * degradation
-            else:
-                raise ValueError("Solar radiation outside model range")
-        else:
+
+    def solar_output_batch(self, columns):
+        """Per unit output for a dict of scene columns"""
+        if 'solar_irradiance' not in columns:
             raise ValueError("Solar radiation not defined")
-        return res
-        
-class PVGeneratorDiscrete(DiscreteGenerator):
-    
+        I = np.asarray(columns['solar_irradiance'], dtype = float)
+        #written as the negation of the valid range, so nan values are rejected too
+        if not np.all((0.0 <= I) & (I < self.max_irradiance)):
+            raise ValueError("Solar radiation outside model range")
+        degradation = 1 - self.degradation*np.asarray(columns['year'], dtype = float)
+        return I / 1000.0 * degradation
+
     def solar_output(self, model_status):
-        #modelo sencillo
-        #usando los datos de radiacion solar entregada por el modelo
-        #considero el valor normal 1000 W/m2
-        res = 0.0
-        if 'I' in model_status:
-            I = model_status['I']
-            if 0.0 <= I and I < 1300:
-                res = I / 1000.0
-            else:
-                raise ValueError("Solar radiation outside model range")
-        else:
+        """Per unit output for a single scene"""
+        if 'solar_irradiance' not in model_status:
             raise ValueError("Solar radiation not defined")
-        return res
-    
+        columns = {'solar_irradiance': np.array([model_status['solar_irradiance']], dtype = float),
+                   'year': np.array([model_status['year']], dtype = float)}
+        return float(self.solar_output_batch(columns)[0])
+
+
+class PVGenerator(SolarPanelModel, Generator):
+
+    def __init__(self, name, ic_0_mu = 0.0, ic_1_mu = 0.0, oc_0_mu = 0.0, oc_1_mu = 0.0, degradation = 5e-3):
+        super().__init__(name, ic_0_mu = ic_0_mu, ic_1_mu = ic_1_mu, oc_0_mu = oc_0_mu, oc_1_mu = oc_1_mu)
+
+        self.init_solar_model(degradation = degradation, max_irradiance = 1300)
+
+
+class PVGeneratorDiscrete(SolarPanelModel, DiscreteGenerator):
+
     def __init__(self, name, unit_size_mw = 0.25, unit_cost_mu = 1.0, oc_0_mu = 0.0, oc_1_mu = 0.0, degradation = 5e-3):
         super().__init__(name, unit_size_mw = unit_size_mw, unit_cost_mu = unit_cost_mu, oc_0_mu = oc_0_mu, oc_1_mu = oc_1_mu)
-        
-        self.degradation = degradation
-        self['pa_pu'] = self.solar_output
-        
-    def solar_output(self, model_status):
-        #modelo sencillo
-        #usando los datos de radiacion solar entregada por el modelo
-        #considero el valor normal 1000 W/m2
-        res = 0.0
-        degradation = 1 - self.degradation*model_status['year']
-        if 'solar_irradiance' in model_status:
-            I = model_status['solar_irradiance']
-            if 0.0 <= I and I < 1200:
-                res = I / 1000.0 * degradation
-            else:
-                raise ValueError("Solar radiation outside model range")
-        else:
-            raise ValueError("Solar radiation not defined")
-        return res
+
+        self.init_solar_model(degradation = degradation, max_irradiance = 1200)
@@ -38,141 +38,145 @@ class SimpleLine(BaseResource):
         
         self.overload_cost = overload_cost
         self.overload_hours = overload_hours
-        
-        self.M = 1e3
     
     def __str__(self):
         return 'Line: ' + self.name
         
     def initialize_model(self, model, scenes):
         self.model = model
-        self.scenes = scenes
+        self.set_scenes(scenes)
+        self.create_block(model)
         
         self.scene_iterator = self.model.scene_set
         
         #power flow
         vn = self.name + '_pf_mw'
         self.pf_mw = pe.Var(self.scene_iterator, within = pe.Reals)
-        setattr(self.model, vn, self.pf_mw)
+        setattr(self.block, vn, self.pf_mw)
         #this var will be reported
         self.report_attrs[vn] = self.pf_mw
         #power transmission limits:
+        pa_pu = self.scene_data('pa_pu')
+        pr_mw = self.coefficient('pr_mw')
         for s in self.scene_iterator:
-            self.pf_mw[s].setlb(- self.pr_mw * self.max_i_pu * self['pa_pu', self.scenes.iloc[s]])
-            self.pf_mw[s].setub(- self.pf_mw[s].lb)
+            self.pf_mw[s].setlb(- pr_mw * self.max_i_pu * pa_pu[s])
+            self.pf_mw[s].setub(pr_mw * self.max_i_pu * pa_pu[s])
+        
+        #bound of excess and base power, see big_m_bounds
+        M = self.big_m_coefficient('M')
         
         if not self.overload_cost is None:
             #total excess power
             self.excess_power_mw = pe.Var(self.scene_iterator, within = pe.NonNegativeReals)
             vn = self.name + '_ep_mw'
-            setattr(self.model, vn, self.excess_power_mw)
+            setattr(self.block, vn, self.excess_power_mw)
             #this var will be reported
             self.report_attrs[vn] = self.excess_power_mw
             #Excess power by positive pf
             self.excess_power_p = pe.Var(self.scene_iterator, within = pe.NonNegativeReals)
             vn = self.name + '_epp_mw'
-            setattr(self.model, vn, self.excess_power_p)
+            setattr(self.block, vn, self.excess_power_p)
             #Excess power by negative pf
             self.excess_power_n = pe.Var(self.scene_iterator, within = pe.NonNegativeReals)
             vn = self.name + '_epn_mw'
-            setattr(self.model, vn, self.excess_power_n)
+            setattr(self.block, vn, self.excess_power_n)
             #Base power, positive pf
             self.base_power_p = pe.Var(self.scene_iterator, within = pe.NonNegativeReals)
             vn = self.name + '_bpp_mw'
-            setattr(self.model, vn, self.base_power_p)
+            setattr(self.block, vn, self.base_power_p)
             #Base power, negative pf
             self.base_power_n = pe.Var(self.scene_iterator, within = pe.NonNegativeReals)
             vn = self.name + '_bpn_mw'
-            setattr(self.model, vn, self.base_power_n)
+            setattr(self.block, vn, self.base_power_n)
             #y-constraints:
             self.y1 = pe.Var(self.scene_iterator, within = pe.Binary)
             vn = self.name + '_y1'
-            setattr(self.model, vn, self.y1)
+            setattr(self.block, vn, self.y1)
             self.y2 = pe.Var(self.scene_iterator, within = pe.Binary)
             vn = self.name + '_y2'
-            setattr(self.model, vn, self.y2)
+            setattr(self.block, vn, self.y2)
                 
             #after vars declaration, model:
             vn = self.name + '_c1'
             constraint = pe.Constraint(self.scene_iterator, rule = (lambda m, scene: self.excess_power_mw[scene] == 
                                                                self.excess_power_p[scene] + self.excess_power_n[scene])) 
-            setattr(self.model, vn, constraint)
+            setattr(self.block, vn, constraint)
 
             vn = self.name + '_c2'
             constraint = pe.Constraint(self.scene_iterator, rule = (lambda m, scene: self.excess_power_p[scene] <= 
-                                                               self.M*self.y1[scene])) 
-            setattr(self.model, vn, constraint)
+                                                               M*self.y1[scene])) 
+            setattr(self.block, vn, constraint)
 
             vn = self.name + '_c3'
             constraint = pe.Constraint(self.scene_iterator, rule = (lambda m, scene: self.base_power_p[scene] <= 
-                                                               self.M*(1-self.y1[scene]))) 
-            setattr(self.model, vn, constraint)
+                                                               M*(1-self.y1[scene]))) 
+            setattr(self.block, vn, constraint)
 
             vn = self.name + '_c4'
             constraint = pe.Constraint(self.scene_iterator, rule = (lambda m, scene: self.excess_power_n[scene] <= 
-                                                               self.M*self.y2[scene])) 
-            setattr(self.model, vn, constraint)
+                                                               M*self.y2[scene])) 
+            setattr(self.block, vn, constraint)
 
             vn = self.name + '_c5'
             constraint = pe.Constraint(self.scene_iterator, rule = (lambda m, scene: self.base_power_n[scene] <= 
-                                                               self.M*(1-self.y2[scene]))) 
-            setattr(self.model, vn, constraint)
+                                                               M*(1-self.y2[scene]))) 
+            setattr(self.block, vn, constraint)
 
             vn = self.name + '_c6'
-            constraint = pe.Constraint(self.scene_iterator, rule = (lambda m, scene: self.pf_mw[scene] - self.pr_mw == 
+            constraint = pe.Constraint(self.scene_iterator, rule = (lambda m, scene: self.pf_mw[scene] - pr_mw == 
                                                                        self.excess_power_p[scene] - self.base_power_p[scene]))
-            setattr(self.model, vn, constraint)
+            setattr(self.block, vn, constraint)
 
             vn = self.name + '_c7'
-            constraint = pe.Constraint(self.scene_iterator, rule = (lambda m, scene: -self.pf_mw[scene] - self.pr_mw == 
+            constraint = pe.Constraint(self.scene_iterator, rule = (lambda m, scene: -self.pf_mw[scene] - pr_mw == 
                                                                        self.excess_power_n[scene] - self.base_power_n[scene]))
-            setattr(self.model, vn, constraint)
+            setattr(self.block, vn, constraint)
         
         if not self.overload_hours is None:
             #excess power hours for positive and negatie power flow:
             self.ep_h_p = pe.Var(self.scene_iterator, within = pe.Binary)
             vn = self.name + '_ep_h_p'
-            setattr(self.model, vn, self.ep_h_p)
+            setattr(self.block, vn, self.ep_h_p)
             self.ep_h_n = pe.Var(self.scene_iterator, within = pe.Binary)
             vn = self.name + '_ep_h_n'
-            setattr(self.model, vn, self.ep_h_n)
+            setattr(self.block, vn, self.ep_h_n)
             #excess power, positive or negative:
             self.ep_h = pe.Var(self.scene_iterator, within = pe.Binary)
             vn = self.name + '_ep_h'
-            setattr(self.model, vn, self.ep_h)
+            setattr(self.block, vn, self.ep_h)
             #this var will be reported
             self.report_attrs[vn] = self.ep_h
             
             #constraints:
             vn = self.name + '_c_h_1'
-            constraint = pe.Constraint(self.scene_iterator, rule = (lambda m, scene: self.pf_mw[scene] - self.pr_mw <= 
-                                                               self.M*self.ep_h_p[scene])) 
-            setattr(self.model, vn, constraint)
+            constraint = pe.Constraint(self.scene_iterator, rule = (lambda m, scene: self.pf_mw[scene] - pr_mw <= 
+                                                               M*self.ep_h_p[scene])) 
+            setattr(self.block, vn, constraint)
 
             vn = self.name + '_c_h_2'
-            constraint = pe.Constraint(self.scene_iterator, rule = (lambda m, scene: - self.pf_mw[scene] + self.pr_mw <= 
-                                                               self.M*(1 - self.ep_h_p[scene]))) 
-            setattr(self.model, vn, constraint)
+            constraint = pe.Constraint(self.scene_iterator, rule = (lambda m, scene: - self.pf_mw[scene] + pr_mw <= 
+                                                               M*(1 - self.ep_h_p[scene]))) 
+            setattr(self.block, vn, constraint)
 
             vn = self.name + '_c_h_3'
-            constraint = pe.Constraint(self.scene_iterator, rule = (lambda m, scene: -self.pf_mw[scene] - self.pr_mw <= 
-                                                               self.M*self.ep_h_n[scene])) 
-            setattr(self.model, vn, constraint)
+            constraint = pe.Constraint(self.scene_iterator, rule = (lambda m, scene: -self.pf_mw[scene] - pr_mw <= 
+                                                               M*self.ep_h_n[scene])) 
+            setattr(self.block, vn, constraint)
 
             vn = self.name + '_c_h_4'
-            constraint = pe.Constraint(self.scene_iterator, rule = (lambda m, scene:  self.pf_mw[scene] + self.pr_mw <= 
-                                                               self.M*(1 - self.ep_h_n[scene]))) 
-            setattr(self.model, vn, constraint)
+            constraint = pe.Constraint(self.scene_iterator, rule = (lambda m, scene:  self.pf_mw[scene] + pr_mw <= 
+                                                               M*(1 - self.ep_h_n[scene]))) 
+            setattr(self.block, vn, constraint)
             
             vn = self.name + '_c_h_5'
             constraint = pe.Constraint(self.scene_iterator, rule = (lambda m, scene: self.ep_h[scene] == 
                                                                         self.ep_h_p[scene] + self.ep_h_n[scene])) 
-            setattr(self.model, vn, constraint)
+            setattr(self.block, vn, constraint)
 
             vn = self.name + '_c_h_max'            
-            constraint = pe.Constraint(rule = (sum(self.ep_h[s]*self.scenes.iloc[s]['dt']*self.scenes.iloc[s]['dd'] 
-                                                   for s in self.model.scene_set) <= self.overload_hours))
-            setattr(self.model, vn, constraint)
+            hours = self.scene_column('dt')*self.scene_column('dd')
+            constraint = pe.Constraint(rule = (self.weighted_sum(hours, 1.0, self.ep_h) <= self.overload_hours))
+            setattr(self.block, vn, constraint)
 
 
         #active power: power losses are not contemplated in this model
@@ -193,7 +197,8 @@ class SimpleLine(BaseResource):
         return data_frame
     
     def get_tep_h(self):
-        return sum(self.ep_h[s].value*self.scenes.iloc[s]['dt']*self.scenes.iloc[s]['dd'] for s in self.model.scene_set)
+        hours = self.scene_column('dt')*self.scene_column('dd')
+        return float(np.dot(hours, [self.ep_h[s].value for s in self.model.scene_set]))
         
     def active_power(self, scene):
         """Active power is limited to the power losses. That is to avoid double accounting of the 
@@ -207,11 +212,89 @@ class SimpleLine(BaseResource):
     def available_power(self, scene):
         """Returns available capacity in mw (mva), in numeric form.
         scene is the scene index"""
-        return self['pa_pu', self.scenes.iloc[scene]]*self['pr_mw']
+        return self.profile('pa_pu')[scene]*self['pr_mw']
+
+    def presolve_components(self, scene):
+        """Power flow is bounded to 0 in unavailable scenes, i.e. faults"""
+        return [self.pf_mw[scene]]
+
+    def initialize_sparse(self, model, scenes):
+        """Same vars and constraints as initialize_model, in a SparseModel"""
+        self.model = model
+        self.set_scenes(scenes)
+        n = len(scenes)
+        pr_mw = self['pr_mw']
+        M = self.get_big_m('M')
+        
+        limit = pr_mw*self.max_i_pu*self.profile('pa_pu')
+        self.pf_mw = model.add_var(self.name + '_pf_mw', n, lb = -limit, ub = limit)
+        self.report_attrs[self.name + '_pf_mw'] = self.pf_mw
+        
+        if not self.overload_cost is None:
+            self.excess_power_mw = model.add_var(self.name + '_ep_mw', n)
+            self.report_attrs[self.name + '_ep_mw'] = self.excess_power_mw
+            self.excess_power_p = model.add_var(self.name + '_epp_mw', n)
+            self.excess_power_n = model.add_var(self.name + '_epn_mw', n)
+            self.base_power_p = model.add_var(self.name + '_bpp_mw', n)
+            self.base_power_n = model.add_var(self.name + '_bpn_mw', n)
+            self.y1 = model.add_var(self.name + '_y1', n, ub = 1.0, integer = True)
+            self.y2 = model.add_var(self.name + '_y2', n, ub = 1.0, integer = True)
+            
+            model.add_constraints(self.name + '_c1', [(self.excess_power_mw, 1.0), (self.excess_power_p, -1.0), (self.excess_power_n, -1.0)], 
+                                  lb = 0.0, ub = 0.0)
+            model.add_constraints(self.name + '_c2', [(self.excess_power_p, 1.0), (self.y1, -M)], ub = 0.0)
+            model.add_constraints(self.name + '_c3', [(self.base_power_p, 1.0), (self.y1, M)], ub = M)
+            model.add_constraints(self.name + '_c4', [(self.excess_power_n, 1.0), (self.y2, -M)], ub = 0.0)
+            model.add_constraints(self.name + '_c5', [(self.base_power_n, 1.0), (self.y2, M)], ub = M)
+            model.add_constraints(self.name + '_c6', [(self.pf_mw, 1.0), (self.excess_power_p, -1.0), (self.base_power_p, 1.0)], 
+                                  lb = pr_mw, ub = pr_mw)
+            model.add_constraints(self.name + '_c7', [(self.pf_mw, -1.0), (self.excess_power_n, -1.0), (self.base_power_n, 1.0)], 
+                                  lb = pr_mw, ub = pr_mw)
+        
+        if not self.overload_hours is None:
+            self.ep_h_p = model.add_var(self.name + '_ep_h_p', n, ub = 1.0, integer = True)
+            self.ep_h_n = model.add_var(self.name + '_ep_h_n', n, ub = 1.0, integer = True)
+            self.ep_h = model.add_var(self.name + '_ep_h', n, ub = 1.0, integer = True)
+            self.report_attrs[self.name + '_ep_h'] = self.ep_h
+            
+            model.add_constraints(self.name + '_c_h_1', [(self.pf_mw, 1.0), (self.ep_h_p, -M)], ub = pr_mw)
+            model.add_constraints(self.name + '_c_h_2', [(self.pf_mw, -1.0), (self.ep_h_p, M)], ub = M - pr_mw)
+            model.add_constraints(self.name + '_c_h_3', [(self.pf_mw, -1.0), (self.ep_h_n, -M)], ub = pr_mw)
+            model.add_constraints(self.name + '_c_h_4', [(self.pf_mw, 1.0), (self.ep_h_n, M)], ub = M - pr_mw)
+            model.add_constraints(self.name + '_c_h_5', [(self.ep_h, 1.0), (self.ep_h_p, -1.0), (self.ep_h_n, -1.0)], lb = 0.0, ub = 0.0)
+            
+            hours = self.scene_column('dt')*self.scene_column('dd')
+            model.add_row(self.name + '_c_h_max', [(self.ep_h, hours)], ub = self.overload_hours)
+        
+        #active power: power losses are not contemplated in this model
+        self.p_mw = 0.0
+    
+    def sparse_active_power(self):
+        return [], 0.0
+    
+    def sparse_transmited_power(self):
+        """Power transmited by scene in a SparseModel, as a list of terms"""
+        return [(self.pf_mw, 1.0)]
+    
+    def sparse_initial_cost(self):
+        return [], self['ic_0_mu'] + self['ic_1_mu']*self['pr_mw']
+    
+    def sparse_operating_cost(self, weights):
+        terms = [(self.pf_mw, self['oc_1_mu']*weights)]
+        if not self.overload_cost is None:
+            terms.append((self.excess_power_mw, self.overload_cost*weights))
+        return terms, self['oc_0_mu']*float(weights.sum())
+    
+    def big_m_bounds(self, peak_load, max_investement = None, oversize = None):
+        """Excess and base power are bounded by the rating plus the maximum power flow"""
+        if self.overload_cost is None and self.overload_hours is None:
+            return {}
+        pa_max = float(np.max(self.profile('pa_pu', 1.0), initial = 0.0))
+        return {'M': (self['pr_mw']*(1.0 + self.max_i_pu*pa_max), 'line rating')}
 
     def initial_cost(self):
         """Returns initial cost in monetary units, in numeric form or as an expression of the decision variables."""
-        return self['ic_0_mu'] + self['ic_1_mu']*self['pr_mw']
+        return self.coefficient('ic_0_mu') + self.coefficient('ic_1_mu')*self.coefficient('pr_mw')
 
     def operating_cost(self, scene):
         """Returns initial cost in monetary units, in numeric form or as an expression of the decision variables
@@ -221,4 +304,11 @@ class SimpleLine(BaseResource):
         else:
             excess_penalty = 0.0
             
-        return self['oc_0_mu'] + self['oc_1_mu']*self['pf_mw', scene] + excess_penalty
+        return self.coefficient('oc_0_mu') + self.coefficient('oc_1_mu')*self['pf_mw', scene] + excess_penalty
+
+    def operating_cost_expression(self, weights):
+        """Returns the operating cost weighted by scene as a single linear expression"""
+        cost = self.coefficient('oc_0_mu')*float(weights.sum()) + self.weighted_sum(weights, self.coefficient('oc_1_mu'), self.pf_mw)
+        if not self.overload_cost is None:
+            cost += self.weighted_sum(weights, self.overload_cost, self.excess_power_mw)
+        return cost
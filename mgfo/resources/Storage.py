@@ -1,5 +1,6 @@
 import pyomo.environ as pe
 from .BaseGen import Generator
+import numpy as np
 
 class Storage(Generator):
     
@@ -21,79 +22,94 @@ class Storage(Generator):
         #available power:
         self.pa_pu = 1.0
         
+        #big M of the energy capacity, None to use the value computed by the model writer
+        self.M_er = None
+        
+    def chain_starts(self):
+        """True for the scenes where soc starts from 0: the first one and, if scenes have a *start* column,
+        the marked ones (i.e. the first scene of each realization of an ensemble, see SceneEnsemble.to_scenes)"""
+        starts = np.arange(len(self.scenes)) == 0
+        if 'start' in self.scenes:
+            starts |= self.scene_column('start') != 0
+        return starts
+    
     def initialize_model(self, model, scenes):
         self.model = model
-        self.scenes = scenes
+        self.set_scenes(scenes)
+        self.create_block(model)
         self.scene_iterator = self.model.scene_set
-        self.M = 1e3
         
         #to create storage
         vn = self.name + '_create'
         self.create = pe.Var(within = pe.Binary)
-        setattr(self.model, vn, self.create)
+        setattr(self.block, vn, self.create)
         
         #pr sizing d.v.        
         vn = self.name + '_pr_mw'
         self.pr_mw = pe.Var(within = pe.NonNegativeReals)
-        setattr(self.model, vn, self.pr_mw)        
+        setattr(self.block, vn, self.pr_mw)        
 
         #er sizing d.v.        
         vn = self.name + '_er_mwh'
         self.er_mwh = pe.Var(within = pe.NonNegativeReals)
-        setattr(self.model, vn, self.er_mwh)
+        setattr(self.block, vn, self.er_mwh)
 
         #generated energy
         vn = self.name + '_p_mw'
         self.p_mw = pe.Var(self.scene_iterator, within = pe.Reals)
-        setattr(self.model, vn, self.p_mw)
+        setattr(self.block, vn, self.p_mw)
         #this var will be reported
         self.report_attrs[vn] = self.p_mw
 
         #stored energy
         vn = self.name + '_soc_mwh'
         self.soc_mwh = pe.Var(self.scene_iterator, within = pe.NonNegativeReals)
-        setattr(self.model, vn, self.soc_mwh)
+        setattr(self.block, vn, self.soc_mwh)
         #this var will be reported
         self.report_attrs[vn] = self.soc_mwh
 
+        pa_pu = self.scene_data('pa_pu')
+        dt = self.scene_column('dt')
+        
         #power rating constraint
         cn = self.name + '_p_constraint_pr'
-        self.p_mw_constraint_pr = pe.Constraint(self.scene_iterator, rule = (lambda m, s: self.p_mw[s] <= self.pr_mw*self['pa_pu', s] ))
-        setattr(self.model, cn, self.p_mw_constraint_pr)
+        self.p_mw_constraint_pr = pe.Constraint(self.scene_iterator, rule = (lambda m, s: self.p_mw[s] <= self.pr_mw*pa_pu[s] ))
+        setattr(self.block, cn, self.p_mw_constraint_pr)
 
         #charging power less that power rating
         cn = self.name + '_p_constraint_charge'
-        self.p_mw_constraint_charge = pe.Constraint(self.scene_iterator, rule = (lambda m, s: -self.pr_mw*self['pa_pu', s] <= self.p_mw[s]))
-        setattr(self.model, cn, self.p_mw_constraint_charge)
+        self.p_mw_constraint_charge = pe.Constraint(self.scene_iterator, rule = (lambda m, s: -self.pr_mw*pa_pu[s] <= self.p_mw[s]))
+        setattr(self.block, cn, self.p_mw_constraint_charge)
 
         #available energy constraint
         cn = self.name + '_p_constraint_soc'
-        self.p_mw_constraint_soc = pe.Constraint(self.scene_iterator, rule = (lambda m, s: self.p_mw[s] <= self.soc_mwh[s]/self.scenes['dt'][s]))
-        setattr(self.model, cn, self.p_mw_constraint_soc)
+        self.p_mw_constraint_soc = pe.Constraint(self.scene_iterator, rule = (lambda m, s: self.p_mw[s] <= self.soc_mwh[s]/dt[s]))
+        setattr(self.block, cn, self.p_mw_constraint_soc)
 
-        #oc update on each scene
-        storage_energy_expression = (lambda m, s: self.soc_mwh[s] == self.soc_mwh[s-1]*(1-self.sigma) - self.p_mw[s]*self.scenes['dt'][s]*self.eta_bb
-                                           if s>0 else self.soc_mwh[s] == 0 )
+        #oc update on each scene, the chain starts empty
+        starts = self.chain_starts()
+        storage_energy_expression = (lambda m, s: self.soc_mwh[s] == self.soc_mwh[s-1]*(1-self.sigma) - self.p_mw[s]*dt[s]*self.eta_bb
+                                           if not starts[s] else self.soc_mwh[s] == 0 )
         
         cn = self.name + '_soc_constraint'
         self.soc_constraint = pe.Constraint(self.scene_iterator, rule = storage_energy_expression)
-        setattr(self.model, cn, self.soc_constraint)
+        setattr(self.block, cn, self.soc_constraint)
         
         #upper limit on soc
         cn = self.name + '_soc_constraint_er'
         self.soc_constraint_er = pe.Constraint(self.scene_iterator, rule = (lambda m,s: self.soc_mwh[s] <= self.er_mwh))
-        setattr(self.model, cn, self.soc_constraint_er)
+        setattr(self.block, cn, self.soc_constraint_er)
         
         
         #Big M for power rating
         cn = self.name + '_p_M_constraint'        
-        self.create_constraint_pr = pe.Constraint(expr = self.pr_mw <= self.create*self.M)
-        setattr(self.model, cn, self.create_constraint_pr)
+        self.create_constraint_pr = pe.Constraint(expr = self.pr_mw <= self.create*self.big_m_coefficient('M'))
+        setattr(self.block, cn, self.create_constraint_pr)
 
         #Big M for capacity
         cn = self.name + '_e_M_constraint'        
-        self.create_constraint_er = pe.Constraint(expr = self.er_mwh <= self.create*self.M)
-        setattr(self.model, cn, self.create_constraint_er)
+        self.create_constraint_er = pe.Constraint(expr = self.er_mwh <= self.create*self.big_m_coefficient('M_er'))
+        setattr(self.block, cn, self.create_constraint_er)
     
         return
         
@@ -105,13 +121,79 @@ class Storage(Generator):
     def available_power(self, scene):
         """Returns available active power in mw, in numeric form.
         scene is the scene index"""
-        return self['pa_pu', self.scenes.iloc[scene]]*self['pr_mw']
+        return self.profile('pa_pu')[scene]*self['pr_mw']
+
+    def presolve_components(self, scene):
+        """Without available power, the storage only self-discharges"""
+        return [self.p_mw[scene], self.p_mw_constraint_pr[scene], self.p_mw_constraint_charge[scene], self.p_mw_constraint_soc[scene]]
+
+    def initialize_sparse(self, model, scenes):
+        """Same vars and constraints as initialize_model, in a SparseModel"""
+        self.model = model
+        self.set_scenes(scenes)
+        n = len(scenes)
+        pa_pu = self.profile('pa_pu')
+        dt = self.scene_column('dt')
+
+        self.create = model.add_var(self.name + '_create', ub = 1.0, integer = True)
+        self.pr_mw = model.add_var(self.name + '_pr_mw')
+        self.er_mwh = model.add_var(self.name + '_er_mwh')
+        available = np.where(pa_pu == 0, 0.0, np.inf)
+        self.p_mw = model.add_var(self.name + '_p_mw', n, lb = -available, ub = available)
+        self.report_attrs[self.name + '_p_mw'] = self.p_mw
+        self.soc_mwh = model.add_var(self.name + '_soc_mwh', n)
+        self.report_attrs[self.name + '_soc_mwh'] = self.soc_mwh
+
+        model.add_constraints(self.name + '_p_constraint_pr', [(self.p_mw, 1.0), (self.pr_mw, -pa_pu)], ub = 0.0)
+        model.add_constraints(self.name + '_p_constraint_charge', [(self.p_mw, -1.0), (self.pr_mw, -pa_pu)], ub = 0.0)
+        model.add_constraints(self.name + '_p_constraint_soc', [(self.p_mw, 1.0), (self.soc_mwh, -1.0/dt)], ub = 0.0)
+
+        #soc[s] = soc[s-1]*(1-sigma) - p[s]*dt[s]*eta_bb, soc[0] = 0
+        first = self.chain_starts()
+        previous = self.soc_mwh.columns - np.where(first, 0, 1)
+        model.add_constraints(self.name + '_soc_constraint', [(self.soc_mwh, 1.0), (previous, np.where(first, 0.0, -(1 - self.sigma))),
+                                                              (self.p_mw, np.where(first, 0.0, dt*self.eta_bb))], lb = 0.0, ub = 0.0)
+        model.add_constraints(self.name + '_soc_constraint_er', [(self.soc_mwh, 1.0), (self.er_mwh, -1.0)], ub = 0.0)
+
+        model.add_constraints(self.name + '_p_M_constraint', [(self.pr_mw, 1.0), (self.create, -self.get_big_m('M'))], ub = 0.0)
+        model.add_constraints(self.name + '_e_M_constraint', [(self.er_mwh, 1.0), (self.create, -self.get_big_m('M_er'))], ub = 0.0)
+
+    def sparse_initial_cost(self):
+        terms, constant = super().sparse_initial_cost()
+        return terms + [(self.er_mwh, self['ic_1_mu_cap'])], constant
+
+    def big_m_bounds(self, peak_load, max_investement = None, oversize = None):
+        """Rated power as for generators, energy capacity is bounded by the capacity affordable with 
+        max_investement and, if oversize is given, by oversize times a day of peak load"""
+        bounds = super().big_m_bounds(peak_load, max_investement, oversize)
+        er_bounds = []
+        if oversize and peak_load > 0:
+            er_bounds.append((oversize*peak_load*24.0, 'peak load'))
+        affordable = self.investement_bound(max_investement, self['ic_1_mu_cap'])
+        if affordable is not None:
+            er_bounds.append((affordable, 'investement'))
+        if er_bounds:
+            bounds['M_er'] = min(er_bounds)
+        return bounds
+    
+    def big_m_bounded(self, name = 'M'):
+        """Rated power or energy capacity (M_er) and its big M"""
+        if name != 'M_er':
+            return super().big_m_bounded(name)
+        size = self.solved_value(self.er_mwh)
+        return None if size is None else (size, self.get_big_m('M_er'))
 
     def initial_cost(self):
         """Returns initial cost in monetary units, in numeric form or as an expression of the decision variables."""
-        return self['ic_0_mu']*self['create'] + self['ic_1_mu']*self['pr_mw'] + self['ic_1_mu_cap']*self['er_mwh']
+        return (self.coefficient('ic_0_mu')*self['create'] + self.coefficient('ic_1_mu')*self['pr_mw'] 
+                + self.coefficient('ic_1_mu_cap')*self['er_mwh'])
 
     def operating_cost(self, scene):
         """Returns initial cost in monetary units, in numeric form or as an expression of the decision variables
         scene is the scene index"""
-        return self['oc_0_mu']*self['pr_mw'] + self['oc_1_mu']*self.p_mw[scene]
+        return self.coefficient('oc_0_mu')*self['pr_mw'] + self.scene_data('oc_1_mu')[scene]*self.p_mw[scene]
+
+    def operating_cost_expression(self, weights):
+        """Returns the operating cost weighted by scene as a single linear expression"""
+        return (self.coefficient('oc_0_mu')*self['pr_mw']*float(weights.sum()) 
+                + self.weighted_sum(weights, self.scene_data('oc_1_mu'), self.p_mw))
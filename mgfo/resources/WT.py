@@ -1,56 +1,112 @@
 from .BaseGen import Generator, DiscreteGenerator
 
-class WTGenerator(Generator):
-    def __init__(self, name, ic_0_mu = 0.0, ic_1_mu = 0.0, oc_0_mu = 0.0, oc_1_mu = 0.0, cut_in = 3.0, v_rated = 15.0, cut_out = 25.0):
-        super().__init__(name, ic_0_mu = ic_0_mu, ic_1_mu = ic_1_mu, oc_0_mu = oc_0_mu, oc_1_mu = oc_1_mu)
-        
+import numpy as np
+
+#standard air density, kg/m^3
+STANDARD_AIR_DENSITY = 1.225
+
+class WindTurbineModel:
+    """
+    Power curve of wind turbines, shared by WTGenerator and WTGeneratorDiscrete.
+
+    By default a cubic approximation between cut_in and v_rated is used, rated output up to cut_out.
+    A manufacturer curve can be given as power_curve = (speeds, outputs), outputs in per unit or, if
+    curve_rated_power is given, in the same units as curve_rated_power. Curves are linearly interpolated,
+    with no output outside the table or from cut_out on.
+
+    The scene wind_speed can be corrected before entering the curve:
+        hub_height: speed is extrapolated from measurement_height with the power law shear_exponent.
+        air_density: a value in kg/m^3, or the name of a scene column. Speed is scaled by
+            (air_density/1.225)^(1/3), the usual density normalization of power curves.
+    """
+
+    def init_wind_model(self, cut_in = 3.0, v_rated = 15.0, cut_out = 25.0, power_curve = None, curve_rated_power = None,
+                        hub_height = None, measurement_height = 10.0, shear_exponent = 1.0/7.0, air_density = None):
         self.cut_in = cut_in
         self.v_rated = v_rated
         self.cut_out = cut_out
+        self.hub_height = hub_height
+        self.measurement_height = measurement_height
+        self.shear_exponent = shear_exponent
+        self.air_density = air_density
+        self.set_power_curve(power_curve, curve_rated_power)
         self['pa_pu'] = self.wind_output
-    
-    def wind_output(self, scene):
-        res = 0.0
-        if 'wind_speed' in scene:
-            wv = scene['wind_speed']
-            if 0.0 <= wv and wv < self.cut_in:
-                res = 0.0
-            elif self.cut_in <= wv and wv < self.v_rated:
-                res = (wv**3 - self.cut_in**3)/(self.v_rated**3 - self.cut_in**3)
-            elif self.v_rated <= wv and wv < self.cut_out:
-                res = 1.0
-            else:
-                res = 0.0
-        else:
+
+    def set_power_curve(self, power_curve, curve_rated_power = None):
+        """Sets a tabulated power curve (speeds, outputs), None for the cubic approximation"""
+        if power_curve is None:
+            self.curve_speeds = None
+            self.curve_outputs = None
+            return
+
+        speeds = np.asarray(power_curve[0], dtype = float)
+        outputs = np.asarray(power_curve[1], dtype = float)
+        if speeds.shape != outputs.shape or np.any(np.diff(speeds) <= 0):
+            raise ValueError("Power curve speeds must be increasing, with an output for each speed")
+        if curve_rated_power:
+            outputs = outputs/curve_rated_power
+        self.curve_speeds = speeds
+        self.curve_outputs = outputs
+
+    def hub_wind_speed(self, columns):
+        """Wind speed at the hub, density-corrected, for a dict of scene columns"""
+        if 'wind_speed' not in columns:
             raise ValueError("Wind speed not defined")
+        wv = np.asarray(columns['wind_speed'], dtype = float)
+
+        if self.hub_height:
+            wv = wv*(self.hub_height/self.measurement_height)**self.shear_exponent
+
+        if isinstance(self.air_density, str):
+            if self.air_density not in columns:
+                raise ValueError("Air density not defined")
+            wv = wv*(np.asarray(columns[self.air_density], dtype = float)/STANDARD_AIR_DENSITY)**(1.0/3.0)
+        elif self.air_density:
+            wv = wv*(self.air_density/STANDARD_AIR_DENSITY)**(1.0/3.0)
+
+        return wv
+
+    def wind_output_batch(self, columns):
+        """Per unit output for a dict of scene columns"""
+        wv = self.hub_wind_speed(columns)
 
+        if self.curve_speeds is None:
+            res = np.where((self.cut_in <= wv) & (wv < self.v_rated), (wv**3 - self.cut_in**3)/(self.v_rated**3 - self.cut_in**3), 0.0)
+            return np.where((self.v_rated <= wv) & (wv < self.cut_out), 1.0, res)
+
+        res = np.interp(wv, self.curve_speeds, self.curve_outputs, left = 0.0, right = 0.0)
+        if self.cut_out is not None:
+            res = np.where(wv < self.cut_out, res, 0.0)
         return res
-        
-        
-class WTGeneratorDiscrete(DiscreteGenerator):
 
-    def __init__(self, name, unit_size_mw = 0.25, unit_cost_mu = 1.0, ic_0_mu = 0.0, oc_0_mu = 0.0, oc_1_mu = 0.0, 
-                 cut_in = 3.0, v_rated = 15.0, cut_out = 25.0):
-        super().__init__(name, unit_size_mw = unit_size_mw, unit_cost_mu = unit_cost_mu, ic_0_mu = ic_0_mu, oc_0_mu = oc_0_mu, oc_1_mu = oc_1_mu)
-        
-        self.cut_in = cut_in
-        self.v_rated = v_rated
-        self.cut_out = cut_out
-        self['pa_pu'] = self.wind_output
-        
     def wind_output(self, scene):
-        res = 0.0
-        if 'wind_speed' in scene:
-            wv = scene['wind_speed']
-            if 0.0 <= wv and wv < self.cut_in:
-                res = 0.0
-            elif self.cut_in <= wv and wv < self.v_rated:
-                res = (wv**3 - self.cut_in**3)/(self.v_rated**3 - self.cut_in**3)
-            elif self.v_rated <= wv and wv < self.cut_out:
-                res = 1.0
-            else:
-                res = 0.0
-        else:
+        """Per unit output for a single scene"""
+        if 'wind_speed' not in scene:
             raise ValueError("Wind speed not defined")
+        columns = {'wind_speed': np.array([scene['wind_speed']], dtype = float)}
+        if isinstance(self.air_density, str) and self.air_density in scene:
+            columns[self.air_density] = np.array([scene[self.air_density]], dtype = float)
+        return float(self.wind_output_batch(columns)[0])
+
+
+class WTGenerator(WindTurbineModel, Generator):
+    def __init__(self, name, ic_0_mu = 0.0, ic_1_mu = 0.0, oc_0_mu = 0.0, oc_1_mu = 0.0, cut_in = 3.0, v_rated = 15.0, cut_out = 25.0,
+                 power_curve = None, curve_rated_power = None, hub_height = None, measurement_height = 10.0, shear_exponent = 1.0/7.0,
+                 air_density = None):
+        super().__init__(name, ic_0_mu = ic_0_mu, ic_1_mu = ic_1_mu, oc_0_mu = oc_0_mu, oc_1_mu = oc_1_mu)
+
+        self.init_wind_model(cut_in = cut_in, v_rated = v_rated, cut_out = cut_out, power_curve = power_curve,
+                             curve_rated_power = curve_rated_power, hub_height = hub_height, measurement_height = measurement_height,
+                             shear_exponent = shear_exponent, air_density = air_density)
+
+
+class WTGeneratorDiscrete(WindTurbineModel, DiscreteGenerator):
+
+    def __init__(self, name, unit_size_mw = 0.25, unit_cost_mu = 1.0, ic_0_mu = 0.0, oc_0_mu = 0.0, oc_1_mu = 0.0,
+                 cut_in = 3.0, v_rated = 15.0, cut_out = 25.0, power_curve = None, curve_rated_power = None, hub_height = None,
+                 measurement_height = 10.0, shear_exponent = 1.0/7.0, air_density = None):
+        super().__init__(name, unit_size_mw = unit_size_mw, unit_cost_mu = unit_cost_mu, ic_0_mu = ic_0_mu, oc_0_mu = oc_0_mu, oc_1_mu = oc_1_mu)
 
-        return res
\ No newline at end of file
+        self.init_wind_model(cut_in = cut_in, v_rated = v_rated, cut_out = cut_out, power_curve = power_curve,
+                             curve_rated_power = curve_rated_power, hub_height = hub_height, measurement_height = measurement_height,
+                             shear_exponent = shear_exponent, air_density = air_density)
@@ -0,0 +1,121 @@
+"""
+Clustering helpers used by SceneBuilder to select representative days.
+Each row of *features* is a day profile, columns are the concatenated
+(normalized) hourly values of the clustered quantities.
+Random generators follow the numpy interface (np.random or a numpy Generator).
+"""
+import numpy as np
+
+def squared_distances(features, centers):
+    """Matrix of squared euclidean distances, rows: features, columns: centers"""
+    d = (features*features).sum(axis = 1)[:, None] - 2*features @ centers.T + (centers*centers).sum(axis = 1)[None, :]
+    return np.maximum(d, 0.0)
+
+def kmeans_plus_plus(features, n_clusters, rng = None):
+    """k-means++ seeding. Returns the indexes of the initial centers"""
+    rng = np.random if rng is None else rng
+    n = len(features)
+    centers = [int(rng.choice(n))]
+    closest = squared_distances(features, features[centers]).min(axis = 1)
+
+    for c in range(1, n_clusters):
+        total = closest.sum()
+        if total <= 0.0:
+            #all points already coincide with a center
+            candidates = np.setdiff1d(np.arange(n), centers)
+            centers.append(int(rng.choice(candidates)))
+        else:
+            centers.append(int(rng.choice(n, p = closest/total)))
+        closest = np.minimum(closest, squared_distances(features, features[centers[-1:]])[:, 0])
+
+    return np.array(centers)
+
+def kmeans(features, n_clusters, iterations = 100, rng = None):
+    """
+    Lloyd's k-means.
+    Returns:
+        labels: cluster of each row
+        centers: cluster centroids
+    """
+    features = np.asarray(features, dtype = float)
+    centers = features[kmeans_plus_plus(features, n_clusters, rng)].copy()
+    labels = None
+
+    for it in range(iterations):
+        d = squared_distances(features, centers)
+        new_labels = d.argmin(axis = 1)
+        if labels is not None and np.array_equal(labels, new_labels):
+            break
+        labels = new_labels
+
+        for c in range(n_clusters):
+            members = labels == c
+            if members.any():
+                centers[c] = features[members].mean(axis = 0)
+            else:
+                #empty cluster is moved to the worst represented point
+                centers[c] = features[d.min(axis = 1).argmax()]
+
+    return labels, centers
+
+def kmedoids(features, n_clusters, iterations = 100, rng = None):
+    """
+    Alternating k-medoids (Voronoi iteration).
+    Returns:
+        labels: cluster of each row
+        medoids: row index of each medoid
+    """
+    features = np.asarray(features, dtype = float)
+    distances = np.sqrt(squared_distances(features, features))
+    medoids = kmeans_plus_plus(features, n_clusters, rng)
+
+    for it in range(iterations):
+        labels = distances[:, medoids].argmin(axis = 1)
+        new_medoids = medoids.copy()
+        for c in range(n_clusters):
+            members = np.flatnonzero(labels == c)
+            if len(members) > 0:
+                cost = distances[np.ix_(members, members)].sum(axis = 1)
+                new_medoids[c] = members[cost.argmin()]
+        if np.array_equal(new_medoids, medoids):
+            break
+        medoids = new_medoids
+
+    labels = distances[:, medoids].argmin(axis = 1)
+    return labels, medoids
+
+def representative_days(features, n_clusters, method = 'kmedoids', rng = None):
+    """
+    Selects n_clusters representative rows of features.
+    For 'kmeans' the representative is the member closest to the centroid,
+    for 'kmedoids' is the medoid itself.
+    Returns:
+        days: indexes of the representative rows, sorted
+        weights: number of rows represented by each one
+        labels: position in days of the representative of each row
+    """
+    features = np.asarray(features, dtype = float)
+    n = len(features)
+
+    if n_clusters >= n:
+        return np.arange(n), np.ones(n), np.arange(n)
+
+    if method == 'kmeans':
+        labels, centers = kmeans(features, n_clusters, rng = rng)
+        d = squared_distances(features, centers)
+        d[labels[:, None] != np.arange(n_clusters)[None, :]] = np.inf
+        representatives = d.argmin(axis = 0)
+    elif method == 'kmedoids':
+        labels, representatives = kmedoids(features, n_clusters, rng = rng)
+    else:
+        raise Exception("Clustering method {0} not supported".format(method))
+
+    #empty clusters are dropped
+    sizes = np.bincount(labels, minlength = n_clusters)
+    used = np.flatnonzero(sizes > 0)
+    order = used[np.argsort(representatives[used])]
+
+    position = np.full(n_clusters, -1)
+    position[order] = np.arange(len(order))
+
+    return representatives[order], sizes[order].astype(float), position[labels]
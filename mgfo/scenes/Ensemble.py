@@ -0,0 +1,64 @@
+import pandas as pd
+import numpy as np
+
+
+class SceneEnsemble:
+    """
+    SceneEnsemble class
+
+    A set of stochastic realizations of the same scenes, as built by SceneBuilder.build_ensemble.
+    Time and deterministic columns are stored once in the *base* DataFrame, stochastic columns
+    are stored in *samples* as (samples x scenes) arrays.
+
+    Any realization can be obtained as a regular scenes DataFrame with *realization*, and
+    *to_scenes* stacks all of them in a single DataFrame, with dd divided by the number of samples,
+    so a model writer optimizes the expected cost over the ensemble. The first scene of each
+    realization is marked in a *start* column, where storage starts empty again.
+    """
+
+    def __init__(self, base, samples, columns):
+        self.base = base
+        self.samples = samples
+        self.columns = columns
+
+    @property
+    def n_samples(self):
+        for c in self.samples:
+            return self.samples[c].shape[0]
+        return 1
+
+    def __len__(self):
+        return self.n_samples
+
+    def __iter__(self):
+        for i in range(self.n_samples):
+            yield self.realization(i)
+
+    def column(self, name):
+        """Returns a (samples x scenes) array for any column. Deterministic columns are broadcasted views."""
+        if name in self.samples:
+            return self.samples[name]
+        return np.broadcast_to(self.base[name].to_numpy(), (self.n_samples, len(self.base)))
+
+    def realization(self, i):
+        """Returns the scenes DataFrame of the i-th realization"""
+        data = {}
+        for c in self.columns:
+            data[c] = self.samples[c][i] if c in self.samples else self.base[c]
+        return pd.DataFrame(data, index = self.base.index)
+
+    def to_scenes(self):
+        """Returns all realizations stacked in a single scenes DataFrame, with a *sample* column and a
+        *start* column, True at the first scene of each sample, so energy of storage is not carried from
+        one realization to the next. dd is divided by the number of samples, so weighted sums are 
+        ensemble averages."""
+        n = self.n_samples
+        rows = len(self.base)
+        data = {'sample': np.repeat(np.arange(n), rows), 'start': np.arange(n*rows) % max(rows, 1) == 0}
+        for c in self.columns:
+            if c in self.samples:
+                data[c] = self.samples[c].ravel()
+            else:
+                data[c] = np.tile(self.base[c].to_numpy(), n)
+        data['dd'] = data['dd']/n
+        return pd.DataFrame(data)
@@ -1,10 +1,30 @@
 import pandas as pd
 import numpy as np
 import math
+import zlib
+import copy
+import json
+import os
+
+from concurrent.futures import ProcessPoolExecutor
 
 from ..simulation import Economics
 from ..simulation import Solar
 from ..simulation import Wind
+from ..simulation import Measured
+from . import Clustering
+from .SceneCache import SceneCache, fingerprint, load_scenes
+from .Ensemble import SceneEnsemble
+
+
+def build_year_task(builder, year, days_array, hours_array):
+    """Process pool entry point, see SceneBuilder.build_year"""
+    return builder.build_year(year, days_array, hours_array)
+
+
+def build_ensemble_year_task(builder, year, days_array, hours_array, n_samples):
+    """Process pool entry point, see SceneBuilder.build_ensemble_year"""
+    return builder.build_ensemble_year(year, days_array, hours_array, n_samples)
 
 
 class SceneBuilder:
@@ -37,10 +57,59 @@ class SceneBuilder:
         -Using the subperiods argument: n subperiods are extracted for the year, equally-spaced, of 
         *days_in_subperiods* days each. In this case, dd = 365/(subperiods*days_in_subperiods)
         First subperiod starts as given by *subperiod_start*
+    
+    Alternatively, a reduced set of representative days can be obtained by clustering: with
+    *representative_days* = N a full year is built, the daily profiles of *cluster_columns*
+    (by default solar_irradiance, wind_speed and demand, when present) are grouped in N clusters
+    using *cluster_method* ('kmeans' or 'kmedoids') and only one day of each cluster is kept.
+    In this case dd is a per scene weight, equal to the number of days in the cluster.
+    
+    When a *seed* is given, each column gets an independent random stream for each year, derived
+    from the seed and the column name, and simulators are reset at the start of every year.
+    Scenes are then reproducible and any year can be generated on its own with identical results.
+    Without seed, simulators keep their own random streams and state along the whole period.
+    
+    For long horizons, iter_scenes yields the scenes in chunks of a given number of rows, without
+    building the full table. Chunks never span two years, and simulator state is carried from one 
+    chunk to the next, so with a seed the chunks are identical to the rows of build_scenes. 
+    to_parquet and to_npy write the chunks directly to disk.
+    
+    With *cache_dir*, scenes of a seeded builder are stored on disk as memory-mapped columns, keyed
+    by the fingerprint of the configuration (time grid, rates, clustering, seed and each column's
+    simulator parameters). build_scenes then loads a stored table instead of regenerating it.
+    The cache keeps at most *cache_max_bytes*, evicting least recently used entries.
+    Use invalidate_cache to remove the entry of the current configuration.
+    
+    In *compact* mode scenes take less memory: year and day are stored as small unsigned integers,
+    hour as integer (or float32 if fractional), constant dt and dd columns as sparse columns
+    (a single stored value) and, if *float_dtype* is given (i.e. numpy.float32), simulated
+    columns are stored with that type. Yearly blocks are compacted before leaving worker processes.
+    
+    Columns can read other columns (i.e. demand reads growth). Each column declares the columns it reads
+    (see add_column) and columns are evaluated in dependency order, insertion order being kept otherwise.
+    After changing a simulator, rebuild_scenes recomputes only that column and the ones that read it.
+    
+    Generators simulating several columns at once (i.e. multi-site wind or solar, see 
+    simulation.MultiSite) are added with a tuple of column names.
+    
+    Measured series (CSV, Parquet or .npy files) can replace simulated columns with load_measurements.
+    Measurements are resampled on the scene grid, see simulation.Measured.MeasuredSeries.
+    
+    build_ensemble generates many stochastic realizations at once, as a SceneEnsemble: deterministic
+    columns are simulated once and shared, stochastic ones are stored as (samples x scenes) arrays.
+    
+    Years can be built in parallel processes with build_scenes(workers = N). Results are identical
+    to a serial build with the same seed. If no seed was given, a random one is drawn for that build
+    only, as independent streams are needed for each process; *seed* is left unset. Simulators and 
+    generators must be picklable (i.e. not lambdas) to be sent to the workers.
     """
     
+    #columns built by time_columns
+    time_column_names = ('year', 'day', 'dd', 'hour', 'dt')
+    
     def __init__(self, years=1, subperiods=1, days_in_subperiods=365, subperiod_start=0, dd=None,  dt=None, discount_rate=0.0, growth_rate=0.0, 
-                selected_days = None, selected_hours = None, scenes = None):
+                selected_days = None, selected_hours = None, scenes = None, representative_days = None, cluster_method = 'kmedoids',
+                cluster_columns = None, seed = None, cache_dir = None, cache_max_bytes = None, compact = False, float_dtype = None):
         self.years = years
         self.subperiods = subperiods
         self.subperiod_start = subperiod_start
@@ -50,6 +119,20 @@ class SceneBuilder:
         self.selected_days = selected_days
         self.selected_hours = selected_hours
         self.scenes = scenes
+        self.representative_days = representative_days
+        self.cluster_method = cluster_method
+        self.seed = seed
+        self.compact = compact
+        self.float_dtype = float_dtype
+        self.cache = SceneCache(cache_dir, cache_max_bytes) if cache_dir else None
+        
+        if cluster_columns is None:
+            self.cluster_columns = ['solar_irradiance', 'wind_speed', 'demand']
+        else:
+            self.cluster_columns = cluster_columns
+        
+        if representative_days and selected_days:
+            raise Exception("representative_days and selected_days can not be used simultaneously")
         
         if selected_days and not dd:
             raise Exception("dd must be specified when using selected_days")
@@ -68,11 +151,98 @@ class SceneBuilder:
             self.dd = dd
         
         self.additional_columns = {}
+        self.column_dependencies = {}
+        #time grid and column fingerprints of the current scenes, see rebuild_scenes
+        self.built_grid = None
+        self.built_fingerprints = None
         
         self.add_standard_columns()
         
-    def add_column(self, name, generator):
+    def add_column(self, name, generator, depends_on = None):
+        """Adds a column, or replaces it keeping its position. depends_on lists the columns read by
+        the generator, besides time columns. By default it is taken from generator.depends_on and
+        generators that do not declare it are assumed to read all the previously added columns.
+        Declared columns that are not built are ignored.
+        name can be a tuple of names for generators returning several values for each scene as
+        a (scenes x names) array, i.e. multi-site simulators."""
+        if isinstance(name, list):
+            name = tuple(name)
+        if depends_on is None:
+            depends_on = getattr(generator, 'depends_on', None)
         self.additional_columns[name] = generator
+        self.column_dependencies[name] = None if depends_on is None else tuple(depends_on)
+    
+    def output_names(self, key):
+        """Scene columns of an entry of additional_columns"""
+        return list(key) if isinstance(key, tuple) else [key]
+    
+    def scene_columns(self):
+        """Simulated scene columns, in insertion order"""
+        return [name for key in self.additional_columns for name in self.output_names(key)]
+    
+    def column_key(self, name):
+        """Entry of additional_columns that simulates a scene column, None for time columns"""
+        for key in self.additional_columns:
+            if name == key or (isinstance(key, tuple) and name in key):
+                return key
+        return None
+    
+    def get_dependencies(self, name):
+        """Built columns read by a column"""
+        names = list(self.additional_columns)
+        depends_on = self.column_dependencies.get(name)
+        if depends_on is None:
+            return names[:names.index(name)]
+        keys = [self.column_key(d) for d in depends_on]
+        return [k for i, k in enumerate(keys) if k is not None and k != name and k not in keys[:i]]
+    
+    def column_levels(self):
+        """Columns in dependency order, grouped in levels: the columns of a level only read columns
+        of previous levels. Insertion order is kept within each level."""
+        pending = {c: set(self.get_dependencies(c)) for c in self.additional_columns}
+        levels = []
+        while pending:
+            level = [c for c in pending if not pending[c]]
+            if not level:
+                raise Exception("Cyclic dependencies between columns {0}".format(list(pending)))
+            for c in level:
+                del pending[c]
+            for c in pending:
+                pending[c].difference_update(level)
+            levels.append(level)
+        return levels
+    
+    def column_order(self):
+        return [c for level in self.column_levels() for c in level]
+    
+    def downstream_columns(self, names):
+        """The given columns and all the columns that read them, directly or not"""
+        result = set(names)
+        for c in self.column_order():
+            if any(d in result for d in self.get_dependencies(c)):
+                result.add(c)
+        return [c for c in self.additional_columns if c in result]
+    
+    def upstream_columns(self, names):
+        """Columns read by the given ones, directly or not, excluding them"""
+        result = set()
+        pending = list(names)
+        while pending:
+            for d in self.get_dependencies(pending.pop()):
+                if d not in result:
+                    result.add(d)
+                    pending.append(d)
+        return [c for c in self.additional_columns if c in result and c not in names]
+    
+    def load_measurements(self, path, columns, time_column = None, how = 'mean', start_year = None, scale = None):
+        """Adds (or replaces) columns with measured series read from a file, see Measured.read_measurements.
+        columns is a dict scene column: file column, only these columns are read.
+        how and scale can be single values or dicts by scene column."""
+        hours, data = Measured.read_measurements(path, columns.values(), time_column)
+        for col in columns:
+            col_how = how[col] if isinstance(how, dict) else how
+            col_scale = scale.get(col, 1.0) if isinstance(scale, dict) else (1.0 if scale is None else scale)
+            self.add_column(col, Measured.MeasuredSeries(hours, data[columns[col]], how = col_how, start_year = start_year, scale = col_scale))
     
     def add_standard_columns(self):
         dg = Economics.DeterministicGrowthSimulator(annual_rate = self.growth_rate)
@@ -87,59 +257,515 @@ class SceneBuilder:
         wind = Wind.CorrelatedWeibull()
         self.add_column('wind_speed', wind)
         
-    def build_scenes(self):
-        """Escene building is made in two steps. First, the time part is resolved.
-        In the second part, the data list with additional columns is iterated and the corresponding simulation
-        functions are called in order to complete each scene"""
-        column_list = {}
-
+    def get_hours_array(self):
+        """Hours of the day to simulate"""
         if self.selected_hours:
-            hours_array = self.selected_hours
-            daily_registers = len(self.selected_hours)
+            return np.asarray(self.selected_hours, dtype=float)
         else:
             daily_registers = math.floor(24.0/self.dt)
-            hours_array = [self.dt*i for i in range(daily_registers)]
-        
-        #We made an array for the selected days in the year, based on the user choices
+            return np.array([self.dt*i for i in range(daily_registers)])
+    
+    def get_days_array(self):
+        """Days of the year to simulate, based on the user choices. Updates dd when subperiods are used"""
         if self.selected_days:
-            days = len(self.selected_days)
-            days_array = self.selected_days
-        else:
-            day_number = self.subperiod_start
-            subperiod_jump = math.floor(365/self.subperiods)
-            days_array = []
-            for s in range(self.subperiods):
-                for sd in range(self.days_in_subperiods):
-                    days_array.append(day_number)
-                    day_number += 1
-                day_number += (subperiod_jump - self.days_in_subperiods)
-                
-            days = len(days_array)
-            self.dd = 365.0/days
+            return np.asarray(self.selected_days, dtype=float)
+        
+        day_number = self.subperiod_start
+        subperiod_jump = math.floor(365/self.subperiods)
+        days_array = []
+        for s in range(self.subperiods):
+            for sd in range(self.days_in_subperiods):
+                days_array.append(day_number)
+                day_number += 1
+            day_number += (subperiod_jump - self.days_in_subperiods)
             
-        total_registers = self.years * days * daily_registers
+        self.dd = 365.0/len(days_array)
+        return np.asarray(days_array, dtype=float)
+    
+    def stream_seed(self, name, year):
+        """Seed of the independent random stream for a column (or any named task) in a year.
+        Returns None if the builder is not seeded."""
+        if self.seed is None:
+            return None
+        if isinstance(name, tuple):
+            name = ','.join(name)
+        return np.random.SeedSequence(self.seed, spawn_key = (zlib.crc32(name.encode()), year))
+    
+    def time_columns(self, year, days_array, hours_array, start = 0, stop = None):
+        """Time columns of a year, or of the rows start:stop of the year. Returns a dict of numpy arrays."""
+        column_list = {}
+        daily_registers = len(hours_array)
+        if stop is None:
+            stop = len(days_array) * daily_registers
+        rows = np.arange(start, stop)
+        total_registers = len(rows)
 
-        reg = 0
         #Accessing pandas data frames are painfully slow.
         #columns are stored in numpy arrays and later transferred to the data frame
-        days = np.zeros(total_registers)
-        hours = np.zeros(total_registers)
-        years = np.zeros(total_registers)
-        
-        for y in range(self.years):
-            for d in days_array:
-                for h in hours_array:
-                    days[reg] = d
-                    hours[reg] = h
-                    years[reg] = y 
-                    reg += 1
-
-        column_list['year'] = years
-        column_list['day'] = days
+        column_list['year'] = np.full(total_registers, float(year))
+        column_list['day'] = days_array[rows // daily_registers]
         column_list['dd'] = np.ones(total_registers)*self.dd
-        column_list['hour'] = hours
+        column_list['hour'] = hours_array[rows % daily_registers]
         column_list['dt'] = np.ones(total_registers)*self.dt
         
+        return column_list
+    
+    def reset_generator(self, name, year):
+        """Resets the generator of a column with its stream for the year, if the builder is seeded"""
+        generator = self.additional_columns[name]
+        seed = self.stream_seed(name, year)
+        if seed is not None and hasattr(generator, "reset") and callable(generator.reset):
+            generator.reset(seed)
+    
+    def build_year_columns(self, year, days_array, hours_array, start = 0, stop = None):
+        """Builds the scenes of a single year, or the rows start:stop of the year. Time columns are resolved 
+        first, then the data list with additional columns is iterated and the corresponding simulation 
+        functions are called in order to complete each scene. Returns a dict of numpy arrays.
+        Simulators are reset (if seeded) only at the start of the year, otherwise they continue 
+        from their current state."""
+        column_list = self.time_columns(year, days_array, hours_array, start, stop)
+        return self.simulate_columns(column_list, year if start == 0 else None)
+    
+    def simulate_columns(self, column_list, year = None, names = None):
+        """Simulates the additional columns (or only *names*) in dependency order, adding each one to 
+        column_list as soon as it is computed. If year is given, generators are reset with their 
+        stream for the year."""
+        for col in self.column_order():
+            if names is not None and col not in names:
+                continue
+            if year is not None:
+                self.reset_generator(col, year)
+            self.set_column_values(column_list, col, self.simulate_column(self.additional_columns[col], column_list))
+        
+        return self.order_columns(column_list)
+    
+    def set_column_values(self, column_list, key, values):
+        """Stores the values simulated for an entry of additional_columns in column_list"""
+        if not isinstance(key, tuple):
+            column_list[key] = values
+            return
+        
+        values = np.asarray(values).reshape(len(values), -1)
+        if values.shape[1] != len(key):
+            raise Exception("Generator of {0} returned {1} values by scene".format(key, values.shape[1]))
+        for i, name in enumerate(key):
+            column_list[name] = np.ascontiguousarray(values[:, i])
+    
+    def order_columns(self, column_list):
+        """Moves the additional columns of column_list after the time columns, in insertion order"""
+        for col in self.scene_columns():
+            if col in column_list:
+                column_list[col] = column_list.pop(col)
+        return column_list
+    
+    def concatenate_columns(self, blocks):
+        """Joins a list of column dicts (i.e. yearly blocks) in a single one"""
+        return {k: np.concatenate([b[k] for b in blocks]) for k in blocks[0]}
+    
+    def build_year(self, year, days_array, hours_array):
+        """Builds a year, reduced to its representative days if clustering is enabled.
+        Returns the dict of columns and the clustering results (None if not clustered)."""
+        column_list = self.build_year_columns(year, days_array, hours_array)
+        clusters = None
+        if self.representative_days:
+            column_list, clusters = self.reduce_to_representative_days(year, column_list)
+        return self.compact_columns(column_list, hours_array), clusters
+    
+    def build_years(self, days_array, hours_array, workers = None):
+        """Builds all years, serially or in a process pool of *workers* processes.
+        Returns a list with the result of build_year for each year."""
+        if not workers or workers <= 1 or self.years <= 1:
+            return [self.build_year(y, days_array, hours_array) for y in range(self.years)]
+        
+        #the built scenes are not needed by the workers
+        builder = copy.copy(self)
+        builder.scenes = None
+        #independent streams are needed for each process, the seed drawn is only used by this build
+        if builder.seed is None:
+            builder.seed = np.random.SeedSequence().entropy
+        
+        with ProcessPoolExecutor(max_workers = workers) as pool:
+            return list(pool.map(build_year_task, [builder]*self.years, range(self.years), 
+                                 [days_array]*self.years, [hours_array]*self.years))
+    
+    def build_columns(self, days_array, hours_array, workers = None):
+        """Builds all years, returns a dict of numpy arrays."""
+        results = self.build_years(days_array, hours_array, workers)
+        
+        if self.representative_days:
+            self.cluster_days = [r[1]['days'] for r in results]
+            self.cluster_weights = [r[1]['weights'] for r in results]
+            self.cluster_labels = [r[1]['labels'] for r in results]
+            
+        return self.concatenate_columns([r[0] for r in results])
+        
+    def grid_config(self):
+        """Description of the time grid and everything that determines the scenes, except the columns"""
+        days_array = np.arange(365.0) if self.representative_days else self.get_days_array()
+        config = {
+            'years': self.years,
+            'days': days_array,
+            'hours': self.get_hours_array(),
+            'dt': self.dt,
+            'dd': None if self.representative_days else self.dd,
+            'discount_rate': self.discount_rate,
+            'growth_rate': self.growth_rate,
+            'representative_days': self.representative_days,
+            'cluster_method': self.cluster_method,
+            'cluster_columns': self.cluster_columns,
+            'seed': self.seed,
+            'compact': self.compact,
+            'float_dtype': None if self.float_dtype is None else np.dtype(self.float_dtype).str
+        }
+        return config
+    
+    def fingerprint(self):
+        """Stable hash of everything that determines the built scenes"""
+        config = self.grid_config()
+        config['columns'] = [[col, self.additional_columns[col]] for col in self.additional_columns]
+        return fingerprint(config)
+    
+    def column_fingerprints(self):
+        """Stable hash of each column generator, together with the time grid"""
+        grid = fingerprint(self.grid_config())
+        return {col: fingerprint([grid, col, self.additional_columns[col]]) for col in self.additional_columns}
+    
+    def invalidate_cache(self):
+        """Removes the cached scenes of the current configuration. Returns True if there were any."""
+        if self.cache is None:
+            return False
+        return self.cache.invalidate(self.fingerprint())
+        
+    def build_scenes(self, workers = None):
+        """Escene building is made in two steps. First, the time part is resolved.
+        In the second part, the data list with additional columns is iterated and the corresponding simulation
+        functions are called in order to complete each scene.
+        With workers > 1, years are built in parallel processes.
+        If a cache is configured and the builder is seeded, stored scenes are used when available."""
+        key = None
+        if self.cache is not None and self.seed is not None:
+            key = self.fingerprint()
+            scenes, metadata = self.cache.load(key)
+            if scenes is not None:
+                scenes = self.frame_from_columns({c: scenes[c].to_numpy() for c in scenes})
+                if self.representative_days:
+                    self.dd = 1.0
+                    self.cluster_days = [np.array(d) for d in metadata['cluster_days']]
+                    self.cluster_weights = [np.array(w) for w in metadata['cluster_weights']]
+                    self.cluster_labels = [np.array(l) for l in metadata['cluster_labels']]
+                self.scenes = scenes
+                self.set_built_fingerprints()
+                return scenes
+        
+        if self.representative_days:
+            #clustering needs full years
+            self.dd = 1.0
+            column_list = self.build_columns(np.arange(365.0), self.get_hours_array(), workers)
+        else:
+            column_list = self.build_columns(self.get_days_array(), self.get_hours_array(), workers)
+        
+        if key is not None:
+            metadata = None
+            if self.representative_days:
+                metadata = {'cluster_days': [d.tolist() for d in self.cluster_days],
+                            'cluster_weights': [w.tolist() for w in self.cluster_weights],
+                            'cluster_labels': [l.tolist() for l in self.cluster_labels]}
+            self.cache.store(key, column_list, metadata)
+        
+        scenes =  self.frame_from_columns(column_list)
+        self.scenes = scenes
+        self.set_built_fingerprints()
+        
+        return scenes
+    
+    def set_built_fingerprints(self):
+        self.built_grid = fingerprint(self.grid_config())
+        self.built_fingerprints = self.column_fingerprints()
+    
+    def rebuild_scenes(self, changed = None, workers = None):
+        """Recomputes only the columns whose generator changed since the last build (or the *changed* 
+        columns) and the columns that read them, the other columns are taken from the current scenes.
+        Time columns are generated again and, if scenes are stored with float_dtype, the columns read by
+        the recomputed ones are simulated again too, so they read full precision values as in a full
+        build. With a seed, results are identical to a full build. A full build is made when there are 
+        no built scenes, when the time grid changed or with representative_days."""
+        current = self.column_fingerprints()
+        previous = self.built_fingerprints
+        if (self.scenes is None or previous is None or self.representative_days 
+                or self.built_grid != fingerprint(self.grid_config())):
+            return self.build_scenes(workers)
+        
+        if changed is None:
+            changed = [c for c in current if previous.get(c) != current[c]]
+        else:
+            changed = [self.column_key(c) for c in changed]
+        targets = self.downstream_columns(changed)
+        if self.compact and self.float_dtype is not None:
+            #stored columns lost precision
+            inputs = self.upstream_columns(targets)
+            targets = [c for c in self.additional_columns if c in targets or c in inputs]
+        
+        key = None
+        if self.cache is not None and self.seed is not None:
+            key = self.fingerprint()
+            if self.cache.contains(key):
+                return self.build_scenes()
+        
+        column_list = {}
+        for k in self.scenes.columns:
+            owner = self.column_key(k)
+            if owner is not None and owner not in targets:
+                column_list[k] = np.asarray(self.scenes[k])
+        
+        days_array = self.get_days_array()
+        hours_array = self.get_hours_array()
+        registers = len(days_array)*len(hours_array)
+        blocks = []
+        for y in range(self.years):
+            block = self.time_columns(y, days_array, hours_array)
+            for k in column_list:
+                block[k] = column_list[k][y*registers:(y + 1)*registers]
+            blocks.append(self.simulate_columns(block, y, targets))
+        column_list = self.compact_columns(self.concatenate_columns(blocks), hours_array)
+        
+        if key is not None:
+            self.cache.store(key, column_list)
+        
+        scenes = self.frame_from_columns(column_list)
+        self.scenes = scenes
+        self.set_built_fingerprints()
+        
+        return scenes
+    
+    def compact_columns(self, column_list, hours_array):
+        """In compact mode, returns the columns converted to compact types, see the class description.
+        Otherwise returns column_list unchanged."""
+        if not self.compact:
+            return column_list
+        
+        res = {}
+        for k in column_list:
+            v = column_list[k]
+            if k == 'year':
+                res[k] = v.astype(np.min_scalar_type(max(self.years - 1, 0)))
+            elif k == 'day':
+                res[k] = v.astype(np.uint16)
+            elif k == 'hour':
+                res[k] = v.astype(np.uint8 if np.all(hours_array == np.floor(hours_array)) else np.float32)
+            elif k in ('dt', 'dd'):
+                res[k] = v
+            elif self.float_dtype is not None and v.dtype.kind == 'f':
+                res[k] = v.astype(self.float_dtype)
+            else:
+                res[k] = v
+        return res
+    
+    def frame_from_columns(self, column_list, index = None):
+        """Builds the scenes DataFrame. In compact mode, constant dt and dd columns are stored as
+        sparse columns."""
+        if self.compact:
+            column_list = dict(column_list)
+            for k in ('dt', 'dd'):
+                v = np.asarray(column_list[k])
+                if len(v) > 0 and np.all(v == v[0]):
+                    column_list[k] = pd.arrays.SparseArray(v, fill_value = v[0])
+        return pd.DataFrame(column_list, index = index, copy = False)
+    
+    def is_stochastic_column(self, name):
+        """True if the generator of the column declares random values. Generators that do not 
+        implement is_stochastic are assumed random."""
+        generator = self.additional_columns[name]
+        if hasattr(generator, "is_stochastic") and callable(generator.is_stochastic):
+            return generator.is_stochastic()
+        return True
+    
+    def build_ensemble_year(self, year, days_array, hours_array, n_samples):
+        """Builds n_samples realizations of a year. 
+        Returns the dict of shared columns and a dict of (samples x scenes) arrays.
+        
+        Deterministic columns that only read shared columns are shared, the others are simulated
+        for each sample. Each column uses a single stream for all samples: stateless
+        simulators evaluate all samples in one call, the others are evaluated sample by sample,
+        clearing their state in between."""
+        column_list = self.time_columns(year, days_array, hours_array)
+        rows = len(column_list['year'])
+        samples = {}
+        stochastic = set()
+        tiled = None
+        
+        for col in self.column_order():
+            generator = self.additional_columns[col]
+            self.reset_generator(col, year)
+            
+            if not self.is_stochastic_column(col) and not any(d in stochastic for d in self.get_dependencies(col)):
+                self.set_column_values(column_list, col, self.simulate_column(generator, column_list))
+                if tiled is not None:
+                    for name in self.output_names(col):
+                        tiled[name] = np.tile(column_list[name], n_samples)
+                continue
+            
+            stochastic.add(col)
+            if tiled is None:
+                tiled = {k: np.tile(column_list[k], n_samples) for k in column_list}
+            
+            if getattr(generator, 'state_attributes', None) == ():
+                values = self.simulate_column(generator, tiled)
+            else:
+                blocks = []
+                for i in range(n_samples):
+                    if i > 0 and hasattr(generator, "clear_state"):
+                        generator.clear_state()
+                    block = slice(i*rows, (i+1)*rows)
+                    blocks.append(self.simulate_column(generator, {k: tiled[k][block] for k in tiled}))
+                values = np.concatenate(blocks)
+            
+            simulated = {}
+            self.set_column_values(simulated, col, values)
+            for name in simulated:
+                tiled[name] = simulated[name]
+                samples[name] = simulated[name].reshape(n_samples, rows)
+                if self.float_dtype is not None:
+                    samples[name] = samples[name].astype(self.float_dtype)
+        
+        return self.compact_columns(self.order_columns(column_list), hours_array), samples
+    
+    def build_ensemble(self, n_samples, seed = None, workers = None):
+        """Builds n_samples stochastic realizations of the scenes, returned as a SceneEnsemble.
+        seed defaults to the builder seed (a random one is drawn if both are None).
+        With workers > 1, years are built in parallel processes."""
+        if self.representative_days:
+            raise Exception("Ensembles are not supported with representative_days")
+        
+        builder = copy.copy(self)
+        builder.scenes = None
+        if seed is not None:
+            builder.seed = seed
+        if builder.seed is None:
+            builder.seed = np.random.SeedSequence().entropy
+        
+        days_array = builder.get_days_array()
+        hours_array = builder.get_hours_array()
+        
+        if not workers or workers <= 1 or self.years <= 1:
+            results = [builder.build_ensemble_year(y, days_array, hours_array, n_samples) for y in range(self.years)]
+        else:
+            with ProcessPoolExecutor(max_workers = workers) as pool:
+                results = list(pool.map(build_ensemble_year_task, [builder]*self.years, range(self.years), 
+                                        [days_array]*self.years, [hours_array]*self.years, [n_samples]*self.years))
+        
+        base = builder.frame_from_columns(self.concatenate_columns([r[0] for r in results]))
+        samples = {}
+        for col in results[0][1]:
+            samples[col] = np.concatenate([r[1][col] for r in results], axis = 1)
+        
+        columns = [c for c in results[0][0] if self.column_key(c) is None] + self.scene_columns()
+        return SceneEnsemble(base, samples, columns)
+    
+    def iter_columns(self, chunk_rows = 8760):
+        """Generator of dicts of numpy arrays with at most chunk_rows scenes each, in order.
+        Chunks never span two years."""
+        if self.representative_days:
+            raise Exception("Chunked generation is not supported with representative_days")
+        
+        days_array = self.get_days_array()
+        hours_array = self.get_hours_array()
+        year_registers = len(days_array)*len(hours_array)
+        
+        for y in range(self.years):
+            for start in range(0, year_registers, chunk_rows):
+                column_list = self.build_year_columns(y, days_array, hours_array, start, min(start + chunk_rows, year_registers))
+                yield self.compact_columns(column_list, hours_array)
+    
+    def iter_scenes(self, chunk_rows = 8760):
+        """Generator of DataFrames with at most chunk_rows scenes each. The index of each chunk 
+        continues the previous one, as in the full scenes DataFrame."""
+        offset = 0
+        for column_list in self.iter_columns(chunk_rows):
+            n = len(column_list['year'])
+            yield self.frame_from_columns(column_list, index = pd.RangeIndex(offset, offset + n))
+            offset += n
+    
+    def total_registers(self):
+        """Number of scenes of a full (not clustered) build"""
+        return self.years*len(self.get_days_array())*len(self.get_hours_array())
+    
+    def to_npy(self, directory, chunk_rows = 8760):
+        """Writes the scenes to a directory, one .npy file for each column, chunk by chunk.
+        Files are written through memory maps, so the full table is never held in memory.
+        Use load_scenes to read them back."""
+        os.makedirs(directory, exist_ok = True)
+        total_registers = self.total_registers()
+        files = {}
+        offset = 0
+        for column_list in self.iter_columns(chunk_rows):
+            n = len(column_list['year'])
+            for c in column_list:
+                if c not in files:
+                    files[c] = np.lib.format.open_memmap(os.path.join(directory, c + '.npy'), mode = 'w+', 
+                                                         dtype = column_list[c].dtype, shape = (total_registers,))
+                files[c][offset:offset + n] = column_list[c]
+            offset += n
+        
+        for c in files:
+            files[c].flush()
+        
+        with open(os.path.join(directory, 'columns.json'), 'w') as f:
+            json.dump({'columns': list(files), 'rows': total_registers}, f)
+        
+        return directory
+    
+    def to_parquet(self, path, chunk_rows = 8760):
+        """Writes the scenes to a Parquet file, one row group per chunk. Requires pyarrow."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        writer = None
+        try:
+            for column_list in self.iter_columns(chunk_rows):
+                table = pa.table(column_list)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+        
+        return path
+    
+    def reduce_to_representative_days(self, year, column_list):
+        """Clusters the days of a full year block and keeps only its representative days, with dd equal
+        to the cluster size. Returns the reduced block and a dict with the representative days, 
+        their weights and the cluster of each day. Once built, these are stored in
+        cluster_days, cluster_weights and cluster_labels (one entry per year)"""
+        daily_registers = len(column_list['year']) // 365
+        
+        cluster_columns = [c for c in self.cluster_columns if c in column_list]
+        if not cluster_columns:
+            raise Exception("None of the cluster columns {0} is simulated".format(self.cluster_columns))
+        
+        profiles = []
+        for c in cluster_columns:
+            profile = column_list[c].reshape(365, daily_registers)
+            scale = np.abs(profile).max()
+            profiles.append(profile/scale if scale > 0 else profile)
+        
+        seed = self.stream_seed('cluster', year)
+        rng = None if seed is None else np.random.default_rng(seed)
+        days, weights, labels = Clustering.representative_days(np.hstack(profiles), self.representative_days, self.cluster_method, rng = rng)
+        
+        rows = (days[:, None]*daily_registers + np.arange(daily_registers)[None, :]).ravel()
+        column_list = {k: column_list[k][rows] for k in column_list}
+        column_list['dd'] = np.repeat(weights, daily_registers)
+        
+        return column_list, {'days': days, 'weights': weights, 'labels': labels}
+    
+    def simulate_column(self, generator, column_list):
+        """Simulates a column for all the scenes in column_list (a dict of arrays).
+        Simulators implementing simulate_batch are evaluated at once, other generators
+        are called scene by scene"""
+        if hasattr(generator, "simulate_batch") and callable(generator.simulate_batch):
+            return np.asarray(generator.simulate_batch(column_list), dtype=float)
+        
         #Auxiliary function
         def get_scene_from_cl(cl, i):
             res = {}
@@ -147,14 +773,9 @@ class SceneBuilder:
                 res[k] = cl[k][i]
             return res
         
-        for col in self.additional_columns:
-            values = np.zeros(total_registers)
-            simulator = self.additional_columns[col].simulate
-            for i in range(total_registers):
-                values[i] = simulator(get_scene_from_cl(column_list, i))
-            column_list[col] = values
-        
-        scenes =  pd.DataFrame(column_list)
-        self.scenes = scenes
-        
-        return scenes
\ No newline at end of file
+        total_registers = len(column_list['year'])
+        values = np.zeros(total_registers)
+        simulator = generator.simulate
+        for i in range(total_registers):
+            values[i] = simulator(get_scene_from_cl(column_list, i))
+        return values
@@ -0,0 +1,172 @@
+"""
+On-disk storage of scene tables.
+A scene table is stored in a directory with one .npy file per column and a columns.json file
+with the column order and any extra metadata.
+"""
+import pandas as pd
+import numpy as np
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+#changes in the storage format or in the fingerprint description must increase this number
+FORMAT_VERSION = 1
+
+
+def save_scenes(directory, column_list, metadata = None):
+    """Saves a dict of arrays (or a DataFrame) as a scene table directory"""
+    os.makedirs(directory, exist_ok = True)
+    for c in column_list:
+        np.save(os.path.join(directory, c + '.npy'), np.asarray(column_list[c]))
+
+    meta = {'columns': list(column_list), 'rows': len(column_list[next(iter(column_list))])}
+    if metadata:
+        meta.update(metadata)
+    with open(os.path.join(directory, 'columns.json'), 'w') as f:
+        json.dump(meta, f)
+    return directory
+
+def load_metadata(directory):
+    with open(os.path.join(directory, 'columns.json')) as f:
+        return json.load(f)
+
+def load_scenes(directory, mmap_mode = 'r'):
+    """Loads a scene table directory (see save_scenes and SceneBuilder.to_npy) as a DataFrame.
+    With mmap_mode, columns are memory-mapped instead of read."""
+    columns = load_metadata(directory)['columns']
+    return pd.DataFrame({c: np.load(os.path.join(directory, c + '.npy'), mmap_mode = mmap_mode) for c in columns}, copy = False)
+
+
+def describe(value, depth = 0):
+    """
+    Returns a JSON-compatible description of value, used to fingerprint configurations.
+    Objects implementing get_params are described by their class and parameters,
+    arrays by their hash, callables by their qualified name.
+    """
+    if depth > 10:
+        return repr(value)
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        data = np.ascontiguousarray(value)
+        return {'array': hashlib.sha256(data.tobytes()).hexdigest(), 'shape': list(data.shape), 'dtype': str(data.dtype)}
+    if isinstance(value, (pd.Series, pd.Index)):
+        return describe(value.to_numpy(), depth + 1)
+    if isinstance(value, (list, tuple)):
+        return [describe(v, depth + 1) for v in value]
+    if isinstance(value, dict):
+        return {str(k): describe(value[k], depth + 1) for k in sorted(value, key = str)}
+
+    cls = type(value)
+    class_name = cls.__module__ + '.' + cls.__qualname__
+    if hasattr(value, 'get_params') and callable(value.get_params):
+        return {'class': class_name, 'params': describe(value.get_params(), depth + 1)}
+    if callable(value) and hasattr(value, '__qualname__'):
+        return {'callable': getattr(value, '__module__', '') + '.' + value.__qualname__}
+    if hasattr(value, '__dict__'):
+        return {'class': class_name, 'params': describe(vars(value), depth + 1)}
+    return repr(value)
+
+def fingerprint(value):
+    """Stable hexadecimal hash of the description of value"""
+    text = json.dumps({'version': FORMAT_VERSION, 'value': describe(value)}, sort_keys = True)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class SceneCache:
+    """
+    Directory of scene tables, keyed by fingerprint.
+
+    Entries are stored as memory-mappable .npy columns. When max_bytes is given, least recently
+    used entries are evicted after each store until the total size fits.
+    """
+
+    def __init__(self, directory, max_bytes = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok = True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def contains(self, key):
+        return os.path.exists(os.path.join(self.path(key), 'columns.json'))
+
+    def touch(self, key):
+        """Marks the entry as recently used"""
+        now = time.time()
+        os.utime(os.path.join(self.path(key), 'columns.json'), (now, now))
+
+    def load(self, key, mmap_mode = 'r'):
+        """Returns the stored scenes DataFrame and its metadata, or (None, None) if not stored"""
+        if not self.contains(key):
+            return None, None
+        self.touch(key)
+        return load_scenes(self.path(key), mmap_mode), load_metadata(self.path(key))
+
+    def store(self, key, column_list, metadata = None):
+        """Stores a dict of arrays under key. The entry is written in a temporary directory and
+        then renamed, so readers never see partial entries."""
+        tmp = tempfile.mkdtemp(prefix = '.tmp-', dir = self.directory)
+        try:
+            save_scenes(tmp, column_list, metadata)
+            if self.contains(key):
+                shutil.rmtree(self.path(key))
+            os.replace(tmp, self.path(key))
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors = True)
+            raise
+
+        self.evict(keep = key)
+        return self.path(key)
+
+    def invalidate(self, key):
+        """Removes an entry. Returns True if it existed."""
+        if os.path.exists(self.path(key)):
+            shutil.rmtree(self.path(key))
+            return True
+        return False
+
+    def clear(self):
+        for key in self.keys():
+            self.invalidate(key)
+
+    def keys(self):
+        return [k for k in os.listdir(self.directory) if self.contains(k)]
+
+    def size(self, key):
+        """Size of an entry, in bytes"""
+        path = self.path(key)
+        return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+    def total_size(self):
+        return sum(self.size(k) for k in self.keys())
+
+    def evict(self, keep = None):
+        """Removes least recently used entries until the cache fits in max_bytes.
+        The entry keep is never removed."""
+        if self.max_bytes is None:
+            return []
+
+        entries = []
+        for k in self.keys():
+            entries.append((os.path.getmtime(os.path.join(self.path(k), 'columns.json')), k, self.size(k)))
+        entries.sort()
+
+        total = sum(e[2] for e in entries)
+        removed = []
+        for mtime, k, size in entries:
+            if total <= self.max_bytes:
+                break
+            if k == keep:
+                continue
+            self.invalidate(k)
+            removed.append(k)
+            total -= size
+        return removed
@@ -1,15 +1,24 @@
-import random
 import math
 
+import numpy as np
+
 class BaseSimulator:
     """
     Base simulator class. Defines an interface for all simulators (Wind, Solar, Temperature, Demand, Prices, etc.)
     Defines several models for simulation, for example, constant, time-linear, exponential, piecewise, etc.
     """
     
+    #attributes that hold the state carried between scenes, not parameters
+    state_attributes = ()
+    #models that are random by themselves, besides the post randomization
+    stochastic_models = ()
+    #scene columns read by the simulator, besides year, day, dd, hour and dt. None if not declared:
+    #the simulator is assumed to read all the previous columns, see SceneBuilder.add_column
+    depends_on = None
+    
     def __init__(self, model='constant', base_value = 1.0, post_random_up=0.2, post_random_down=0.2, post_random_model='uniform',
                 a_yearly = 1.0, a_monthly = 1.0, a_hourly = 1.0, a_daily = 1.0, piecewise_hours = [ 7.0, 12.0, 16.0, 20.0, 24.0],
-                piecewise_values = [0.15, 0.25, 0.40, 0.60, 1.0 ]):
+                piecewise_values = [0.15, 0.25, 0.40, 0.60, 1.0 ], seed = None):
         self.model = model
         self.post_random_up = post_random_up
         self.post_random_down = post_random_down
@@ -24,7 +33,11 @@ class BaseSimulator:
         self.piecewise_hours =  [ 7.0, 12.0, 16.0, 20.0, 24.0]
         self.piecewise_values = [0.15, 0.25, 0.40, 0.60, 1.0 ]
         
+        self.init_streams(seed)
+        
         self.models = {}
+        #array counterparts of the models, see simulate_batch
+        self.batch_models = {}
         self.init_models()
     
     def init_models(self):
@@ -33,6 +46,17 @@ class BaseSimulator:
         self.models['piecewise'] = self.model_piecewise
         self.models['exponential'] = self.model_exponential
         
+        self.batch_models['constant'] = self.model_constant_batch
+        self.batch_models['linear'] = self.model_linear_batch
+        self.batch_models['piecewise'] = self.model_piecewise_batch
+        self.batch_models['exponential'] = self.model_exponential_batch
+    
+    @staticmethod
+    def batch_length(columns):
+        """Number of scenes in a dict of columns (name: array)"""
+        for k in columns:
+            return len(columns[k])
+        return 0
     
     def model_constant(self, scene):
         return self.base_value
@@ -57,16 +81,88 @@ class BaseSimulator:
 
     def model_exponential(self, scene):
         return math.exp(self.model_linear(scene))
+    
+    def model_constant_batch(self, columns):
+        return np.full(self.batch_length(columns), float(self.base_value))
+    
+    def model_linear_batch(self, columns):
+        month = np.floor(np.asarray(columns['day'], dtype=float)/30)
+        month = np.where(month > 12, 11, month)
+        return (self.base_value + self.a_hourly*np.asarray(columns['hour'], dtype=float) + self.a_daily*np.asarray(columns['day'], dtype=float)
+                + self.a_monthly*month + self.a_yearly*np.asarray(columns['year'], dtype=float))
+    
+    def select_piecewise_batch(self, hours, domain, values):
+        """Array version of select_piecewise, domain must be sorted"""
+        idx = np.searchsorted(np.asarray(domain, dtype=float), np.asarray(hours, dtype=float), side='right')
+        #hours beyond the last step take the first value, as in select_piecewise
+        table = np.append(np.asarray(values[:len(domain)], dtype=float), values[0])
+        return table[idx]
+    
+    def model_piecewise_batch(self, columns):
+        return self.select_piecewise_batch(columns['hour'], self.piecewise_hours, self.piecewise_values)
+    
+    def model_exponential_batch(self, columns):
+        return np.exp(self.model_linear_batch(columns))
         
     def post_value_random(self):
         if self.post_random_model == 'none' or self.post_random_model == None or self.post_random_model == False:
             return 1.0
         elif self.post_random_model == 'uniform':
-            return random.uniform(1.0 - self.post_random_down, 1.0 + self.post_random_up)
+            return self.rng.uniform(1.0 - self.post_random_down, 1.0 + self.post_random_up)
         elif self.post_random_model == 'gauss':
-            return random.gauss(1 + 0.5*self.post_random_up -0.5*self.post_random_down, 0.5*(self.post_random_up+self.post_random_down))
+            return self.rng.normal(1 + 0.5*self.post_random_up -0.5*self.post_random_down, 0.5*(self.post_random_up+self.post_random_down))
         else:
             raise Exception("Post random model {0} not supported".format(self.post_random_model))
+    
+    def post_value_random_batch(self, n):
+        """Array version of post_value_random, n random steps are returned"""
+        if self.post_random_model == 'none' or self.post_random_model == None or self.post_random_model == False:
+            return np.ones(n)
+        elif self.post_random_model == 'uniform':
+            return self.rng.uniform(1.0 - self.post_random_down, 1.0 + self.post_random_up, n)
+        elif self.post_random_model == 'gauss':
+            return self.rng.normal(1 + 0.5*self.post_random_up -0.5*self.post_random_down, 0.5*(self.post_random_up+self.post_random_down), n)
+        else:
+            raise Exception("Post random model {0} not supported".format(self.post_random_model))
+        
+    def init_streams(self, seed):
+        """
+        Random streams, seed can be an int, a numpy SeedSequence or a numpy Generator.
+        rng is used for scene by scene draws, state_rng for state changes (i.e. daily clouds).
+        Each stream is consumed in scene order, so results do not depend on how scenes are
+        split between calls to simulate_batch.
+        """
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.state_rng = np.random.default_rng(self.rng.integers(2**63))
+        
+    def get_params(self):
+        """
+        Returns a dict with the parameters of the simulator, that is, all attributes except
+        random streams, model tables and state. Used to fingerprint scene configurations.
+        """
+        excluded = {'models', 'batch_models', 'rng', 'state_rng', 'seed'}.union(self.state_attributes)
+        return {k: v for k, v in vars(self).items() if k not in excluded}
+        
+    def clear_state(self):
+        """
+        Clears any state carried between scenes, random streams continue. 
+        Simulators with state must extend this method.
+        """
+        pass
+        
+    def reset(self, seed = None):
+        """
+        Restarts the random streams with the given seed (int, SeedSequence or Generator) and clears
+        any state carried between scenes.
+        """
+        self.init_streams(seed)
+        self.clear_state()
+    
+    def is_stochastic(self):
+        """True if simulated values are random"""
+        post_random = not (self.post_random_model == 'none' or self.post_random_model == None or self.post_random_model == False)
+        return post_random or self.model in self.stochastic_models
         
     def simulate(self, scene):
         """
@@ -82,14 +178,42 @@ class BaseSimulator:
             raise Exception("Model {0} not supported".format(self.model))
         
         return val*self.post_value_random()
+    
+    def simulate_batch_model(self, columns):
+        """Evaluates the batch version of the current model, with the random step applied"""
+        val = self.batch_models[self.model](columns)
+        return val*self.post_value_random_batch(self.batch_length(columns))
+    
+    def simulate_batch(self, columns):
+        """
+        Returns an array of simulated values, one for each scene.
+        columns is a dict of equal-length arrays (year, day, hour, etc.), as built by SceneBuilder.
+        
+        When the model has no array counterpart in batch_models, or a subclass overrides simulate
+        without overriding simulate_batch, scenes are simulated one by one.
+        """
+        if self.model not in self.models:
+            raise Exception("Model {0} not supported".format(self.model))
+        
+        if self.model in self.batch_models and type(self).simulate is BaseSimulator.simulate:
+            return self.simulate_batch_model(columns)
+        
+        n = self.batch_length(columns)
+        values = np.zeros(n)
+        for i in range(n):
+            values[i] = self.simulate({k: columns[k][i] for k in columns})
+        return values
         
 class DailyInterpolator(BaseSimulator):
     
-    def __init__(self, base_value = 1.0, post_random_up=0.2, post_random_down=0.2, post_random_model='uniform'):
-        super().__init__()
+    depends_on = ()
+    
+    def __init__(self, base_value = 1.0, post_random_up=0.2, post_random_down=0.2, post_random_model='uniform', seed = None):
+        super().__init__(seed = seed)
         
         self.model = 'daily_interpolation'
         self.models['daily_interpolation'] = self.model_daily_interpolation
+        self.batch_models['daily_interpolation'] = self.model_daily_interpolation_batch
         
         self.post_random_up = post_random_up
         self.post_random_down = post_random_down
@@ -97,70 +221,73 @@ class DailyInterpolator(BaseSimulator):
         self.base_value = base_value 
 
         self.data_days = {}   #key is the day of the data, value must be a dict hours: [], values: []
+        self.lookup = None    #compiled data, see compile
         
     def add_day(self, day, hours, values):
         """
         add_day
         Adds a new day as data, for example, 81st day of the year
         with an hourly data specified as 12 2-hour steps, with 12 values.
-        Days must be ordered!!!
+        Hours of each day must be ordered.
         """
         
         self.data_days[day] = {'hours': hours, 'values': values}
+        self.lookup = None
+    
+    def get_params(self):
+        params = super().get_params()
+        del params['lookup']
+        return params
         
-    def model_daily_interpolation(self, scene):
+    def compile(self):
+        """
+        Compiles the data days in a lookup table, with a row for each data day (sorted, plus the 
+        last day of the previous year and the first of the next one) and a column for each interval 
+        between the hours of all days, so queries are solved by binary search.
+        """
+        if len(self.data_days) == 0:
+            raise Exception("No data")
         
-        day = scene['day']
-        hour = scene['hour']
+        days = sorted(self.data_days)
+        breakpoints = np.unique(np.concatenate([np.asarray(self.data_days[d]['hours'], dtype=float) for d in days]))
+        #an hour inside each interval: before the first breakpoint, then each breakpoint
+        probes = np.concatenate(([breakpoints[0] - 1.0], breakpoints))
+        table = np.array([self.select_piecewise_batch(probes, self.data_days[d]['hours'], self.data_days[d]['values']) for d in days])
         
-        ds = [k for k in self.data_days.keys()]
+        if len(days) > 1:
+            #wrap around the year
+            days = [days[-1] - 365] + days + [days[0] + 365]
+            table = np.vstack((table[-1], table, table[0]))
         
-        l = len(ds)
+        self.lookup = {'days': np.asarray(days, dtype=float), 'hours': breakpoints, 'table': table}
+        return self.lookup
+    
+    def interpolate(self, days, hours):
+        """Interpolated values for arrays of days and hours"""
+        lookup = self.lookup if self.lookup is not None else self.compile()
+        data_days = lookup['days']
+        table = lookup['table']
         
-        if l == 0:
-            raise Exception("No data")
-        elif l == 1:
+        days = np.asarray(days, dtype=float)
+        column = np.searchsorted(lookup['hours'], np.asarray(hours, dtype=float), side='right')
+        
+        if len(data_days) == 1:
             #no interpolation possible, defaults to piecewise
-            domain = self.data_days[ds[0]]['hours']
-            values = self.data_days[ds[0]]['values']
-            return self.select_piecewise(hour, domain, values)
-        else:
-            #we must extend the array of days in order to simplify the search for 
-            #the correct interval
-            ds.insert(0, ds[-1] - 365)
-            ds.append(ds[1] + 365)  #the old fist now is the 1st            
-            
-            #print(ds)
-            
-            #We must find the next day in the domain 
-            found = False
-            i = 0
-            
-            while (not found) and i <= l:   #the unusual = is because data was added 
-                prev_day = ds[i]
-                next_day = ds[i+1]
-                                
-                if prev_day <= day and day <= next_day:
-                    found = True
-                else:
-                    i += 1
-
-            if not found:
-                raise Exception("Day not found in interval")
-                
-            #print("Prev Day: {0} Next_day: {1}".format(prev_day, next_day))
-            if prev_day < 0:
-                prev_day_data = self.data_days[prev_day + 365]
-            else:
-                prev_day_data = self.data_days[prev_day]
-            prev_day_value = self.select_piecewise(hour, prev_day_data['hours'], prev_day_data['values'])
-            
-            if next_day > 365:
-                next_day_data = self.data_days[next_day - 365]
-            else:
-                next_day_data = self.data_days[next_day]
-            next_day_value = self.select_piecewise(hour, next_day_data['hours'], next_day_data['values'])
-            
-            #finally, the interpolation:
-            
-            return prev_day_value + (next_day_value - prev_day_value)/(next_day - prev_day)*(day - prev_day)
+            return table[0, column]
+        
+        if np.any((days < data_days[0]) | (days > data_days[-1])):
+            raise Exception("Day not found in interval")
+        
+        prev = np.clip(np.searchsorted(data_days, days, side='right') - 1, 0, len(data_days) - 2)
+        span = data_days[prev + 1] - data_days[prev]
+        w = np.where(span > 0, (days - data_days[prev])/np.where(span > 0, span, 1.0), 0.0)
+        
+        prev_day_value = table[prev, column]
+        next_day_value = table[prev + 1, column]
+        return prev_day_value + (next_day_value - prev_day_value)*w
+        
+    def model_daily_interpolation(self, scene):
+        return float(self.interpolate([scene['day']], [scene['hour']])[0])
+    
+    def model_daily_interpolation_batch(self, columns):
+        return self.interpolate(columns['day'], columns['hour'])
@@ -1,5 +1,6 @@
 import math
-import random
+
+import numpy as np
 
 from .BaseSimulator import BaseSimulator as BS
 
@@ -10,8 +11,11 @@ class DemandSimulator(BS):
     growth parameter from scenes is taken into account.
     """
     
-    def __init__(self, hour_steps = None, hour_values = None, summer_peak = 0.3, winter_peak = 0.2, post_random_up = 0.2, post_random_down = 0.2):
-        super().__init__(model = 'seasoned_piecewise', post_random_up = post_random_up, post_random_down = post_random_down)
+    depends_on = ('growth',)
+    
+    def __init__(self, hour_steps = None, hour_values = None, summer_peak = 0.3, winter_peak = 0.2, post_random_up = 0.2, post_random_down = 0.2,
+                 seed = None):
+        super().__init__(model = 'seasoned_piecewise', post_random_up = post_random_up, post_random_down = post_random_down, seed = seed)
         
         self.summer_peak = summer_peak
         self.winter_peak = winter_peak
@@ -26,6 +30,7 @@ class DemandSimulator(BS):
             self.piecewise_values = [ 0.2, 0.4,  0.5,  1.0,  0.3]            
     
         self.models['seasoned_piecewise'] = self.model_seasoned_piecewise
+        self.batch_models['seasoned_piecewise'] = self.model_seasoned_piecewise_batch
         
     def model_seasoned_piecewise(self, scene):
         #initial value, hourly-based:
@@ -47,3 +52,16 @@ class DemandSimulator(BS):
             val = val * scene['growth']
             
         return val
+
+    def model_seasoned_piecewise_batch(self, columns):
+        val = self.batch_models['piecewise'](columns)
+        
+        d = np.asarray(columns['day'], dtype=float)
+        season_coef = np.cos((d + 10.0)/182.5*2*np.pi)
+        peak = np.where((d < 36) | (d > 219), self.winter_peak, self.summer_peak)
+        val = val*(1+peak*season_coef)
+        
+        if 'growth' in columns:
+            val = val * columns['growth']
+            
+        return val
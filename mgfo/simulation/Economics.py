@@ -11,14 +11,17 @@ class DeterministicGrowthSimulator(BS):
     in per unit. An arbitrary base value can be used also.
     Post-randomization is disabled by default, but can be enabled using the *post_random_model* attribute.
     """
-    def __init__(self, base = 1.0, annual_rate = 0.1, monthly_rate = 0.0, daily_rate = 0.0):
+
+    depends_on = ()
+    
+    def __init__(self, base = 1.0, annual_rate = 0.1, monthly_rate = 0.0, daily_rate = 0.0, seed = None):
         """
         Inits a new Net Present Value simulator class.
         Given a future time, expressed in years and days, returns the present value ratio.
         Values are stored as logarithmic representations.
         """
         
-        super().__init__(model='exponential', post_random_model='none')
+        super().__init__(model='exponential', post_random_model='none', seed = seed)
         self.base_value = math.log(base)
         self.a_yearly = math.log(1+annual_rate) + 12*math.log(1+monthly_rate) + 365*math.log(1+daily_rate)
         self.a_monthly = math.log(1+monthly_rate)
@@ -100,6 +103,15 @@ class PVSimulator(DeterministicGrowthSimulator):
         base = math.exp(self.base_value)
         rate = val/base
         return base/rate
+    
+    def simulate_batch(self, columns):
+        """
+        Array version of simulate
+        """
+        val = self.simulate_batch_model(columns)
+        base = math.exp(self.base_value)
+        rate = val/base
+        return base/rate
 
 
 class ElectricityCostSimulator(BS):
@@ -109,7 +121,11 @@ class ElectricityCostSimulator(BS):
     By default, 23-6 are valley hours, 6-18 are rest hours and 18-23 are peak hours.
     This can be changed by the use of the *piecewise_hours* member.
     """
-    def __init__(self, peak_value=0.20e3, valley_value=0.12e3, rest_value=0.16e3, piecewise_hours = [6.0, 18.0, 23.0, 24.01]):
-        super().__init__(model='piecewise', post_random_model='none')
+
+    depends_on = ()
+    
+    def __init__(self, peak_value=0.20e3, valley_value=0.12e3, rest_value=0.16e3, piecewise_hours = [6.0, 18.0, 23.0, 24.01],
+                 seed = None):
+        super().__init__(model='piecewise', post_random_model='none', seed = seed)
         self.piecewise_hours = piecewise_hours
         self.piecewise_values = [valley_value, rest_value, peak_value, valley_value]
@@ -0,0 +1,166 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from .BaseSimulator import BaseSimulator as BS
+
+#nanoseconds in an hour
+NS_HOUR = 3600e9
+
+def to_hours(timestamps):
+    """Converts timestamps (anything accepted by pandas.to_datetime) to float hours since 1970-01-01.
+    Timezone-aware timestamps are taken in their local time."""
+    ts = pd.DatetimeIndex(pd.to_datetime(timestamps))
+    if ts.tz is not None:
+        ts = ts.tz_localize(None)
+    return ts.values.astype('datetime64[ns]').astype(np.int64)/NS_HOUR
+
+def read_measurements(path, columns, time_column = None):
+    """
+    Reads the timestamps and the given columns of a measurement file. Returns the timestamps
+    (as float hours since 1970) and a dict column: float array.
+
+    Supported files:
+        .csv: only time_column and columns are parsed. If time_column is None, the first column is used.
+        .parquet: only time_column and columns are read. If time_column is None, the index is used.
+        directory of .npy files (as written by SceneBuilder.to_npy or save_scenes): files are memory-mapped,
+        time_column is required and must be stored as datetime64 or as hours since 1970.
+    """
+    columns = list(columns)
+    if os.path.isdir(path):
+        if time_column is None:
+            raise Exception("time_column must be specified for .npy directories")
+        ts = np.load(os.path.join(path, time_column + '.npy'), mmap_mode = 'r')
+        hours = to_hours(ts) if ts.dtype.kind == 'M' else np.asarray(ts, dtype=float)
+        return hours, {c: np.load(os.path.join(path, c + '.npy'), mmap_mode = 'r') for c in columns}
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        if time_column is None:
+            time_column = pd.read_csv(path, nrows = 0).columns[0]
+        df = pd.read_csv(path, usecols = [time_column] + columns, index_col = time_column)
+    elif extension in ('.parquet', '.pq'):
+        df = pd.read_parquet(path, columns = columns if time_column is None else [time_column] + columns)
+        if time_column is not None:
+            df = df.set_index(time_column)
+    else:
+        raise Exception("Measurement file type {0} not supported".format(extension))
+
+    return to_hours(df.index), {c: df[c].to_numpy(dtype=float) for c in columns}
+
+class MeasuredSeries(BS):
+    """
+    Measured time series, i.e. SCADA or meteorological records, resampled on the scene grid.
+
+    timestamps can be anything accepted by pandas.to_datetime or float hours since 1970 (see to_hours),
+    values are the measurements. Each scene covers the interval [hour, hour + dt) of its day and year,
+    year 0 being *start_year* (by default, the year of the first measurement). Scenes with calendar
+    years (1000 or greater) are used as given.
+
+    how selects the aggregation over each interval:
+        mean: average of the measurements inside the interval. Empty intervals use the linear
+              interpolation at the middle of the interval.
+        integrate: integral of the linearly interpolated series over the interval, divided by dt,
+              that is, the mean value including the partial steps at the interval edges.
+        nearest: measurement nearest to the start of the interval.
+
+    Outside the measured period the first and last measurements are extended.
+    Post-randomization is disabled by default.
+    """
+
+    depends_on = ()
+
+    aggregations = ('mean', 'integrate', 'nearest')
+
+    def __init__(self, timestamps, values, how = 'mean', start_year = None, scale = 1.0, post_random_model = 'none',
+                 post_random_up = 0.0, post_random_down = 0.0, seed = None):
+        super().__init__(model = 'measured', post_random_model = post_random_model,
+                         post_random_up = post_random_up, post_random_down = post_random_down, seed = seed)
+
+        if how not in self.aggregations:
+            raise Exception("Aggregation {0} not supported".format(how))
+
+        ts = np.asarray(timestamps)
+        hours = np.asarray(ts, dtype=float) if ts.dtype.kind in 'fiu' else to_hours(ts)
+        values = np.asarray(values, dtype=float)*scale
+
+        valid = ~np.isnan(values) & ~np.isnan(hours)
+        hours = hours[valid]
+        values = values[valid]
+        if len(hours) == 0:
+            raise Exception("No data")
+        if np.any(np.diff(hours) < 0):
+            order = np.argsort(hours, kind = 'stable')
+            hours = hours[order]
+            values = values[order]
+
+        self.hours = hours
+        self.values = values
+        self.how = how
+        if start_year is None:
+            start_year = int(np.datetime64(int(hours[0]), 'h').astype('datetime64[Y]').astype(int)) + 1970
+        self.start_year = start_year
+
+        #cumulative sums for interval aggregation
+        self.cumulative_values = np.concatenate(([0.0], np.cumsum(values)))
+        self.cumulative_integral = np.concatenate(([0.0], np.cumsum(np.diff(hours)*(values[1:] + values[:-1])/2)))
+
+        self.models['measured'] = self.model_measured
+        self.batch_models['measured'] = self.model_measured_batch
+
+    def get_params(self):
+        params = super().get_params()
+        #derived from hours and values
+        del params['cumulative_values']
+        del params['cumulative_integral']
+        return params
+
+    @classmethod
+    def from_file(cls, path, column, time_column = None, **kwargs):
+        """Reads a single column of a measurement file, see read_measurements"""
+        hours, data = read_measurements(path, [column], time_column)
+        return cls(hours, data[column], **kwargs)
+
+    def scene_hours(self, columns):
+        """Start of each scene, in hours since 1970"""
+        year = np.asarray(columns['year'], dtype=float)
+        year = np.where(year >= 1000, year, year + self.start_year)
+        unique_years, inverse = np.unique(year.astype(np.int64), return_inverse = True)
+        year_start = (unique_years - 1970).astype('datetime64[Y]').astype('datetime64[h]').astype(np.int64).astype(float)
+        return year_start[inverse] + 24.0*np.asarray(columns['day'], dtype=float) + np.asarray(columns['hour'], dtype=float)
+
+    def integral(self, t):
+        """Integral of the interpolated series from the first measurement up to t"""
+        h = self.hours
+        tc = np.clip(t, h[0], h[-1])
+        i = np.clip(np.searchsorted(h, tc, side='right') - 1, 0, len(h) - 1)
+        vt = np.interp(tc, h, self.values)
+        res = self.cumulative_integral[i] + (tc - h[i])*(self.values[i] + vt)/2
+        #constant extension outside the measured period
+        return res + (t - tc)*np.where(t < h[0], self.values[0], self.values[-1])
+
+    def model_measured_batch(self, columns):
+        t = self.scene_hours(columns)
+        dt = np.asarray(columns['dt'], dtype=float)
+        h = self.hours
+
+        if self.how == 'nearest':
+            i = np.clip(np.searchsorted(h, t), 1, max(len(h) - 1, 1))
+            if len(h) == 1:
+                return np.full(len(t), self.values[0])
+            nearest = np.where(t - h[i - 1] <= h[i] - t, i - 1, i)
+            return self.values[nearest]
+
+        if self.how == 'integrate':
+            return (self.integral(t + dt) - self.integral(t))/dt
+
+        first = np.searchsorted(h, t, side='left')
+        last = np.searchsorted(h, t + dt, side='left')
+        count = last - first
+        total = self.cumulative_values[last] - self.cumulative_values[first]
+        interpolated = np.interp(t + dt/2, h, self.values)
+        return np.where(count > 0, total/np.maximum(count, 1), interpolated)
+
+    def model_measured(self, scene):
+        return float(self.model_measured_batch({k: np.array([scene[k]]) for k in ('year', 'day', 'hour', 'dt')})[0])
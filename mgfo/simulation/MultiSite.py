@@ -0,0 +1,194 @@
+import math
+
+import numpy as np
+from scipy.signal import lfilter
+from scipy.special import ndtr
+
+from .BaseSimulator import BaseSimulator as BS
+from .Solar import expand_daily_state
+
+def normal_cdf(z):
+    """Standard normal distribution function, element-wise"""
+    return ndtr(np.asarray(z, dtype=float))
+
+def normal_sf(z):
+    """Standard normal survival function (1 - cdf), element-wise, accurate for large z"""
+    return ndtr(-np.asarray(z, dtype=float))
+
+def correlation_matrix(sites, correlation = 0.0, coordinates = None, correlation_length = None):
+    """
+    Inter-site correlation matrix. correlation can be a (sites x sites) matrix or a single value
+    for all pairs of sites. With coordinates (a list of (x, y) in km) and correlation_length (km),
+    correlation decays with distance as exp(-distance/correlation_length).
+    """
+    if coordinates is not None and correlation_length:
+        xy = np.asarray(coordinates, dtype=float)
+        distance = np.sqrt(((xy[:, None, :] - xy[None, :, :])**2).sum(axis=2))
+        return np.exp(-distance/correlation_length)
+
+    c = np.asarray(correlation, dtype=float)
+    if c.ndim == 0:
+        m = np.full((sites, sites), float(c))
+        np.fill_diagonal(m, 1.0)
+        return m
+    if c.shape != (sites, sites):
+        raise Exception("Correlation matrix must be {0}x{0}".format(sites))
+    return c
+
+class MultiSiteSimulator(BS):
+    """
+    Base class for simulators of several sites at once. Values are (scenes x sites) arrays, to be
+    used as several scene columns (see SceneBuilder.add_column with a tuple of names).
+
+    Sites are joined with a Gaussian copula: correlated standard normal values are drawn with the
+    inter-site correlation (see correlation_matrix) and transformed to each marginal distribution.
+    Post randomization is applied independently to each site.
+    """
+
+    depends_on = ()
+
+    def __init__(self, model, sites = 2, correlation = 0.0, coordinates = None, correlation_length = None,
+                 post_random_up = 0.0, post_random_down = 0.0, seed = None):
+        super().__init__(model = model, post_random_up = post_random_up, post_random_down = post_random_down, seed = seed)
+
+        if coordinates is not None:
+            sites = len(coordinates)
+        self.sites = sites
+        self.correlation = correlation
+        self.coordinates = coordinates
+        self.correlation_length = correlation_length
+
+        matrix = correlation_matrix(sites, correlation, coordinates, correlation_length)
+        try:
+            self.factor = np.linalg.cholesky(matrix)
+        except np.linalg.LinAlgError:
+            raise Exception("Correlation matrix is not positive definite")
+
+    def site_values(self, value):
+        """Parameter for each site, from a single value or a list"""
+        return np.broadcast_to(np.asarray(value, dtype=float), (self.sites,))
+
+    def correlated_normals(self, rng, n):
+        """n rows of standard normal values, correlated between sites"""
+        return rng.standard_normal((n, self.sites)) @ self.factor.T
+
+    def simulate_batch_model(self, columns):
+        val = self.batch_models[self.model](columns)
+        n = len(val)
+        return val*self.post_value_random_batch(n*self.sites).reshape(n, self.sites)
+
+    def simulate_batch(self, columns):
+        """Returns a (scenes x sites) array of simulated values"""
+        if self.model not in self.batch_models:
+            raise Exception("Model {0} not supported".format(self.model))
+        return self.simulate_batch_model(columns)
+
+    def simulate(self, scene):
+        """Returns an array with the simulated value of each site for the current scene"""
+        return self.simulate_batch({k: np.array([scene[k]]) for k in scene})[0]
+
+class MultiSiteWeibull(MultiSiteSimulator):
+    """
+    Wind speed at several sites. Each site follows a Weibull distribution of shape k and scale c
+    (single values or one per site). autocorrelation is the correlation between the normal values
+    of consecutive scenes (an AR(1) process), so speeds persist in time as in CorrelatedWeibull.
+    """
+
+    state_attributes = ('z',)
+    stochastic_models = ('copula_weibull',)
+
+    def __init__(self, sites = 2, k = 2.0, c = 7.0, correlation = 0.7, coordinates = None, correlation_length = None,
+                 autocorrelation = 0.9, post_random_up = 0.0, post_random_down = 0.0, seed = None):
+        super().__init__(model = 'copula_weibull', sites = sites, correlation = correlation, coordinates = coordinates,
+                         correlation_length = correlation_length, post_random_up = post_random_up,
+                         post_random_down = post_random_down, seed = seed)
+
+        self.k = k
+        self.c = c
+        self.autocorrelation = autocorrelation
+        #normal values of the last scene
+        self.z = None
+
+        self.batch_models['copula_weibull'] = self.model_copula_weibull_batch
+
+    def clear_state(self):
+        self.z = None
+
+    def model_copula_weibull_batch(self, columns):
+        n = self.batch_length(columns)
+        #innovations of the speed process are drawn from the state stream, rng is left for post randomization
+        e = self.correlated_normals(self.state_rng, n)
+        if n == 0:
+            return np.zeros((0, self.sites))
+
+        phi = self.autocorrelation
+        if phi == 0:
+            z = e
+        else:
+            #AR(1) with unit variance, innovations keep the inter-site correlation. The first scene starts
+            #from the stationary distribution, or follows the last scene of the previous batch
+            z = np.empty_like(e)
+            scale = math.sqrt(1 - phi*phi)
+            z[0] = e[0] if self.z is None else phi*self.z + scale*e[0]
+            z[1:] = lfilter([scale], [1.0, -phi], e[1:], axis = 0, zi = phi*z[:1])[0]
+        self.z = z[-1]
+
+        #Weibull by inversion, -log(1 - u) with u = cdf(z)
+        return self.site_values(self.c)*(-np.log(normal_sf(z)))**(1.0/self.site_values(self.k))
+
+class MultiSiteSolar(MultiSiteSimulator):
+    """
+    Solar irradiance at several sites, with the same daily model as SolarIrradianceSimulator.
+    Cloudy days are correlated between sites: each day a normal value is drawn for each site, the
+    site is cloudy when its uniform value u is below cloudy_days, and then the cloud density is
+    0.2 + 0.4*u/cloudy_days. max_irradiation and cloudy_days can be given by site.
+    """
+
+    state_attributes = ('current_day', 'current_day_cloud_density')
+    stochastic_models = ('solar_plus_clouds',)
+
+    def __init__(self, sites = 2, max_irradiation = 1000.0, summer_sunrise_advance = 1.1, cloudy_days = 0.15,
+                 correlation = 0.8, coordinates = None, correlation_length = None, post_random_up = 0.03,
+                 post_random_down = 0.03, seed = None):
+        super().__init__(model = 'solar_plus_clouds', sites = sites, correlation = correlation, coordinates = coordinates,
+                         correlation_length = correlation_length, post_random_up = post_random_up,
+                         post_random_down = post_random_down, seed = seed)
+
+        self.base_value = max_irradiation
+        self.summer_sunrise_advance = summer_sunrise_advance
+        self.cloudy_days = cloudy_days
+        #cloud status perseverance
+        self.current_day = None
+        self.current_day_cloud_density = np.ones(self.sites)
+
+        self.batch_models['solar_plus_clouds'] = self.model_solar_plus_clouds_batch
+
+    def clear_state(self):
+        self.current_day = None
+        self.current_day_cloud_density = np.ones(self.sites)
+
+    def draw_cloud_density(self, days):
+        u = normal_cdf(self.correlated_normals(self.state_rng, len(days)))
+        cloudy_days = self.site_values(self.cloudy_days)
+        return np.where(u < cloudy_days, 0.2 + 0.4*u/np.where(cloudy_days > 0, cloudy_days, 1.0), 1.0)
+
+    def model_solar_plus_clouds_batch(self, columns):
+        d = np.asarray(columns['day'], dtype=float)
+        h = np.asarray(columns['hour'], dtype=float)
+        if len(d) == 0:
+            return np.zeros((0, self.sites))
+
+        density = expand_daily_state(d, self.current_day, self.current_day_cloud_density, self.draw_cloud_density)
+        self.current_day = d[-1]
+        self.current_day_cloud_density = density[-1]
+
+        season = np.cos((d + 10.0)/365.0*2*np.pi)
+        variation = 0.75 - 0.25*season
+
+        sunrise = 7.0 + self.summer_sunrise_advance*season
+        sunset = 19.0 - self.summer_sunrise_advance*season
+
+        daylight = (sunrise <= h) & (h <= sunset)
+        tempo = np.where(daylight, np.sin((h-sunrise)/(sunset-sunrise)*np.pi), 0.0)
+
+        return self.site_values(self.base_value)*(variation*tempo)[:, None]*density
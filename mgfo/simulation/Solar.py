@@ -1,19 +1,75 @@
 import math
-import random
+
+import numpy as np
 
 from .BaseSimulator import BaseSimulator as BS
 
+def expand_daily_state(days, current_day, current_value, draw):
+    """
+    Array version of the day-persistent state used by solar simulators.
+    A new value is obtained from draw(new_days) each time the day changes, the
+    first scene is compared against current_day so the state carries across calls.
+    Returns an array with the state of each scene.
+    """
+    days = np.asarray(days, dtype=float)
+    if len(days) == 0:
+        return np.zeros(0)
+    
+    starts = np.empty(len(days), dtype=bool)
+    starts[0] = current_day is None or days[0] != current_day
+    starts[1:] = days[1:] != days[:-1]
+    
+    values = np.concatenate(([current_value], np.asarray(draw(days[starts]), dtype=float)))
+    return values[np.cumsum(starts)]
+
+def triangular(u, low, high, mode):
+    """
+    Triangular distribution by inversion of uniform values u, same formula as random.triangular
+    (mode outside [low, high] is allowed). Works with scalars or arrays.
+    """
+    u = np.asarray(u, dtype=float)
+    c = 0.5 if high == low else (mode - low)/(high - low)
+    #each branch is evaluated on its own values, with the mode out of range the other radicand is negative
+    upper = u > c
+    lower = ~upper
+    res = np.empty_like(u)
+    res[upper] = high + (low - high)*np.sqrt((1.0 - u[upper])*(1.0 - c))
+    res[lower] = low + (high - low)*np.sqrt(u[lower]*c)
+    return res
+
+def triangular_cdf(x, low, high, mode):
+    """
+    Inverse of triangular: the uniform value u that gives x. Works with scalars or arrays.
+    As the distribution is increasing in u, triangular(uniform(0, triangular_cdf(x))) is the
+    distribution truncated to values up to x.
+    """
+    x = np.asarray(x, dtype=float)
+    c = 0.5 if high == low else (mode - low)/(high - low)
+    split = low + (high - low)*c
+    lower = np.where(x > low, ((x - low)/(high - low))**2/c, 0.0) if c > 0 else np.zeros_like(x)
+    upper = np.where(x < high, 1.0 - ((high - x)/(high - low))**2/(1.0 - c), 1.0) if c < 1 else np.ones_like(x)
+    return np.clip(np.where(x <= split, lower, upper), 0.0, 1.0)
+
+#sunrise and sunset tables by site, see MonthlySolarIrradianceSimulator.get_sun_table
+sun_tables = {}
+
 class SolarIrradianceSimulator(BS):
     """
     summer_sunrise_advance is the advancement of sunrise time in summer
     """
     
-    def __init__(self, max_irradiation = 1000.0, summer_sunrise_advance = 1.1, cloudy_days = 0.15, post_random_up = 0.03, post_random_down = 0.03):
+    state_attributes = ('current_day', 'current_day_cloudy', 'current_day_cloud_density')
+    depends_on = ()
+    stochastic_models = ('solar_plus_clouds',)
+    
+    def __init__(self, max_irradiation = 1000.0, summer_sunrise_advance = 1.1, cloudy_days = 0.15, post_random_up = 0.03, post_random_down = 0.03,
+                 seed = None):
         super().__init__(model = 'solar_plus_clouds', 
-                         post_random_up = post_random_up, post_random_down = post_random_down)     
+                         post_random_up = post_random_up, post_random_down = post_random_down, seed = seed)     
     
         self.base_value = max_irradiation
         self.models['solar_plus_clouds'] = self.model_solar_plus_clouds
+        self.batch_models['solar_plus_clouds'] = self.model_solar_plus_clouds_batch
         self.summer_sunrise_advance = summer_sunrise_advance
         self.cloudy_days = cloudy_days
         #cloud status perseverance
@@ -21,15 +77,21 @@ class SolarIrradianceSimulator(BS):
         self.current_day_cloudy = False
         self.current_day_cloud_density = 1.0
     
+    def clear_state(self):
+        self.current_day = None
+        self.current_day_cloudy = False
+        self.current_day_cloud_density = 1.0
+    
     def model_solar_plus_clouds(self, scene):
         
         d = scene['day']
         h = scene['hour']
         if self.current_day != d:
             self.current_day = d
-            if random.uniform(0,1) < self.cloudy_days:
+            u = self.state_rng.uniform(0, 1, 2)
+            if u[0] < self.cloudy_days:
                 self.current_day_cloudy = True
-                self.current_day_cloud_density = random.uniform(0.2, 0.6)
+                self.current_day_cloud_density = 0.2 + 0.4*u[1]
             else:
                 self.current_day_cloudy = False
                 self.current_day_cloud_density = 1.0
@@ -48,19 +110,55 @@ class SolarIrradianceSimulator(BS):
 
         return radiation*variation*self.current_day_cloud_density*tempo
     
+    def draw_cloud_density(self, days):
+        n = len(days)
+        u = self.state_rng.uniform(0, 1, (n, 2))
+        return np.where(u[:, 0] < self.cloudy_days, 0.2 + 0.4*u[:, 1], 1.0)
+    
+    def model_solar_plus_clouds_batch(self, columns):
+        
+        d = np.asarray(columns['day'], dtype=float)
+        h = np.asarray(columns['hour'], dtype=float)
+        if len(d) == 0:
+            return np.zeros(0)
+        
+        density = expand_daily_state(d, self.current_day, self.current_day_cloud_density, self.draw_cloud_density)
+        self.current_day = d[-1]
+        self.current_day_cloud_density = density[-1]
+        self.current_day_cloudy = density[-1] != 1.0
+        
+        radiation = self.base_value
+        
+        season = np.cos((d + 10.0)/365.0*2*np.pi)
+        variation = 0.75 - 0.25*season
+        
+        sunrise = 7.0 + self.summer_sunrise_advance*season
+        sunset = 19.0 - self.summer_sunrise_advance*season
+        
+        daylight = (sunrise <= h) & (h <= sunset)
+        tempo = np.where(daylight, np.sin((h-sunrise)/(sunset-sunrise)*np.pi), 0.0)
+        
+        return radiation*variation*density*tempo
+    
 class MonthlySolarIrradianceSimulator(BS):
+    
+    state_attributes = ('current_day', 'current_day_opacity')
+    depends_on = ()
+    stochastic_models = ('solar_monthly',)
 
     
     def __init__(self, latitude = -34.6037, longitude = -58.3814, post_random_up = 0.1, post_random_down = 0.1,
-                monthly_average_irradiation = None):
+                monthly_average_irradiation = None, max_coefficient = 1.1, seed = None):
         super().__init__(model = 'solar_monthly', 
-                         post_random_up = post_random_up, post_random_down = post_random_down)     
+                         post_random_up = post_random_up, post_random_down = post_random_down, seed = seed)     
     
         self.base_value = 1000.0
         self.latitude = latitude
         self.longitude = longitude
         self.models['solar_monthly'] = self.model_solar_monthly
+        self.batch_models['solar_monthly'] = self.model_solar_monthly_batch
         self.monthly_average_irradiation = monthly_average_irradiation
+        self.max_coefficient = max_coefficient
         #cloud status perseverance
         self.current_day = None
         self.current_day_opacity = 1.0
@@ -70,6 +168,10 @@ class MonthlySolarIrradianceSimulator(BS):
         if monthly_average_irradiation:
             self.set_monthly_coefficients(monthly_average_irradiation)
     
+    def clear_state(self):
+        self.current_day = None
+        self.current_day_opacity = 1.0
+    
     def calculate_sunrise_sunset(self, lat, long, day = 355, sunrise = True, text = False):
         zenith = 90.83333333333333
         D2R = math.pi / 180
@@ -144,6 +246,69 @@ class MonthlySolarIrradianceSimulator(BS):
         return res
 
     
+    def calculate_sunrise_sunset_array(self, lat, long, days, sunrise = True):
+        """Array version of calculate_sunrise_sunset, returns the local time for each day"""
+        zenith = 90.83333333333333
+        D2R = np.pi / 180
+        R2D = 180 / np.pi
+        days = np.asarray(days, dtype=float)
+
+        lnHour = long / 15.0
+        if sunrise:
+            t = days + ((6 - lnHour) / 24.0)
+        else:
+            t = days + ((18 - lnHour) / 24.0)
+
+        M = (0.9856 * t) - 3.289
+
+        L = M + (1.916 * np.sin(M * D2R)) + (0.020 * np.sin(2 * M * D2R)) + 282.634
+        L = np.where(L > 360, L - 360, np.where(L < 0, L + 360, L))
+
+        RA = R2D * np.arctan(0.91764 * np.tan(L * D2R))
+        RA = np.where(RA > 360, RA - 360, np.where(RA < 0, RA + 360, RA))
+
+        Lquadrant = (np.floor(L / (90))) * 90
+        RAquadrant = (np.floor(RA / 90)) * 90
+        RA = (RA + (Lquadrant - RAquadrant)) / 15
+
+        sinDec = 0.39782 * np.sin(L * D2R)
+        cosDec = np.cos(np.arcsin(sinDec))
+
+        cosH = (math.cos(zenith * D2R) - (sinDec * math.sin(lat * D2R))) / (cosDec * math.cos(lat * D2R))
+        if sunrise:
+            H = 360 - R2D * np.arccos(cosH)
+        else:
+            H = R2D * np.arccos(cosH)
+        H = H / 15
+
+        T = H + RA - (0.06571 * t) - 6.622
+
+        UT = T - lnHour
+        UT = np.where(UT > 24, UT - 24, np.where(UT < 0, UT + 24, UT))
+
+        offset = (int)(long / 15.0)
+        return UT + offset
+    
+    def get_sun_table(self):
+        """Sunrise (rounded up) and sunset (rounded down) hours for days 0 to 365 of the site.
+        Tables are computed once for each site."""
+        site = (self.latitude, self.longitude)
+        if site not in sun_tables:
+            days = np.arange(366.0)
+            sun_tables[site] = (np.ceil(self.calculate_sunrise_sunset_array(self.latitude, self.longitude, days)),
+                                np.floor(self.calculate_sunrise_sunset_array(self.latitude, self.longitude, days, sunrise = False)))
+        return sun_tables[site]
+    
+    def get_sunrise_sunset(self, days):
+        """Sunrise and sunset hours for an array of days"""
+        days = np.asarray(days, dtype=float)
+        table_sunrise, table_sunset = self.get_sun_table()
+        index = days.astype(int)
+        if np.all((index == days) & (index >= 0) & (index <= 365)):
+            return table_sunrise[index], table_sunset[index]
+        return (np.ceil(self.calculate_sunrise_sunset_array(self.latitude, self.longitude, days)),
+                np.floor(self.calculate_sunrise_sunset_array(self.latitude, self.longitude, days, sunrise = False)))
+    
     def set_monthly_coefficients(self, monthly_average_irradiation):
         """Calculates the coefficients for solar radiation so the synthetized coincides
         with the monthly average for the site."""
@@ -164,15 +329,23 @@ class MonthlySolarIrradianceSimulator(BS):
                 self.monthly_coefficients[i] = monthly_average_irradiation[i] / irradiation
                 
                 self.model_c.append( 3*self.monthly_coefficients[i] - self.model_a - self.model_b)
+        
+        #uniform range of the triangular distribution truncated at max_coefficient
+        self.model_u_max = [float(triangular_cdf(self.max_coefficient, self.model_a, self.model_b, c)) for c in self.model_c]
 
     def simulate_day_coefficient(self, day):
-        """A triangular pdf is used here"""
-        
-        month = math.floor(day/366*12)
-        res = 1.500
-        while res > 1.100:
-            res =random.triangular(self.model_a, self.model_b, self.model_c[month])
-        
+        """A triangular pdf, truncated at max_coefficient, is used here"""
+        return float(self.draw_day_coefficients([day])[0])
+    
+    def draw_day_coefficients(self, days):
+        """Daily coefficients for an array of days. The truncated triangular distribution is
+        sampled by inversion, with one uniform value for each day."""
+        month = np.floor(np.asarray(days, dtype=float)/366*12).astype(int)
+        u = self.state_rng.uniform(0, 1, len(month))*np.asarray(self.model_u_max)[month]
+        res = np.empty(len(month))
+        for m in np.unique(month):
+            selected = month == m
+            res[selected] = triangular(u[selected], self.model_a, self.model_b, self.model_c[m])
         return res
     
     def model_solar_monthly(self, scene):
@@ -183,8 +356,9 @@ class MonthlySolarIrradianceSimulator(BS):
             self.current_day = d
             self.current_day_opacity = self.simulate_day_coefficient(d)
         
-        sunrise = math.ceil(self.calculate_sunrise_sunset(self.latitude, self.longitude, day = d))
-        sunset = math.floor(self.calculate_sunrise_sunset(self.latitude, self.longitude, day = d, sunrise = False))
+        sunrise, sunset = self.get_sunrise_sunset([d])
+        sunrise = sunrise[0]
+        sunset = sunset[0]
         
         if sunrise <= h  and h <= sunset:
             tempo = math.sin((h-sunrise)/(sunset-sunrise)*math.pi)
@@ -193,4 +367,24 @@ class MonthlySolarIrradianceSimulator(BS):
         
         radiation = self.base_value
 
-        return radiation*self.current_day_opacity*tempo
\ No newline at end of file
+        return radiation*self.current_day_opacity*tempo
+    
+    def model_solar_monthly_batch(self, columns):
+        
+        d = np.asarray(columns['day'], dtype=float)
+        h = np.asarray(columns['hour'], dtype=float)
+        if len(d) == 0:
+            return np.zeros(0)
+        
+        opacity = expand_daily_state(d, self.current_day, self.current_day_opacity, self.draw_day_coefficients)
+        self.current_day = d[-1]
+        self.current_day_opacity = opacity[-1]
+        
+        sunrise, sunset = self.get_sunrise_sunset(d)
+        
+        daylight = (sunrise <= h) & (h <= sunset)
+        tempo = np.where(daylight, np.sin((h-sunrise)/(sunset-sunrise)*np.pi), 0.0)
+        
+        radiation = self.base_value
+        
+        return radiation*opacity*tempo
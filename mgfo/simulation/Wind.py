@@ -1,18 +1,27 @@
 import math
-import random
+
+import numpy as np
 
 from .BaseSimulator import BaseSimulator as BS
 
 class Weibull(BS):
-    def __init__(self, c = 10.0, k = 1.8):
-        super().__init__(model = 'weibull', post_random_model = 'none')
+    
+    stochastic_models = ('weibull',)
+    depends_on = ()
+    
+    def __init__(self, c = 10.0, k = 1.8, seed = None):
+        super().__init__(model = 'weibull', post_random_model = 'none', seed = seed)
     
         self.models['weibull'] = self.model_weibull
+        self.batch_models['weibull'] = self.model_weibull_batch
         self.c = c
         self.k = k
             
     def model_weibull(self, scene):
-        return random.weibullvariate(self.c,self.k)
+        return self.c*self.rng.weibull(self.k)
+    
+    def model_weibull_batch(self, columns):
+        return self.c*self.rng.weibull(self.k, self.batch_length(columns))
             
 class CorrelatedWeibull(BS):
     """
@@ -27,18 +36,29 @@ class CorrelatedWeibull(BS):
     the mean hourly variation of the wind speed, lower d values implies greater jumps.
     """
     
-    def __init__(self, c = 10.0, k = 1.8, d = 1.0, initial_speed = None):
-        super().__init__(model = 'temporal_weibull', post_random_model = 'none')
+    state_attributes = ('v',)
+    stochastic_models = ('temporal_weibull',)
+    depends_on = ()
+    
+    def __init__(self, c = 10.0, k = 1.8, d = 1.0, initial_speed = None, seed = None):
+        super().__init__(model = 'temporal_weibull', post_random_model = 'none', seed = seed)
     
         self.models['temporal_weibull'] = self.model_temporal_weibull
+        self.batch_models['temporal_weibull'] = self.model_temporal_weibull_batch
         self.c = c
         self.k = k
         self.d = d
-        
-        if not initial_speed:
-            self.v = random.weibullvariate(1/self.c,self.k)
+        self.initial_speed = initial_speed
+        self.init_speed()
+    
+    def init_speed(self):
+        if not self.initial_speed:
+            self.v = 1/self.c*self.rng.weibull(self.k)
         else:
-            self.v = initial_speed
+            self.v = self.initial_speed
+    
+    def clear_state(self):
+        self.init_speed()
     
     def WeibullCDF(self, x, c, k):
         return 1.0 - math.exp(-math.pow(x/c, k))
@@ -47,8 +67,9 @@ class CorrelatedWeibull(BS):
     def model_temporal_weibull(self, scene):
         left = self.WeibullCDF(self.v, self.c, self.k)
 
-        r = random.uniform(0,1)
-        delta = random.expovariate(self.d)
+        #one pair of uniform values per scene: direction and exponential step
+        r, u = self.rng.uniform(0, 1, 2)
+        delta = -math.log(1.0 - u)/self.d
         
         v = self.v
         if r <= left:
@@ -59,4 +80,25 @@ class CorrelatedWeibull(BS):
 
         self.v = v
         return v
-        
\ No newline at end of file
+        
+    
+    def model_temporal_weibull_batch(self, columns):
+        """Random draws are vectorized, the walk itself is sequential by nature"""
+        n = self.batch_length(columns)
+        u = self.rng.uniform(0, 1, (n, 2))
+        r = u[:, 0].tolist()
+        delta = (-np.log1p(-u[:, 1])/self.d).tolist()
+        values = np.zeros(n)
+        
+        v = self.v
+        for i in range(n):
+            left = 1.0 - math.exp(-math.pow(v/self.c, self.k))
+            if r[i] <= left:
+                v = v - delta[i]
+                v = 0 if v < 0 else v
+            else:
+                v = v + delta[i]
+            values[i] = v
+        
+        self.v = v
+        return values
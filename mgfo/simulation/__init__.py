@@ -8,3 +8,6 @@ from .Solar import SolarIrradianceSimulator, MonthlySolarIrradianceSimulator
 
 from .Wind import Weibull, CorrelatedWeibull
 
+from .Measured import MeasuredSeries
+
+from .MultiSite import MultiSiteWeibull, MultiSiteSolar
@@ -0,0 +1,70 @@
+import warnings
+
+import pandapower as pp
+import pyomo.environ as pe
+import pytest
+
+import mgfo
+import mgfo.resources as Resources
+from mgfo.simulation import DemandSimulator
+
+pytest.importorskip('highspy')
+
+
+def solved_writer(oversize_factor = None, max_investement = None, M = None):
+    net = pp.create_empty_network()
+    bus = pp.create_bus(net, vn_kv = 13.2)
+    pp.create_ext_grid(net, bus = bus)
+    pp.create_load(net, bus = bus, p_mw = 0.5)
+    pp.create_sgen(net, bus = bus, p_mw = 0.0)
+    net.ext_grid['model'] = None
+    net.load['model'] = None
+    net.sgen['model'] = None
+    grid = Resources.ExtGrid('SET', pr_mw = 5.0, peak_value = 200, valley_value = 120, rest_value = 160)
+    grid.oc_1_mu.reset(1)
+    net.ext_grid.at[0, 'model'] = grid
+    net.load.at[0, 'model'] = Resources.Load('Load', pr_mw = 0.5, pa_pu = DemandSimulator(seed = 2))
+    #the optimal pv supplies the load at noon, above the bound of half the size needed for the peak load
+    net.sgen.at[0, 'model'] = Resources.PVGenerator('PV', ic_1_mu = 1e5)
+    net.sgen['model'][0].M = M
+
+    scenes = mgfo.SceneBuilder(years = 1, subperiods = 2, days_in_subperiods = 1, seed = 11).build_scenes()
+    writer = mgfo.SimpleModelWriter(net, scenes)
+    writer.oversize_factor = oversize_factor
+    writer.max_investement = max_investement
+    model = writer.create_model()
+    opt = pe.SolverFactory('appsi_highs')
+    opt.config.mip_gap = 0.0
+    opt.solve(model)
+    return writer, pe.value(model.value)
+
+
+def test_binding_peak_load_big_m_warns():
+    writer, tight = solved_writer(0.5)
+    with pytest.warns(UserWarning, match = 'PV'):
+        report = writer.big_m_report()
+    pv = report[(report.resource == 'PV') & (report.name == 'M')].iloc[0]
+    assert pv.source == 'peak load' and pv.binding
+
+    #the heuristic bound cut off the optimum, by default it is not used
+    writer, loose = solved_writer()
+    assert loose < tight
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        report = writer.big_m_report()
+    assert not (report.source == 'peak load').any()
+    assert writer.net.sgen['model'][0].get_big_m('M') == 1e3
+
+
+def test_investement_big_m_keeps_optimum():
+    writer, unbounded = solved_writer()
+    budget = 0.5*writer.net.sgen['model'][0].pr_mw.value*1e5
+
+    writer, bounded = solved_writer(max_investement = budget)
+    report = writer.big_m_report()
+    pv = report[(report.resource == 'PV') & (report.name == 'M')].iloc[0]
+    assert pv.source == 'investement' and pv.M == pytest.approx(budget/1e5)
+
+    writer, user = solved_writer(max_investement = budget, M = 1e6)
+    assert bounded == pytest.approx(user, rel = 1e-9)
+    assert unbounded < bounded
@@ -0,0 +1,79 @@
+import pandapower as pp
+import pyomo.environ as pe
+import pytest
+
+import mgfo
+import mgfo.resources as Resources
+from mgfo.simulation import DemandSimulator, SolarIrradianceSimulator
+
+pytest.importorskip('highspy')
+
+
+def writer(scenes, pv = True):
+    net = pp.create_empty_network()
+    b0 = pp.create_bus(net, vn_kv = 13.2)
+    b1 = pp.create_bus(net, vn_kv = 13.2)
+    pp.create_ext_grid(net, bus = b0)
+    #parallel lines get the same name
+    pp.create_line(net, from_bus = b0, to_bus = b1, length_km = 1.0, std_type = "NAYY 4x50 SE")
+    pp.create_line(net, from_bus = b0, to_bus = b1, length_km = 1.0, std_type = "NAYY 4x50 SE")
+    pp.create_load(net, bus = b1, p_mw = 0.5)
+    pp.create_sgen(net, bus = b1, p_mw = 0.0)
+    for table in (net.ext_grid, net.load, net.sgen):
+        table['model'] = None
+    grid = Resources.ExtGrid('SET', pr_mw = 5.0, peak_value = 400, valley_value = 120, rest_value = 200)
+    grid.oc_1_mu.reset(1)
+    net.ext_grid.at[0, 'model'] = grid
+    net.load.at[0, 'model'] = Resources.Load('L', pr_mw = 0.5, pa_pu = DemandSimulator(seed = 2))
+    if pv:
+        net.sgen.at[0, 'model'] = Resources.PVGenerator('PV', ic_1_mu = 2e5)
+    w = mgfo.MultiBusbarModelWriter(net, scenes, overload_hours = 10)
+    w.create_model()
+    return w
+
+
+def solve(w):
+    opt = pe.SolverFactory('appsi_highs')
+    opt.config.mip_gap = 0.0
+    opt.solve(w.model)
+    return pe.value(w.model.value)
+
+
+@pytest.fixture(scope = 'module')
+def scenes():
+    builder = mgfo.SceneBuilder(years = 1, subperiods = 2, days_in_subperiods = 1, seed = 4)
+    builder.add_column('solar_irradiance', SolarIrradianceSimulator(seed = 5))
+    return builder.build_scenes()
+
+
+def test_resources_are_built_in_their_blocks(scenes):
+    w = writer(scenes)
+    blocks = [m.block for m in w.resource_models()]
+    assert len(set(b.local_name for b in blocks)) == len(blocks)
+    lines = w.net.line['model']
+    assert lines[0].name == lines[1].name and lines[0].block is not lines[1].block
+
+    #vars and constraints of the resources are not at the top level of the model
+    for v in w.model.component_objects(pe.Var, descend_into = True):
+        assert v.parent_block() is not w.model
+    owned = sum(len(list(b.component_data_objects(pe.Constraint))) for b in blocks)
+    top = len(list(w.model.component_data_objects(pe.Constraint, descend_into = False)))
+    assert owned + top == len(list(w.model.component_data_objects(pe.Constraint, descend_into = True)))
+
+    stats = w.block_statistics()
+    assert list(stats.block) == [b.local_name for b in blocks]
+    assert (stats.vars[stats.resource == 'L'] == 0).all() and (stats.vars[stats.resource == 'PV'] > 0).all()
+
+
+def test_deactivated_block_matches_model_without_it(scenes):
+    w = writer(scenes)
+    with_pv = solve(w)
+    assert w.net.sgen['model'][0].pr_mw.value > 0
+
+    w.net.sgen['model'][0].deactivate()
+    without_pv = solve(w)
+    assert without_pv == pytest.approx(solve(writer(scenes, pv = False)), rel = 1e-9)
+    assert with_pv < without_pv
+
+    w.net.sgen['model'][0].activate()
+    assert solve(w) == pytest.approx(with_pv, rel = 1e-9)
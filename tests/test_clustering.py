@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import mgfo
+from mgfo.scenes import Clustering
+from mgfo.simulation import DemandSimulator, SolarIrradianceSimulator
+
+
+def builder(method, seed = 7):
+    b = mgfo.SceneBuilder(years = 2, representative_days = 6, cluster_method = method, seed = seed)
+    b.add_column('solar_irradiance', SolarIrradianceSimulator())
+    b.add_column('demand', DemandSimulator())
+    return b
+
+
+@pytest.mark.parametrize('method', ['kmeans', 'kmedoids'])
+def test_cluster_weights_sum_to_the_days(method):
+    b = builder(method)
+    scenes = b.build_scenes()
+    for year, weights, labels in zip(range(2), b.cluster_weights, b.cluster_labels):
+        assert weights.sum() == 365
+        assert np.array_equal(np.bincount(labels), weights)
+        hours = scenes[scenes.year == year]
+        assert (hours.dt*hours.dd).sum() == pytest.approx(365*24)
+
+
+@pytest.mark.parametrize('method', ['kmeans', 'kmedoids'])
+def test_clustering_is_deterministic_with_a_seed(method):
+    first = builder(method)
+    second = builder(method)
+    pd.testing.assert_frame_equal(first.build_scenes(), second.build_scenes(), check_exact = True)
+    for a, b in zip(first.cluster_days, second.cluster_days):
+        assert np.array_equal(a, b)
+
+
+def test_representative_days_of_separated_groups():
+    rng = np.random.default_rng(0)
+    features = np.vstack([rng.normal(c, 0.01, (n, 3)) for c, n in ((0.0, 5), (1.0, 7), (3.0, 2))])
+    days, weights, labels = Clustering.representative_days(features, 3, 'kmedoids', rng = np.random.default_rng(1))
+    assert sorted(weights.tolist()) == [2, 5, 7]
+    #each group is a cluster
+    groups = np.repeat([0, 1, 2], [5, 7, 2])
+    assert len(set(zip(groups, labels))) == 3 and len(set(labels)) == 3
@@ -0,0 +1,55 @@
+import numpy as np
+import pandapower as pp
+import pyomo.environ as pe
+from pyomo.core.expr.visitor import identify_variables
+
+import mgfo
+import mgfo.resources as Resources
+from mgfo.simulation import DemandSimulator
+
+
+def ensemble_writer(sparse):
+    builder = mgfo.SceneBuilder(years = 1, subperiods = 2, days_in_subperiods = 1, seed = 5)
+    builder.add_column('demand', DemandSimulator())
+    scenes = builder.build_ensemble(3).to_scenes()
+
+    net = pp.create_empty_network()
+    bus = pp.create_bus(net, vn_kv = 13.2)
+    pp.create_ext_grid(net, bus = bus)
+    pp.create_load(net, bus = bus, p_mw = 0.5)
+    pp.create_storage(net, bus = bus, p_mw = 0.0, max_e_mwh = 0.0)
+    for table in (net.ext_grid, net.load, net.storage):
+        table['model'] = None
+    net.ext_grid.at[0, 'model'] = Resources.ExtGrid('SET', pr_mw = 5.0, peak_value = 200, valley_value = 120, rest_value = 160)
+    net.load.at[0, 'model'] = Resources.Load('Load', pr_mw = 0.5, pa_pu = scenes['demand'].tolist())
+    net.storage.at[0, 'model'] = Resources.Storage('ST', ic_1_mu = 1e3, ic_1_mu_cap = 1e3)
+
+    writer = mgfo.SimpleModelWriter(net, scenes)
+    model = writer.create_sparse_model() if sparse else writer.create_model()
+    return writer, model, scenes
+
+
+def test_to_scenes_marks_realization_starts():
+    writer, model, scenes = ensemble_writer(False)
+    rows = len(scenes)//3
+    assert list(np.flatnonzero(scenes['start'])) == [0, rows, 2*rows]
+
+
+def test_storage_starts_empty_in_each_realization():
+    writer, model, scenes = ensemble_writer(False)
+    storage = writer.net.storage.model[0]
+    rows = len(scenes)//3
+    for s in (rows, 2*rows):
+        variables = [id(v) for v in identify_variables(storage.soc_constraint[s].body)]
+        assert variables == [id(storage.soc_mwh[s])]
+    assert id(storage.soc_mwh[rows - 2]) in [id(v) for v in identify_variables(storage.soc_constraint[rows - 1].body)]
+
+
+def test_sparse_storage_starts_empty_in_each_realization():
+    writer, model, scenes = ensemble_writer(True)
+    storage = writer.net.storage.model[0]
+    rows = len(scenes)//3
+    first = [start for name, start, n in model.constraints if name == 'ST_soc_constraint'][0]
+    matrix = model.matrix()
+    for s in (rows, 2*rows):
+        assert list(matrix[[first + s], :].indices) == [storage.soc_mwh.columns[s]]
@@ -0,0 +1,97 @@
+import pandapower as pp
+import pyomo.environ as pe
+import pytest
+from pyomo.core.expr.visitor import identify_variables, identify_mutable_parameters
+
+import mgfo
+import mgfo.resources as Resources
+from mgfo.simulation import DemandSimulator
+
+pytest.importorskip('highspy')
+
+
+def network():
+    net = pp.create_empty_network()
+    b0 = pp.create_bus(net, vn_kv = 13.2)
+    b1 = pp.create_bus(net, vn_kv = 13.2)
+    b2 = pp.create_bus(net, vn_kv = 13.2)
+    pp.create_ext_grid(net, bus = b0)
+    pp.create_line(net, from_bus = b0, to_bus = b1, length_km = 0.8, std_type = "NAYY 4x50 SE")
+    pp.create_line(net, from_bus = b0, to_bus = b2, length_km = 2.0, std_type = "NAYY 4x50 SE")
+    pp.create_load(net, bus = b1, p_mw = 0.35)
+    pp.create_load(net, bus = b2, p_mw = 0.85)
+    pp.create_sgen(net, bus = b2, p_mw = 0.0)
+    pp.create_storage(net, bus = b2, p_mw = 0.0, max_e_mwh = 0.0)
+    for table in (net.ext_grid, net.load, net.sgen, net.storage):
+        table['model'] = None
+    grid = Resources.ExtGrid('SET', pr_mw = 5.0, peak_value = 200, valley_value = 120, rest_value = 160)
+    grid.oc_1_mu.reset(1)
+    net.ext_grid.at[0, 'model'] = grid
+    net.load.at[0, 'model'] = Resources.Load('L1', pr_mw = 0.35, pa_pu = DemandSimulator(seed = 2))
+    net.load.at[1, 'model'] = Resources.Load('L2', pr_mw = 0.85, pa_pu = DemandSimulator(seed = 3))
+    net.sgen.at[0, 'model'] = Resources.PVGenerator('PV', ic_1_mu = 3e5)
+    return net
+
+
+def storage():
+    return Resources.Storage('ST', ic_1_mu = 1e3, ic_1_mu_cap = 1e3, oc_1_mu = 2.0, eta_bb = 0.9, sigma = 2.1e-3)
+
+
+@pytest.fixture(scope = 'module')
+def scenes():
+    return mgfo.SceneBuilder(years = 1, subperiods = 2, days_in_subperiods = 1, seed = 11).build_scenes()
+
+
+def solve(writer):
+    opt = pe.SolverFactory('appsi_highs')
+    opt.config.mip_gap = 0.0
+    opt.solve(writer.model)
+    return pe.value(writer.model.value)
+
+
+def test_add_and_remove_match_rebuild(scenes):
+    net = network()
+    net.storage.at[0, 'model'] = storage()
+    full = mgfo.MultiBusbarModelWriter(net, scenes)
+    full.create_model()
+
+    writer = mgfo.MultiBusbarModelWriter(network(), scenes)
+    writer.create_model()
+    base = solve(writer)
+    writer.add_resource('storage', 0, storage())
+    assert solve(writer) == pytest.approx(solve(full), rel = 1e-9)
+    writer.remove_resource('storage', 0)
+    assert solve(writer) == pytest.approx(base, rel = 1e-9)
+
+
+def test_remove_touches_only_its_bus(scenes):
+    writer = mgfo.MultiBusbarModelWriter(network(), scenes)
+    model = writer.create_model()
+    pv = writer.net.sgen.model[0]
+    components = set(id(c) for c in pv.block.component_data_objects((pe.Var, pe.Param), descend_into = True))
+    before = {k: model.bus_injection[k].expr for k in model.bus_injection}
+    constraints = {k: model.busbar_power_balance_constraint[k] for k in model.busbar_power_balance_constraint}
+
+    writer.remove_resource('sgen', 0)
+    for (b, s), expr in before.items():
+        assert (model.bus_injection[b, s].expr is expr) == (b != 2)
+        assert model.busbar_power_balance_constraint[b, s] is constraints[b, s]
+        assert not any(id(v) in components for v in identify_variables(model.bus_injection[b, s].expr))
+    assert model.component(pv.name) is None
+
+
+def test_remove_mutable_load(scenes):
+    net = network()
+    net.load.at[1, 'model'] = None
+    rebuilt = mgfo.SimpleModelWriter(net, scenes)
+    rebuilt.create_model()
+
+    writer = mgfo.SimpleModelWriter(network(), scenes)
+    writer.mutable_data = True
+    model = writer.create_model()
+    load = writer.net.load.model[1]
+    params = set(id(p) for p in load.block.component_data_objects(pe.Param, descend_into = True))
+    writer.remove_resource('load', 1)
+    for s in model.scene_set:
+        assert not any(id(p) in params for p in identify_mutable_parameters(model.power_injection[s].expr))
+    assert solve(writer) == pytest.approx(solve(rebuilt), rel = 1e-9)
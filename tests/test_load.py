@@ -0,0 +1,82 @@
+import numpy as np
+import pandapower as pp
+import pyomo.environ as pe
+import pytest
+
+import mgfo
+import mgfo.resources as Resources
+from mgfo.resources.BaseResource import BaseResource
+from mgfo.simulation import DemandSimulator, SolarIrradianceSimulator
+
+pytest.importorskip('highspy')
+
+
+class FixedVarLoad(Resources.Load):
+    """Load modeled as before, with a var by scene fixed to the demand"""
+
+    def initialize_model(self, model, scenes):
+        self.model = model
+        self.set_scenes(scenes)
+        self.create_block(model)
+        self.p_mw = pe.Var(model.scene_set, within = pe.Reals)
+        setattr(self.block, self.name + '_p_mw', self.p_mw)
+        for s, p in enumerate(self.power_values()):
+            self.p_mw[s].fix(p)
+        self.report_attrs[self.name + '_p_mw'] = lambda: np.array([self.p_mw[s].value for s in model.scene_set])
+
+    def active_power(self, scene):
+        return self.p_mw[scene]
+
+    def operating_cost_expression(self, weights):
+        return BaseResource.operating_cost_expression(self, weights)
+
+
+def writer(scenes, load_class, mutable = False):
+    net = pp.create_empty_network()
+    b0 = pp.create_bus(net, vn_kv = 13.2)
+    b1 = pp.create_bus(net, vn_kv = 13.2)
+    pp.create_ext_grid(net, bus = b0)
+    pp.create_line(net, from_bus = b0, to_bus = b1, length_km = 1.0, std_type = "NAYY 4x50 SE")
+    pp.create_load(net, bus = b0, p_mw = 0.3)
+    pp.create_load(net, bus = b1, p_mw = 0.5)
+    pp.create_sgen(net, bus = b1, p_mw = 0.0)
+    pp.create_storage(net, bus = b1, p_mw = 0.0, max_e_mwh = 0.0)
+    for table in (net.ext_grid, net.load, net.sgen, net.storage):
+        table['model'] = None
+    grid = Resources.ExtGrid('SET', pr_mw = 5.0, peak_value = 400, valley_value = 120, rest_value = 200)
+    grid.oc_1_mu.reset(1)
+    net.ext_grid.at[0, 'model'] = grid
+    net.load.at[0, 'model'] = load_class('L1', pr_mw = 0.3, pa_pu = DemandSimulator(seed = 2))
+    net.load.at[1, 'model'] = load_class('L2', pr_mw = 0.5, pa_pu = DemandSimulator(seed = 3))
+    net.load['model'][1].oc_1_mu = 5.0
+    net.sgen.at[0, 'model'] = Resources.PVGenerator('PV', ic_1_mu = 2e5)
+    net.storage.at[0, 'model'] = Resources.Storage('ST', ic_1_mu = 1e3, ic_1_mu_cap = 1e3, oc_1_mu = 2.0, eta_bb = 0.9, sigma = 2.1e-3)
+    w = mgfo.MultiBusbarModelWriter(net, scenes, overload_hours = 10)
+    w.mutable_data = mutable
+    w.create_model()
+    opt = pe.SolverFactory('appsi_highs')
+    opt.config.mip_gap = 0.0
+    opt.solve(w.model)
+    return w
+
+
+@pytest.fixture(scope = 'module')
+def scenes():
+    builder = mgfo.SceneBuilder(years = 1, subperiods = 2, days_in_subperiods = 1, seed = 4)
+    builder.add_column('solar_irradiance', SolarIrradianceSimulator(seed = 5))
+    return builder.build_scenes()
+
+
+@pytest.mark.parametrize('mutable', [False, True])
+def test_load_without_vars_keeps_objective(scenes, mutable):
+    fixed = writer(scenes, FixedVarLoad)
+    constant = writer(scenes, Resources.Load, mutable)
+    load = constant.net.load['model'][1]
+    assert not any(True for v in load.block.component_data_objects(pe.Var))
+    assert pe.value(constant.model.value) == pytest.approx(pe.value(fixed.model.value), rel = 1e-9)
+
+    results = constant.get_scenes_results()
+    fixed_results = fixed.get_scenes_results()
+    for name in ('L1_p_mw', 'L2_p_mw'):
+        assert np.array_equal(results[name], fixed_results[name])
+    assert constant.total_suministred_energy() == pytest.approx(fixed.total_suministred_energy())
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from mgfo.simulation import MeasuredSeries
+
+#a ramp of 4 units by hour, measured every 15 minutes during 2 days
+TIMESTAMPS = pd.date_range('2021-01-01', periods = 192, freq = '15min')
+VALUES = np.arange(192.0)
+
+#intervals [0, 1) and [5, 7) of day 0, [10, 11) of day 1 and one after the measured period
+COLUMNS = {'year': np.zeros(4), 'day': np.array([0.0, 0.0, 1.0, 5.0]), 'hour': np.array([0.0, 5.0, 10.0, 0.0]),
+           'dt': np.array([1.0, 2.0, 1.0, 1.0])}
+
+
+@pytest.mark.parametrize('how, expected', [('mean', [1.5, 23.5, 137.5, 191.0]), 
+                                           ('integrate', [2.0, 24.0, 138.0, 191.0]), 
+                                           ('nearest', [0.0, 20.0, 136.0, 191.0])])
+def test_measured_aggregation(how, expected):
+    series = MeasuredSeries(TIMESTAMPS, VALUES, how = how)
+    assert series.start_year == 2021
+    values = series.simulate_batch(COLUMNS)
+    assert np.allclose(values, expected)
+    for i in range(4):
+        assert series.simulate({k: COLUMNS[k][i] for k in COLUMNS}) == pytest.approx(expected[i])
+
+
+def test_measured_ignores_missing_and_unsorted_values(tmp_path):
+    values = VALUES.copy()
+    values[2] = np.nan
+    order = np.random.default_rng(0).permutation(192)
+    series = MeasuredSeries(TIMESTAMPS[order], values[order])
+    assert series.simulate_batch(COLUMNS)[0] == pytest.approx((0.0 + 1.0 + 3.0)/3)
+
+    path = str(tmp_path / 'measurements.csv')
+    pd.DataFrame({'time': TIMESTAMPS, 'p': VALUES}).to_csv(path, index = False)
+    stored = MeasuredSeries.from_file(path, 'p', how = 'integrate')
+    assert np.allclose(stored.simulate_batch(COLUMNS), [2.0, 24.0, 138.0, 191.0])
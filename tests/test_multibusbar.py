@@ -0,0 +1,65 @@
+import pandapower as pp
+import pytest
+from pyomo.repn import generate_standard_repn
+
+import mgfo
+import mgfo.resources as Resources
+from mgfo.simulation import DemandSimulator
+
+
+def loop_balance_expression(writer, b_index, scene):
+    """Busbar balance as built before the incidence index, scanning all the tables"""
+    power = 0.0
+    for table in writer.tables:
+        if hasattr(table, 'bus') and hasattr(table, 'model'):
+            for element in range(len(table)):
+                if table.bus[element] == b_index and table.model[element]:
+                    power += table.model[element].active_power(scene)
+        if hasattr(table, 'from_bus') and hasattr(table, 'to_bus') and hasattr(table, 'model'):
+            for element in range(len(table)):
+                if table.from_bus[element] == b_index and table.model[element]:
+                    power += table.model[element].transmited_power(scene)
+                if table.to_bus[element] == b_index and table.model[element]:
+                    power -= table.model[element].transmited_power(scene)
+    return power
+
+
+def terms(expression):
+    repn = generate_standard_repn(expression, compute_values = True)
+    linear = {}
+    for v, c in zip(repn.linear_vars, repn.linear_coefs):
+        linear[id(v)] = linear.get(id(v), 0.0) + c
+    return repn.constant, {k: c for k, c in linear.items() if c != 0}
+
+
+def test_incidence_matches_table_loop():
+    net = pp.create_empty_network()
+    buses = [pp.create_bus(net, vn_kv = 13.2) for i in range(4)]
+    pp.create_ext_grid(net, bus = buses[0])
+    #parallel lines, a line arriving to the bus where the grid is and a bus with lines only
+    for f, t in ((0, 1), (0, 1), (1, 2), (2, 3), (3, 0)):
+        pp.create_line(net, from_bus = buses[f], to_bus = buses[t], length_km = 1.0, std_type = "NAYY 4x50 SE")
+    for b, p in ((1, 0.3), (1, 0.2), (2, 0.4)):
+        pp.create_load(net, bus = buses[b], p_mw = p)
+    for b in (2, 1, 2):
+        pp.create_sgen(net, bus = buses[b], p_mw = 0.0)
+    for table in (net.ext_grid, net.load, net.sgen):
+        table['model'] = None
+    net.ext_grid.at[0, 'model'] = Resources.ExtGrid('SET', pr_mw = 5.0, peak_value = 200, valley_value = 120, rest_value = 160)
+    for i in range(3):
+        net.load.at[i, 'model'] = Resources.Load('L' + str(i), pr_mw = net.load.p_mw[i], pa_pu = DemandSimulator(seed = i))
+    #the last sgen is not modeled
+    net.sgen.at[0, 'model'] = Resources.PVGenerator('PV0', ic_1_mu = 1e5)
+    net.sgen.at[1, 'model'] = Resources.PVGenerator('PV1', ic_1_mu = 1e5)
+
+    scenes = mgfo.SceneBuilder(years = 1, subperiods = 2, days_in_subperiods = 1, seed = 3).build_scenes()
+    writer = mgfo.MultiBusbarModelWriter(net, scenes)
+    model = writer.create_model()
+
+    for b in model.bus_set:
+        for s in model.scene_set:
+            constant, linear = terms(model.bus_injection[b, s].expr)
+            loop_constant, loop_linear = terms(loop_balance_expression(writer, b, s))
+            assert constant == pytest.approx(loop_constant, rel = 1e-12)
+            assert linear == loop_linear
+    assert len(writer.bus_elements('departing', 0)) == 2 and len(writer.bus_elements('arriving', 0)) == 1
@@ -0,0 +1,19 @@
+import numpy as np
+
+from mgfo.simulation.MultiSite import MultiSiteWeibull, normal_cdf, normal_sf
+
+
+def test_normal_distribution():
+    z = np.array([-40.0, -1.0, 0.0, 1.0, 40.0])
+    assert normal_cdf(z).dtype == np.float64
+    assert np.allclose(normal_cdf(z) + normal_sf(z), 1.0)
+    assert normal_sf(np.array([30.0]))[0] > 0
+
+
+def test_weibull_state_across_batches():
+    #the speed process continues from the last scene, so a split batch gives the same speeds
+    whole = MultiSiteWeibull(sites = 3, autocorrelation = 0.9, seed = 4).simulate_batch({'day': np.arange(100)})
+    split = MultiSiteWeibull(sites = 3, autocorrelation = 0.9, seed = 4)
+    parts = np.concatenate([split.simulate_batch({'day': np.arange(40)}), split.simulate_batch({'day': np.arange(40, 100)})])
+    assert whole.shape == (100, 3)
+    assert np.allclose(whole, parts)
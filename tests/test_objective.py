@@ -0,0 +1,59 @@
+import pandapower as pp
+import pyomo.environ as pe
+import pytest
+from pyomo.repn import generate_standard_repn
+
+import mgfo
+import mgfo.resources as Resources
+from mgfo.simulation import DemandSimulator, SolarIrradianceSimulator
+
+pytest.importorskip('highspy')
+
+
+def solved_writer(scenes, mutable):
+    net = pp.create_empty_network()
+    b0 = pp.create_bus(net, vn_kv = 13.2)
+    b1 = pp.create_bus(net, vn_kv = 13.2)
+    pp.create_ext_grid(net, bus = b0)
+    pp.create_line(net, from_bus = b0, to_bus = b1, length_km = 1.0, std_type = "NAYY 4x50 SE")
+    pp.create_load(net, bus = b1, p_mw = 0.5)
+    pp.create_sgen(net, bus = b1, p_mw = 0.0)
+    pp.create_sgen(net, bus = b1, p_mw = 0.0)
+    pp.create_storage(net, bus = b1, p_mw = 0.0, max_e_mwh = 0.0)
+    for table in (net.ext_grid, net.load, net.sgen, net.storage):
+        table['model'] = None
+    grid = Resources.ExtGrid('SET', pr_mw = 5.0, peak_value = 400, valley_value = 120, rest_value = 200)
+    grid.oc_1_mu.reset(1)
+    net.ext_grid.at[0, 'model'] = grid
+    net.load.at[0, 'model'] = Resources.Load('L', pr_mw = 0.5, pa_pu = DemandSimulator(seed = 2))
+    net.load['model'][0].oc_1_mu = 3.0
+    net.sgen.at[0, 'model'] = Resources.PVGenerator('PV', ic_1_mu = 2e5, oc_0_mu = 1.0)
+    net.sgen.at[1, 'model'] = Resources.PVGeneratorDiscrete('PVD', unit_size_mw = 0.1, unit_cost_mu = 1.5e4, oc_0_mu = 1.0)
+    net.storage.at[0, 'model'] = Resources.Storage('ST', ic_1_mu = 1e3, ic_1_mu_cap = 1e3, oc_1_mu = 2.0, eta_bb = 0.9, sigma = 2.1e-3)
+    w = mgfo.MultiBusbarModelWriter(net, scenes, overload_cost = 500.0)
+    w.mutable_data = mutable
+    w.create_model()
+    opt = pe.SolverFactory('appsi_highs')
+    opt.config.mip_gap = 0.0
+    opt.solve(w.model)
+    return w
+
+
+@pytest.fixture(scope = 'module')
+def scenes():
+    builder = mgfo.SceneBuilder(years = 2, subperiods = 2, days_in_subperiods = 1, discount_rate = 0.05, seed = 4)
+    builder.add_column('solar_irradiance', SolarIrradianceSimulator(seed = 5))
+    return builder.build_scenes()
+
+
+@pytest.mark.parametrize('mutable', [False, True])
+def test_objective_matches_scene_loop(scenes, mutable):
+    w = solved_writer(scenes, mutable)
+    assert generate_standard_repn(w.model.value.expr, compute_values = False).is_linear()
+
+    #objective as it was built: initial cost plus the cost of each scene weighted from its row
+    value = pe.value(w.initial_cost_expression())
+    for s in range(len(scenes)):
+        row = scenes.iloc[s]
+        value += row['dt']*row['dd']*row['discount']*pe.value(w.hourly_operational_cost_expression(s))
+    assert pe.value(w.model.value) == pytest.approx(value, rel = 1e-12)
@@ -0,0 +1,61 @@
+import numpy as np
+import pandapower as pp
+import pandas as pd
+import pyomo.environ as pe
+import pytest
+
+import mgfo
+import mgfo.resources as Resources
+from mgfo.simulation import DemandSimulator, SolarIrradianceSimulator
+
+pytest.importorskip('highspy')
+
+
+def network():
+    net = pp.create_empty_network()
+    b0 = pp.create_bus(net, vn_kv = 13.2)
+    pp.create_ext_grid(net, bus = b0)
+    pp.create_load(net, bus = b0, p_mw = 0.5)
+    pp.create_sgen(net, bus = b0, p_mw = 0.0)
+    pp.create_storage(net, bus = b0, p_mw = 0.0, max_e_mwh = 0.0)
+    for table in (net.ext_grid, net.load, net.sgen, net.storage):
+        table['model'] = None
+    grid = Resources.ExtGrid('SET', pr_mw = 5.0, peak_value = 400, valley_value = 120, rest_value = 200)
+    grid.oc_1_mu.reset(1)
+    net.ext_grid.at[0, 'model'] = grid
+    net.load.at[0, 'model'] = Resources.Load('L', pr_mw = 0.5, pa_pu = DemandSimulator(seed = 2))
+    net.sgen.at[0, 'model'] = Resources.PVGenerator('PV', ic_1_mu = 2e5)
+    net.storage.at[0, 'model'] = Resources.Storage('ST', ic_1_mu = 1e3, ic_1_mu_cap = 1e3, oc_1_mu = 2.0, eta_bb = 0.9, sigma = 2.1e-3)
+    return net
+
+
+@pytest.fixture(scope = 'module')
+def scenes():
+    builder = mgfo.SceneBuilder(years = 1, subperiods = 2, days_in_subperiods = 1, seed = 4)
+    builder.add_column('solar_irradiance', SolarIrradianceSimulator(seed = 5))
+    return builder.build_scenes()
+
+
+def solve(scenes, presolve):
+    w = mgfo.SimpleModelWriter(network(), scenes)
+    w.presolve_unavailable = presolve
+    w.create_model()
+    opt = pe.SolverFactory('appsi_highs')
+    opt.config.mip_gap = 0.0
+    opt.solve(w.model)
+    return w, pe.value(w.model.value)
+
+
+def test_presolve_keeps_objective_and_results(scenes):
+    full, value = solve(scenes, False)
+    presolved, presolved_value = solve(scenes, True)
+    pv = presolved.net.sgen['model'][0]
+    assert presolved.presolved_scenes['PV'] > 0
+    assert full.net.sgen['model'][0].pr_mw.value > 0
+    assert presolved_value == pytest.approx(value, rel = 1e-9)
+
+    results = full.get_scenes_results()
+    presolved_results = presolved.get_scenes_results()
+    pd.testing.assert_frame_equal(presolved_results, results, atol = 1e-6)
+    night = pv.unavailable_scenes()
+    assert np.all(presolved_results['PV_p_mw'].to_numpy()[night] == 0)
@@ -0,0 +1,75 @@
+import numpy as np
+import pandapower as pp
+import pyomo.environ as pe
+import pytest
+from pyomo.repn import generate_standard_repn
+
+import mgfo
+import mgfo.resources as Resources
+
+pytest.importorskip('highspy')
+
+
+def random_availability(scene):
+    return np.random.uniform()
+
+
+def network():
+    net = pp.create_empty_network()
+    b0 = pp.create_bus(net, vn_kv = 13.2)
+    pp.create_ext_grid(net, bus = b0)
+    pp.create_load(net, bus = b0, p_mw = 0.5)
+    pp.create_sgen(net, bus = b0, p_mw = 0.0)
+    for table in (net.ext_grid, net.load, net.sgen):
+        table['model'] = None
+    grid = Resources.ExtGrid('SET', pr_mw = 5.0, peak_value = 200, valley_value = 120, rest_value = 160)
+    net.ext_grid.at[0, 'model'] = grid
+    net.load.at[0, 'model'] = Resources.Load('L', pr_mw = 0.5)
+    gen = Resources.PVGenerator('G', ic_1_mu = 1e3)
+    gen.pa_pu = random_availability
+    net.sgen.at[0, 'model'] = gen
+    return net
+
+
+@pytest.fixture(scope = 'module')
+def scenes():
+    return mgfo.SceneBuilder(years = 1, subperiods = 2, days_in_subperiods = 1, seed = 5).build_scenes()
+
+
+def test_random_attributes_are_sampled_once_per_model(scenes):
+    writer = mgfo.SimpleModelWriter(network(), scenes)
+    writer.create_model()
+    opt = pe.SolverFactory('appsi_highs')
+    opt.config.mip_gap = 0.0
+    opt.solve(writer.model)
+
+    gen = writer.net.sgen['model'][0]
+    load = writer.net.load['model'][0]
+    pr_mw = gen.pr_mw.value
+    assert pr_mw > 0
+    for s in range(len(scenes)):
+        repn = generate_standard_repn(gen.p_mw_constraint[s].body)
+        bound = -repn.linear_coefs[[id(v) for v in repn.linear_vars].index(id(gen.pr_mw))]
+        assert pe.value(gen.available_power(s)) == pytest.approx(bound*pr_mw, rel = 1e-12)
+        assert gen['pa_pu', s] == bound
+        assert gen['pa_pu', scenes.iloc[s]] == bound
+
+    hours = scenes['dt'].to_numpy()*scenes['dd'].to_numpy()
+    demand = np.array([load['pa_pu', s] for s in range(len(scenes))])*load.pr_mw
+    assert writer.total_suministred_energy() == pytest.approx(float(np.dot(demand, hours)))
+
+
+def test_memoize_keeps_profiles_across_models(scenes):
+    net = network()
+    gen = net.sgen['model'][0]
+    mgfo.SimpleModelWriter(net, scenes).create_model()
+    first = gen.profile('pa_pu').copy()
+    mgfo.SimpleModelWriter(net, scenes).create_model()
+    assert not np.array_equal(gen.profile('pa_pu'), first)
+
+    gen.memoize = True
+    first = gen.profile('pa_pu').copy()
+    mgfo.SimpleModelWriter(net, scenes).create_model()
+    assert np.array_equal(gen.profile('pa_pu'), first)
+    gen.clear_profiles()
+    assert not np.array_equal(gen.profile('pa_pu'), first)
@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+
+from mgfo.resources import PVGenerator, PVGeneratorDiscrete
+
+
+@pytest.mark.parametrize('pv', [PVGenerator('pv'), PVGeneratorDiscrete('pv')])
+def test_solar_output_batch_matches_scalar(pv):
+    columns = {'solar_irradiance': np.linspace(0.0, 1100.0, 12), 'year': np.arange(12) % 4}
+    batch = pv.solar_output_batch(columns)
+    scalar = [pv.solar_output({k: columns[k][i] for k in columns}) for i in range(12)]
+    assert np.array_equal(batch, scalar)
+
+
+@pytest.mark.parametrize('pv', [PVGenerator('pv'), PVGeneratorDiscrete('pv')])
+@pytest.mark.parametrize('irradiance', [-1.0, 1300.0, np.nan])
+def test_solar_output_batch_validation(pv, irradiance):
+    with pytest.raises(ValueError):
+        pv.solar_output({'solar_irradiance': irradiance, 'year': 0})
+    with pytest.raises(ValueError):
+        pv.solar_output_batch({'solar_irradiance': np.array([500.0, irradiance]), 'year': np.zeros(2)})
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+import mgfo
+from mgfo.simulation import DemandSimulator
+from mgfo.scenes.SceneCache import load_scenes
+from mgfo.simulation.BaseSimulator import BaseSimulator
+
+
+def builder(seed = 7, years = 3, **kwargs):
+    b = mgfo.SceneBuilder(years = years, subperiods = 2, days_in_subperiods = 2, growth_rate = 0.02, discount_rate = 0.03,
+                          seed = seed, **kwargs)
+    b.add_column('demand', DemandSimulator())
+    return b
+
+
+def test_parallel_build_equals_serial():
+    serial = builder().build_scenes()
+    parallel = builder().build_scenes(workers = 3)
+    pd.testing.assert_frame_equal(serial, parallel, check_exact = True)
+
+
+def test_parallel_build_keeps_seed_unset():
+    b = builder(seed = None)
+    b.build_scenes(workers = 2)
+    assert b.seed is None
+
+
+class WindPower:
+    """Reads wind_speed, nonlinear so inputs rounded to float32 change the result"""
+    depends_on = ('wind_speed',)
+
+    def __init__(self, scale):
+        self.scale = scale
+
+    def simulate_batch(self, columns):
+        w = np.asarray(columns['wind_speed'], dtype = float)
+        return self.scale*np.sqrt(w)*np.log1p(w)
+
+
+def test_rebuild_equals_full_build():
+    for kwargs in ({}, {'compact': True, 'float_dtype': np.float32}):
+        full = builder(**kwargs)
+        full.add_column('wind_power', WindPower(2.0))
+        expected = full.build_scenes()
+
+        b = builder(**kwargs)
+        b.add_column('wind_power', WindPower(1.0))
+        b.build_scenes()
+        b.add_column('wind_power', WindPower(2.0))
+        pd.testing.assert_frame_equal(b.rebuild_scenes(), expected, check_exact = True)
+
+
+class GrowthReader(BaseSimulator):
+    """User simulator that reads growth scene by scene, without declaring it"""
+
+    def simulate(self, scene):
+        return 2.0*scene['growth']
+
+
+def test_undeclared_simulator_reads_previous_columns():
+    b = builder()
+    b.add_column('double_growth', GrowthReader())
+    scenes = b.build_scenes()
+    assert np.array_equal(scenes['double_growth'].to_numpy(), 2.0*scenes['growth'].to_numpy())
+
+
+def test_chunked_scenes_equal_build_scenes(tmp_path):
+    scenes = builder().build_scenes()
+    #chunks do not divide the years, nor the days
+    chunks = list(builder().iter_scenes(chunk_rows = 7))
+    assert max(len(c) for c in chunks) == 7
+    pd.testing.assert_frame_equal(pd.concat(chunks), scenes, check_exact = True)
+
+    builder().to_npy(str(tmp_path), chunk_rows = 7)
+    stored = load_scenes(str(tmp_path))
+    pd.testing.assert_frame_equal(stored[scenes.columns], scenes, check_exact = True)
@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import mgfo
+from mgfo.scenes.SceneCache import SceneCache
+from mgfo.simulation import DemandSimulator
+
+
+def builder(directory):
+    b = mgfo.SceneBuilder(years = 2, subperiods = 2, days_in_subperiods = 2, seed = 7, cache_dir = directory)
+    b.add_column('demand', DemandSimulator())
+    return b
+
+
+def test_cache_hit(tmp_path, monkeypatch):
+    scenes = builder(str(tmp_path)).build_scenes()
+    assert len(SceneCache(str(tmp_path)).keys()) == 1
+
+    cached = builder(str(tmp_path))
+    monkeypatch.setattr(cached, 'build_columns', pytest.fail)
+    pd.testing.assert_frame_equal(cached.build_scenes(), scenes, check_exact = True)
+
+
+def test_cache_invalidate(tmp_path):
+    b = builder(str(tmp_path))
+    b.build_scenes()
+    key = b.fingerprint()
+    assert b.cache.contains(key)
+    assert b.invalidate_cache()
+    assert not b.cache.contains(key) and not b.invalidate_cache()
+
+    #another configuration is another entry
+    assert builder(str(tmp_path)).fingerprint() == key
+    assert mgfo.SceneBuilder(years = 3, seed = 7).fingerprint() != key
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    columns = {'x': np.arange(1000.0)}
+    cache = SceneCache(str(tmp_path))
+    cache.store('a', columns)
+    size = cache.size('a')
+    cache.store('b', columns)
+    cache.max_bytes = 2*size
+
+    #a is used after b, so b is evicted first
+    os.utime(os.path.join(cache.path('b'), 'columns.json'), (1.0, 1.0))
+    os.utime(os.path.join(cache.path('a'), 'columns.json'), (2.0, 2.0))
+    cache.store('c', columns)
+    assert sorted(cache.keys()) == ['a', 'c']
+    assert cache.total_size() <= cache.max_bytes
+
+    #the stored entry is kept even if it does not fit
+    cache.max_bytes = size//2
+    cache.store('d', columns)
+    assert cache.keys() == ['d']
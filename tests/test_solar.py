@@ -0,0 +1,31 @@
+import warnings
+
+import numpy as np
+
+import mgfo
+from mgfo.simulation import MonthlySolarIrradianceSimulator
+from mgfo.simulation.Solar import triangular
+
+
+def test_triangular_mode_out_of_range():
+    u = np.linspace(0.0, 0.99, 50)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        below = triangular(u, 0.2, 1.0, 0.19)
+        above = triangular(u, 0.2, 1.0, 1.4)
+    assert np.all(np.isfinite(below)) and np.all(np.isfinite(above))
+    assert np.all(np.diff(below) >= 0) and np.all(np.diff(above) >= 0)
+
+
+def test_monthly_scene_mode_out_of_range():
+    #low and high monthly irradiation give modes below and above [model_a, model_b]
+    simulator = MonthlySolarIrradianceSimulator(monthly_average_irradiation = [2500]*6 + [6500]*6, seed = 1)
+    c = (np.asarray(simulator.model_c) - simulator.model_a)/(simulator.model_b - simulator.model_a)
+    assert c.min() < 0 and c.max() > 1
+
+    builder = mgfo.SceneBuilder(years = 1, seed = 3)
+    builder.add_column('irradiance', simulator)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        scenes = builder.build_scenes()
+    assert np.all(np.isfinite(scenes['irradiance']))
@@ -0,0 +1,75 @@
+import numpy as np
+import pandapower as pp
+import pyomo.environ as pe
+import pytest
+
+import mgfo
+import mgfo.resources as Resources
+from mgfo.simulation import DemandSimulator, SolarIrradianceSimulator
+
+highspy = pytest.importorskip('highspy')
+
+
+def writer(scenes):
+    net = pp.create_empty_network()
+    b0 = pp.create_bus(net, vn_kv = 13.2)
+    b1 = pp.create_bus(net, vn_kv = 13.2)
+    pp.create_ext_grid(net, bus = b0)
+    pp.create_line(net, from_bus = b0, to_bus = b1, length_km = 1.0, std_type = "NAYY 4x50 SE")
+    pp.create_load(net, bus = b1, p_mw = 0.5)
+    pp.create_sgen(net, bus = b1, p_mw = 0.0)
+    pp.create_sgen(net, bus = b1, p_mw = 0.0)
+    pp.create_storage(net, bus = b1, p_mw = 0.0, max_e_mwh = 0.0)
+    for table in (net.ext_grid, net.load, net.sgen, net.storage):
+        table['model'] = None
+    grid = Resources.ExtGrid('SET', pr_mw = 5.0, peak_value = 400, valley_value = 120, rest_value = 200)
+    grid.oc_1_mu.reset(1)
+    net.ext_grid.at[0, 'model'] = grid
+    net.load.at[0, 'model'] = Resources.Load('L', pr_mw = 0.5, pa_pu = DemandSimulator(seed = 2))
+    net.sgen.at[0, 'model'] = Resources.PVGenerator('PV', ic_1_mu = 2e5, oc_0_mu = 1.0)
+    net.sgen.at[1, 'model'] = Resources.PVGeneratorDiscrete('PVD', unit_size_mw = 0.1, unit_cost_mu = 1.5e4, oc_0_mu = 1.0)
+    net.storage.at[0, 'model'] = Resources.Storage('ST', ic_1_mu = 1e3, ic_1_mu_cap = 1e3, oc_1_mu = 2.0, eta_bb = 0.9, sigma = 2.1e-3)
+    return mgfo.MultiBusbarModelWriter(net, scenes, overload_hours = 10)
+
+
+@pytest.fixture(scope = 'module')
+def scenes():
+    builder = mgfo.SceneBuilder(years = 1, subperiods = 2, days_in_subperiods = 1, seed = 4)
+    builder.add_column('solar_irradiance', SolarIrradianceSimulator(seed = 5))
+    return builder.build_scenes()
+
+
+@pytest.fixture(scope = 'module')
+def sparse(scenes):
+    model = writer(scenes).create_sparse_model()
+    model.solve(mip_rel_gap = 0.0)
+    return model
+
+
+def test_sparse_matches_pyomo(scenes, sparse):
+    w = writer(scenes)
+    w.create_model()
+    opt = pe.SolverFactory('appsi_highs')
+    opt.config.mip_gap = 0.0
+    opt.solve(w.model)
+    assert sparse.value == pytest.approx(pe.value(w.model.value), rel = 1e-9)
+
+
+def test_write_mps_round_trip(sparse, tmp_path):
+    path = str(tmp_path / 'model.mps')
+    sparse.write_mps(path)
+
+    h = highspy.Highs()
+    h.setOptionValue('output_flag', False)
+    h.setOptionValue('mip_rel_gap', 0.0)
+    assert h.readModel(path) == highspy.HighsStatus.kOk
+    lp = h.getLp()
+    lb, ub, integrality = sparse.bounds()
+    assert lp.num_col_ == len(lb) and lp.num_row_ == sparse.n_rows
+    assert np.array_equal(lp.col_lower_, lb) and np.array_equal(lp.col_upper_, ub)
+    assert np.array_equal(np.asarray(lp.integrality_, dtype = int) != 0, integrality != 0)
+    assert np.array_equal(lp.col_cost_, sparse.objective())
+    assert lp.offset_ == pytest.approx(sparse.constant)
+
+    h.run()
+    assert h.getInfo().objective_function_value == pytest.approx(sparse.value, rel = 1e-9)
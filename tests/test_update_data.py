@@ -0,0 +1,56 @@
+import pandapower as pp
+import pyomo.environ as pe
+import pytest
+
+import mgfo
+import mgfo.resources as Resources
+
+pytest.importorskip('highspy')
+
+
+def writer(scenes, rating):
+    net = pp.create_empty_network()
+    b0 = pp.create_bus(net, vn_kv = 13.2)
+    b1 = pp.create_bus(net, vn_kv = 13.2)
+    pp.create_ext_grid(net, bus = b0)
+    pp.create_line(net, from_bus = b0, to_bus = b1, length_km = 1.0, std_type = "NAYY 4x50 SE")
+    pp.create_load(net, bus = b1, p_mw = 0.5)
+    for table in (net.ext_grid, net.load):
+        table['model'] = None
+    grid = Resources.ExtGrid('SET', pr_mw = 5.0, peak_value = 200, valley_value = 120, rest_value = 160)
+    grid.oc_1_mu.reset(1)
+    net.ext_grid.at[0, 'model'] = grid
+    net.load.at[0, 'model'] = Resources.Load('L', pr_mw = 0.5, pa_pu = 1.0)
+
+    w = mgfo.MultiBusbarModelWriter(net, scenes, overload_hours = 10)
+    w.mutable_data = True
+    w.add_power_lines()
+    net.line['model'][0].pr_mw = rating
+    w.create_model()
+    return w
+
+
+def solve(w):
+    opt = pe.SolverFactory('appsi_highs')
+    opt.config.mip_gap = 0.0
+    opt.solve(w.model)
+    return pe.value(w.model.value)
+
+
+@pytest.fixture(scope = 'module')
+def scenes():
+    return mgfo.SceneBuilder(years = 1, subperiods = 2, days_in_subperiods = 1, seed = 3).build_scenes()
+
+
+def test_update_line_rating_matches_rebuild(scenes):
+    w = writer(scenes, 0.8)
+    line = w.net.line['model'][0]
+    solve(w)
+
+    #with the big M of the old rating, the overload constraints would cut off all flows below the new rating
+    w.update_data(line, 'pr_mw', 8.0)
+    rebuilt = writer(scenes, 8.0)
+    rebuilt_line = rebuilt.net.line['model'][0]
+    assert line.big_m_params['M'].value == pytest.approx(rebuilt_line.get_big_m('M'))
+    assert w.big_m_values[(line.name, 'M')] == rebuilt.big_m_values[(line.name, 'M')]
+    assert solve(w) == pytest.approx(solve(rebuilt), rel = 1e-9)
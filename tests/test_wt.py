@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from mgfo.resources import WTGenerator, WTGeneratorDiscrete
+
+SPEEDS = np.concatenate(([-1.0, 0.0, 3.0, 15.0, 25.0, 30.0, np.nan], np.linspace(0.0, 28.0, 113)))
+
+
+def reference_output(wv, cut_in = 3.0, v_rated = 15.0, cut_out = 25.0):
+    """Scalar power curve of the original wind_output"""
+    if 0.0 <= wv and wv < cut_in:
+        return 0.0
+    elif cut_in <= wv and wv < v_rated:
+        return (wv**3 - cut_in**3)/(v_rated**3 - cut_in**3)
+    elif v_rated <= wv and wv < cut_out:
+        return 1.0
+    return 0.0
+
+
+@pytest.mark.parametrize('wt', [WTGenerator('wt'), WTGeneratorDiscrete('wt')])
+def test_wind_output_batch_matches_scalar(wt):
+    batch = wt.wind_output_batch({'wind_speed': SPEEDS})
+    assert np.array_equal(batch, [wt.wind_output({'wind_speed': v}) for v in SPEEDS])
+    assert np.allclose(batch, [reference_output(v) for v in SPEEDS], rtol = 1e-14, atol = 0.0)
+
+
+def test_profile_matches_scalar():
+    wt = WTGenerator('wt', hub_height = 80.0, air_density = 'rho')
+    scenes = pd.DataFrame({'wind_speed': np.linspace(0.0, 25.0, 24), 'rho': np.linspace(1.1, 1.3, 24)})
+    wt.set_scenes(scenes)
+    profile = wt.profile('pa_pu')
+    assert np.array_equal(profile, [wt.wind_output(scenes.iloc[i]) for i in range(len(scenes))])
+    assert np.array_equal(profile, [wt['pa_pu', i] for i in range(len(scenes))])
+
+
+def test_tabulated_curve():
+    speeds = np.linspace(3.0, 15.0, 2001)
+    wt = WTGenerator('wt', power_curve = (speeds, [reference_output(v) for v in speeds]), cut_out = 25.0)
+    batch = wt.wind_output_batch({'wind_speed': SPEEDS})
+    #the table ends at v_rated, beyond it the output is 0
+    expected = [reference_output(v) if v <= 15.0 else 0.0 for v in SPEEDS]
+    assert np.allclose(batch, expected, atol = 1e-4)